@@ -0,0 +1,115 @@
+"""
+Compare ParallelExtractor with tarfile.extractall on a generated archive
+shaped like a clang release (many small files, some duplicated).
+
+Run from the repository root::
+
+    python -m benchmarks.bench_extract --files 20000 --rounds 3
+"""
+
+import argparse
+import io
+import os
+import random
+import shutil
+import tarfile
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from rich import print
+from rich.table import Table
+
+from kernel_builder.config.config import EXTRACT_JOBS
+from kernel_builder.utils.extract import ParallelExtractor
+
+
+def generate(path: Path, files: int, dupes: float, seed: int = 0) -> int:
+    rng = random.Random(seed)
+    blobs: list[bytes] = []
+    total: int = 0
+    with tarfile.open(path, "w:gz", compresslevel=1) as tar:
+        for i in range(files):
+            if blobs and rng.random() < dupes:
+                data = rng.choice(blobs)
+            else:
+                data = rng.randbytes(rng.choice((512, 4096, 16384, 65536)))
+                blobs.append(data)
+            info = tarfile.TarInfo(f"clang/lib/d{i % 200:03}/f{i}.o")
+            info.size = len(data)
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(data))
+            total += len(data)
+    return total
+
+
+def extract_tarfile(archive: Path, dest: Path) -> None:
+    with tarfile.open(archive, "r:*") as tar:
+        tar.extractall(dest, filter="data")
+
+
+def extract_parallel(archive: Path, dest: Path, workers: int) -> None:
+    with archive.open("rb") as f:
+        ParallelExtractor(dest, workers=workers).extract(f)
+
+
+def bench(
+    fn: Callable[[Path, Path], None], archive: Path, work: Path, rounds: int
+) -> float:
+    best: float = float("inf")
+    for _ in range(rounds):
+        dest: Path = work / "out"
+        shutil.rmtree(dest, ignore_errors=True)
+        os.sync()
+        start: float = time.perf_counter()
+        fn(archive, dest)
+        best = min(best, time.perf_counter() - start)
+    shutil.rmtree(work / "out", ignore_errors=True)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--dupes", type=float, default=0.1)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=EXTRACT_JOBS)
+    parser.add_argument("--dir", type=Path, default=None, help="Scratch directory")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        work = Path(tmp)
+        archive: Path = work / "clang.tar.gz"
+        size: int = generate(archive, args.files, args.dupes)
+
+        table = Table(
+            title=f"{args.files} files, {size / 1e6:.1f} MB (best of {args.rounds})"
+        )
+        table.add_column("Extractor")
+        table.add_column("Seconds", justify="right")
+        table.add_column("Files/s", justify="right")
+        table.add_column("Speedup", justify="right")
+
+        baseline: float = bench(extract_tarfile, archive, work, args.rounds)
+        parallel: float = bench(
+            lambda a, d: extract_parallel(a, d, args.workers),
+            archive,
+            work,
+            args.rounds,
+        )
+        for name, secs in (
+            ("tarfile", baseline),
+            (f"parallel ({args.workers} workers)", parallel),
+        ):
+            table.add_row(
+                name,
+                f"{secs:.2f}",
+                f"{args.files / secs:,.0f}",
+                f"{baseline / secs:.2f}x",
+            )
+        print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+Time the Python side of a build (archive extraction, patching, config
+editing, image recompression, packaging) on generated fixtures and compare
+the results with a stored baseline.
+
+Run from the repository root::
+
+    python -m benchmarks.suite --update    # record a baseline on this machine
+    python -m benchmarks.suite             # fail if a case got slower
+"""
+
+import argparse
+import difflib
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from unittest import mock
+
+from rich import print
+from rich.table import Table
+
+from benchmarks.bench_extract import extract_parallel, generate
+from kernel_builder.constants import CACHE
+from kernel_builder.post_build import flashable
+from kernel_builder.post_build.kpm import KPMPatcher
+from kernel_builder.pre_build.susfs import SUSFSPatcher
+from kernel_builder.utils.command import apply_patch
+from kernel_builder.utils.kconfig import KconfigFile
+
+BASELINE: Path = CACHE / "benchmarks.json"
+
+# Slowdown over the baseline that fails the run
+THRESHOLD: float = 0.25
+
+
+@dataclass(slots=True)
+class Case:
+    name: str
+    # Called before every round with a scratch directory that is kept between
+    # rounds (fixtures are generated once); returns the function that is timed
+    prepare: Callable[[Path, float], Callable[[], object]]
+
+
+CASES: list[Case] = []
+
+
+def case(name: str):
+    def register(
+        prepare: Callable[[Path, float], Callable[[], object]],
+    ) -> Callable[[Path, float], Callable[[], object]]:
+        CASES.append(Case(name, prepare))
+        return prepare
+
+    return register
+
+
+def kernel_image(path: Path, size: int, seed: int = 0) -> Path:
+    """
+    Bytes that compress about as well as an arm64 Image (roughly 2.5:1).
+    """
+    if path.exists():
+        return path
+    rng = random.Random(seed)
+    # 5 bits of entropy per byte, plus zero filled pages
+    table: bytes = bytes(i % 32 * 7 for i in range(256))
+    with path.open("wb") as f:
+        written: int = 0
+        while written < size:
+            page: bytes = (
+                bytes(4096)
+                if rng.random() < 0.1
+                else rng.randbytes(4096).translate(table)
+            )
+            f.write(page)
+            written += len(page)
+    return path
+
+
+def source_tree(root: Path, files: int, lines: int = 400, seed: int = 0) -> Path:
+    if root.exists():
+        return root
+    rng = random.Random(seed)
+    for i in range(files):
+        path: Path = root / f"drivers/d{i % 20:02}/f{i}.c"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            "".join(
+                f"int f{i}_{n}(void) {{ return {rng.randrange(1 << 16)}; }}\n"
+                for n in range(lines)
+            )
+        )
+    return root
+
+
+def tree_patch(tree: Path, dest: Path, every: int = 4, seed: int = 0) -> Path:
+    """
+    A -p1 patch changing three places in every ``every``-th file of a tree.
+    """
+    if dest.exists():
+        return dest
+    rng = random.Random(seed)
+    diff: list[str] = []
+    for path in sorted(tree.rglob("*.c"))[::every]:
+        old: list[str] = path.read_text().splitlines(keepends=True)
+        new: list[str] = list(old)
+        for n in sorted(rng.sample(range(len(old)), 3)):
+            new[n] = f"/* patched */ {old[n]}"
+        rel: str = str(path.relative_to(tree))
+        diff.extend(difflib.unified_diff(old, new, f"a/{rel}", f"b/{rel}"))
+    dest.write_text("".join(diff))
+    return dest
+
+
+def defconfig(path: Path, symbols: int, seed: int = 0) -> Path:
+    rng = random.Random(seed)
+    lines: list[str] = []
+    for i in range(symbols):
+        choice: float = rng.random()
+        if choice < 0.5:
+            lines.append(f"CONFIG_SYM_{i}=y")
+        elif choice < 0.6:
+            lines.append(f'CONFIG_SYM_{i}="value {i}"')
+        else:
+            lines.append(f"# CONFIG_SYM_{i} is not set")
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+@case("extract toolchain archive")
+def extract(work: Path, scale: float) -> Callable[[], object]:
+    archive: Path = work / "clang.tar.gz"
+    if not archive.exists():
+        generate(archive, int(5000 * scale), 0.1)
+    dest: Path = work / "clang"
+    shutil.rmtree(dest, ignore_errors=True)
+    return lambda: extract_parallel(archive, dest, workers=4)
+
+
+@case("apply_patch")
+def patch(work: Path, scale: float) -> Callable[[], object]:
+    pristine: Path = source_tree(work / "pristine", int(400 * scale))
+    diff: Path = tree_patch(pristine, work / "tree.patch")
+    tree: Path = work / "tree"
+    shutil.rmtree(tree, ignore_errors=True)
+    shutil.copytree(pristine, tree)
+    return lambda: apply_patch(diff, cwd=tree)
+
+
+@case("edit .config")
+def kconfig(work: Path, scale: float) -> Callable[[], object]:
+    symbols: int = int(8000 * scale)
+    config: Path = defconfig(work / ".config", symbols)
+    rng = random.Random(1)
+    options: dict[str, bool | int | str] = {
+        f"CONFIG_SYM_{i}": rng.choice((True, False, 42, "text"))
+        for i in rng.sample(range(symbols), symbols // 40)
+    }
+
+    def run() -> None:
+        edit: KconfigFile = KconfigFile(config)
+        edit.update(options)
+        edit.render()
+
+    return run
+
+
+def _kpm(comp: str, work: Path, scale: float) -> Callable[[], object]:
+    image: Path = kernel_image(work / "Image", int(32 * scale) << 20)
+    kpm: KPMPatcher = KPMPatcher("SUKI")
+    kpm.image_comp = comp
+    packed: Path = work / f"Image.{comp}"
+    if not packed.exists():
+        kpm.compress(image, packed)
+
+    def run() -> None:
+        # What KPMPatcher.patch does around the patcher binary
+        kpm.decompress(packed, work / "Image.out")
+        kpm.compress(work / "Image.out", work / f"repacked.{comp}")
+
+    return run
+
+
+@case("KPM gzip round trip")
+def kpm_gzip(work: Path, scale: float) -> Callable[[], object]:
+    return _kpm("gz", work, scale)
+
+
+@case("KPM lz4 round trip")
+def kpm_lz4(work: Path, scale: float) -> Callable[[], object]:
+    return _kpm("lz4", work, scale)
+
+
+@case("AnyKernel3 zip")
+def anykernel3(work: Path, scale: float) -> Callable[[], object]:
+    image: Path = kernel_image(work / "Image", int(32 * scale) << 20)
+    boot: Path = work / "out" / "arch" / "arm64" / "boot"
+    boot.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(image, boot / "Image")
+    source_tree(work / "AnyKernel3", 20, lines=50)
+    (work / "dist").mkdir(exist_ok=True)
+
+    def run() -> None:
+        with (
+            mock.patch.object(flashable, "WORKSPACE", work),
+            mock.patch.object(flashable, "OUTPUT", work / "dist"),
+        ):
+            flashable.FlashableBuilder("raw").build_anykernel3()
+
+    return run
+
+
+@case("SUSFSPatcher.copy")
+def susfs_copy(work: Path, scale: float) -> Callable[[], object]:
+    src: Path = source_tree(work / "susfs", int(200 * scale), lines=200)
+    dest: Path = work / "kernel"
+    shutil.rmtree(dest, ignore_errors=True)
+    dest.mkdir()
+    return lambda: SUSFSPatcher("NEXT", True).copy(src, dest)
+
+
+def run_case(c: Case, work: Path, rounds: int, scale: float) -> float:
+    best: float = float("inf")
+    work.mkdir(parents=True, exist_ok=True)
+    for _ in range(rounds):
+        fn: Callable[[], object] = c.prepare(work, scale)
+        start: float = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def machine() -> dict[str, object]:
+    return {
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(
+    results: dict[str, float], baseline: dict[str, float], threshold: float = THRESHOLD
+) -> list[str]:
+    """
+    :return: Names of the cases more than ``threshold`` slower than the baseline.
+    """
+    return [
+        name
+        for name, secs in results.items()
+        if name in baseline and secs > baseline[name] * (1 + threshold)
+    ]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--scale", type=float, default=1.0, help="Fixture size factor")
+    parser.add_argument("--only", action="append", help="Case to run (repeatable)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument(
+        "--update", action="store_true", help="Store the results as the baseline"
+    )
+    parser.add_argument("--dir", type=Path, default=None, help="Scratch directory")
+    args = parser.parse_args(argv)
+
+    stored: dict = (
+        json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    )
+    baseline: dict[str, float] = (
+        stored.get("cases", {}) if stored.get("scale") == args.scale else {}
+    )
+    if stored and stored.get("machine") != machine():
+        print(
+            f"[yellow]Baseline {args.baseline} was recorded on another machine[/yellow]"
+        )
+
+    results: dict[str, float] = {}
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for n, c in enumerate(CASES):
+            if args.only and c.name not in args.only:
+                continue
+            results[c.name] = run_case(
+                c, Path(tmp, f"case{n}"), args.rounds, args.scale
+            )
+
+    regressions: list[str] = compare(results, baseline, args.threshold)
+    table = Table(
+        title=f"Benchmarks (best of {args.rounds}, scale {args.scale})",
+        title_justify="left",
+    )
+    table.add_column("Case")
+    table.add_column("Seconds", justify="right")
+    table.add_column("Baseline", justify="right")
+    table.add_column("Change", justify="right")
+    for name, secs in results.items():
+        base: float | None = baseline.get(name)
+        change: str = f"{secs / base - 1:+.0%}" if base else "-"
+        if name in regressions:
+            change = f"[red]{change}[/red]"
+        table.add_row(name, f"{secs:.3f}", f"{base:.3f}" if base else "-", change)
+    print(table)
+
+    if args.update:
+        cases: dict[str, float] = {**baseline, **results}
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(
+            json.dumps(
+                {"machine": machine(), "scale": args.scale, "cases": cases}, indent=2
+            )
+            + "\n"
+        )
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if regressions:
+        print(
+            f"[red]{len(regressions)} case(s) regressed more than {args.threshold:.0%}[/red]"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
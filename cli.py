@@ -2,20 +2,38 @@
 
 import os
 import shutil
+from datetime import datetime
 from pathlib import Path
 from typing import Annotated
 
 import dotenv
 import typer
+from rich import print
+from rich.filesize import decimal
+from rich.table import Table
 from typer import Option
 from typer.main import Typer
 
-from kernel_builder.config.config import LOGFILE
-from kernel_builder.constants import OUTPUT, ROOT, TOOLCHAIN, WORKSPACE
+from kernel_builder.config.config import BUILD_ARTIFACTS, LOGFILE, WORKER_PORT
+from kernel_builder.constants import LOCKFILE, OUTPUT, ROOT, TOOLCHAIN, WORKSPACE
 from kernel_builder.kernel_builder import KernelBuilder
+from kernel_builder.matrix_builder import MatrixBuilder, MatrixResult, MatrixVariant
+from kernel_builder.pre_build.ksu import KSUInstaller
+from kernel_builder.utils.ccache import Ccache
+from kernel_builder.utils.clang import clang_binary
+from kernel_builder.utils.distributed import CompileServer
+from kernel_builder.utils.lockfile import SourceLock
 from kernel_builder.utils.log import configure_log
+from kernel_builder.utils.source import SourceManager
+from kernel_builder.utils.targets import ARTIFACTS, plan
+from kernel_builder.utils.toolchain import ToolchainEntry, ToolchainStore
+from kernel_builder.utils.trace import tracer
 
 app: Typer = typer.Typer(help="GKI Kernel Builder CLI", pretty_exceptions_enable=False)
+toolchain_app: Typer = typer.Typer(help="Manage the extracted toolchain store")
+app.add_typer(toolchain_app, name="toolchain")
+ccache_app: Typer = typer.Typer(help="Manage the compiler cache")
+app.add_typer(ccache_app, name="ccache")
 
 
 def _bool_env(var: str, default: bool = False) -> bool:
@@ -49,11 +67,46 @@ def build(
             help="Enable or disable LXC",
         ),
     ] = _bool_env("LXC"),
+    incremental: Annotated[
+        bool,
+        Option(
+            "--incremental/--no-incremental",
+            "-i",
+            help="Keep the kernel tree and out/ and only rebuild what changed",
+        ),
+    ] = _bool_env("INCREMENTAL"),
+    trace: Annotated[
+        Path | None,
+        Option(
+            "--trace",
+            "-t",
+            envvar="TRACE",
+            help="Write a Chrome trace of the build stages (open in Perfetto)",
+        ),
+    ] = None,
+    artifact: Annotated[
+        list[str] | None,
+        Option(
+            "--artifact",
+            "-a",
+            envvar="ARTIFACTS",
+            help=f"Artifact to build, repeatable ({', '.join(ARTIFACTS)}; "
+            f"default: {' '.join(BUILD_ARTIFACTS)}). Only the Kbuild targets "
+            "they need are made",
+        ),
+    ] = None,
 ) -> None:
     if ksu == "NONE" and susfs:
         typer.secho("[ERROR] SUSFS requires KernelSU", err=True, fg=typer.colors.RED)
         raise typer.Exit(1)
 
+    artifacts: list[str] = artifact or BUILD_ARTIFACTS
+    try:
+        plan(artifacts)
+    except ValueError as e:
+        typer.secho(f"[ERROR] {e}", err=True, fg=typer.colors.RED)
+        raise typer.Exit(1) from None
+
     if os.getenv("GITHUB_ACTIONS") != "true":
         dotenv.load_dotenv()
 
@@ -65,8 +118,76 @@ def build(
         LXC=str(lxc).lower(),
     )
 
-    builder: KernelBuilder = KernelBuilder(ksu, susfs, lxc)
-    builder.run_build()
+    builder: KernelBuilder = KernelBuilder(
+        ksu, susfs, lxc, incremental=incremental, artifacts=artifacts
+    )
+    if trace is not None:
+        tracer.start(trace)
+    try:
+        builder.run_build()
+    finally:
+        if (path := tracer.save()) is not None:
+            print(f"Trace written to [cyan]{path}[/cyan]")
+
+
+@app.command("build-matrix")
+def build_matrix(
+    variants: Annotated[
+        list[str] | None,
+        Option(
+            "--variant",
+            "-v",
+            help="Variant to build, e.g. KSUN-SUSFS-LXC (repeatable, default: all)",
+        ),
+    ] = None,
+    jobs: Annotated[
+        int | None,
+        Option("--jobs", "-j", help="Variants built at the same time"),
+    ] = None,
+    incremental: Annotated[
+        bool,
+        Option(
+            "--incremental/--no-incremental",
+            "-i",
+            help="Keep each variant's tree and out/ between runs",
+        ),
+    ] = False,
+) -> None:
+    if os.getenv("GITHUB_ACTIONS") != "true":
+        dotenv.load_dotenv()
+
+    configure_log(logfile=LOGFILE)
+
+    try:
+        selected: list[MatrixVariant] = (
+            [MatrixVariant.parse(name) for name in variants]
+            if variants
+            else MatrixVariant.all()
+        )
+    except ValueError as e:
+        typer.secho(f"[ERROR] {e}", err=True, fg=typer.colors.RED)
+        raise typer.Exit(1)
+
+    results: list[MatrixResult] = MatrixBuilder(
+        selected, jobs=jobs, incremental=incremental
+    ).run()
+    if not all(result.ok for result in results):
+        raise typer.Exit(1)
+
+
+@app.command()
+def lock() -> None:
+    if os.getenv("GITHUB_ACTIONS") != "true":
+        dotenv.load_dotenv()
+
+    configure_log(logfile=LOGFILE)
+
+    source_lock: SourceLock = SourceLock()
+    SourceManager().lock_sources(source_lock)
+    KSUInstaller.lock_refs(source_lock)
+    source_lock.save(LOCKFILE)
+
+    typer.secho(f"Wrote {LOCKFILE}", fg=typer.colors.GREEN)
 
 
 @app.command()
@@ -92,5 +213,110 @@ def clean(
     typer.secho("Cleanup completed!", fg=typer.colors.GREEN)
 
 
+@toolchain_app.command("list")
+def toolchain_list() -> None:
+    entries: list[ToolchainEntry] = ToolchainStore().entries()
+    if not entries:
+        typer.secho("Toolchain store is empty")
+        return
+
+    table: Table = Table("Key", "URL", "Size", "Files", "Last used")
+    for entry in entries:
+        table.add_row(
+            entry.key,
+            entry.url,
+            decimal(entry.size),
+            str(entry.files),
+            datetime.fromtimestamp(entry.last_used).strftime("%Y-%m-%d %H:%M"),
+        )
+    print(table)
+
+
+@toolchain_app.command("prune")
+def toolchain_prune(
+    keep: Annotated[
+        int,
+        Option("--keep", "-k", help="Number of most recently used entries to keep"),
+    ] = 1,
+    older_than: Annotated[
+        int | None,
+        Option("--older-than", "-o", help="Only remove entries unused for N days"),
+    ] = None,
+) -> None:
+    removed: list[ToolchainEntry] = ToolchainStore().prune(
+        keep=keep,
+        older_than=older_than * 86400 if older_than is not None else None,
+    )
+    for entry in removed:
+        typer.secho(f"Removed {entry.key} ({entry.url})")
+    typer.secho(f"Pruned {len(removed)} toolchain(s)", fg=typer.colors.GREEN)
+
+
+@ccache_app.command("prewarm")
+def ccache_prewarm(
+    seed: Annotated[
+        Path,
+        typer.Argument(help="ccache directory or .tar(.gz/.zst) archive to import"),
+    ],
+) -> None:
+    configure_log(logfile=LOGFILE)
+
+    cache: Ccache = Ccache(seed=None)
+    if not cache.available:
+        typer.secho("[ERROR] ccache is not installed", err=True, fg=typer.colors.RED)
+        raise typer.Exit(1)
+
+    # The namespace belongs to the linked toolchain
+    cache.prepare()
+    imported: int = cache.prewarm(seed)
+    typer.secho(f"Imported {imported} files into {cache.dir}", fg=typer.colors.GREEN)
+
+
+@app.command()
+def worker(
+    bind: Annotated[
+        str,
+        Option(
+            "--bind",
+            "-b",
+            help="Address to listen on; loopback by default, for SSH tunnels. "
+            "Builders send compile arguments as-is, so only bind to a trusted "
+            "network",
+        ),
+    ] = "127.0.0.1",
+    port: Annotated[
+        int, Option("--port", "-p", help="Port to listen on")
+    ] = WORKER_PORT,
+    jobs: Annotated[
+        int | None,
+        Option("--jobs", "-j", help="Parallel compiles (default: CPU count)"),
+    ] = None,
+) -> None:
+    """
+    Serve compile jobs for builders with GKI_WORKERS pointing here.
+    """
+    configure_log(logfile=LOGFILE)
+
+    clang: Path = clang_binary(TOOLCHAIN / "clang")
+    if not clang.exists():
+        typer.secho(
+            f"[ERROR] No toolchain at {TOOLCHAIN}, run a build first",
+            err=True,
+            fg=typer.colors.RED,
+        )
+        raise typer.Exit(1)
+
+    with CompileServer((bind, port), clang=clang, jobs=jobs) as server:
+        typer.secho(
+            f"Serving {server.jobs} compile slots on {bind}:{port} "
+            f"(clang {server.clang_hash[:16]})",
+            fg=typer.colors.GREEN,
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            typer.secho(f"Stopped after {server.compiled} compiles")
+
+
 if __name__ == "__main__":
     app()
@@ -1,7 +1,8 @@
+import os
 from pathlib import Path
 from typing import Final, Literal
 
-from kernel_builder.constants import ROOT
+from kernel_builder.constants import CACHE, ROOT
 
 # ---- Build Info
 KERNEL_NAME: Final[str] = "ESK"
@@ -11,6 +12,15 @@ BUILD_HOST: Final[str] = "esk"
 IMAGE_COMP: Final[Literal["raw", "lz4", "gz"]] = "gz"
 LTO: Literal["thin", "full"] = "thin"
 
+# Artifacts a build produces unless --artifact is given (see utils/targets.py)
+BUILD_ARTIFACTS: Final[list[str]] = ["anykernel3", "boot"]
+
+# Config fragments merged into out/.config after the variant options
+KCONFIG_FRAGMENTS: Final[list[Path]] = []
+
+# Resolved .config cache, skips the defconfig/olddefconfig passes (None to disable)
+KCONFIG_CACHE: Final[Path | None] = CACHE / "kconfig"
+
 # ---- Kernel
 KERNEL_REPO: Final[str] = "github.com:ESK-Project/android_kernel_xiaomi_mt6895"
 KERNEL_BRANCH: Final[str] = "16"
@@ -19,6 +29,20 @@ KERNEL_BRANCH: Final[str] = "16"
 ANYKERNEL_REPO = "github.com:ESK-Project/AnyKernel3"
 ANYKERNEL_BRANCH = "android12-5.10"
 
+# ---- Sources
+# Maximum number of sources fetched at the same time
+FETCH_JOBS: Final[int] = 4
+
+# Bare mirror cache shared by every build on this host (None to disable)
+GIT_MIRRORS: Final[Path | None] = CACHE / "git"
+
+# ---- Patches
+# Context lines a hunk may ignore at either end (patch --fuzz)
+PATCH_FUZZ: Final[int] = 3
+
+# Files patched at the same time
+PATCH_JOBS: Final[int] = min(8, os.cpu_count() or 1)
+
 # ---- Release
 RELEASE_REPO: Final[str] = "ESK-Project/esk-releases"
 RELEASE_BRANCH: Final[str] = "main"
@@ -29,10 +53,67 @@ CLANG_VARIANT: Final[Literal["AOSP", "RV", "YUKI", "LILIUM", "NEUTRON"]] = "AOSP
 # Optional: Set custom clang link (override CLANG_VARIANT)
 CLANG_URL: str | None = None
 
+# Extract the clang archive while it downloads instead of saving it first
+CLANG_STREAM: Final[bool] = True
+
+# Threads writing files while a toolchain archive is extracted (1 = inline)
+EXTRACT_JOBS: Final[int] = min(16, os.cpu_count() or 1)
+
+# ---- ccache
+# Root of the compiler cache, one namespace per clang binary below it
+CCACHE_ROOT: Final[Path] = Path(os.getenv("CCACHE_DIR", Path.home() / ".ccache"))
+CCACHE_MAX_SIZE: Final[str] = "7G"
+
+# ccache directory or .tar(.gz/.zst) archive an empty namespace is seeded from
+CCACHE_SEED: Final[Path | None] = None
+
+# ---- ThinLTO
+# Persistent ThinLTO backend cache, one namespace per clang binary (None to disable)
+THINLTO_CACHE: Final[Path | None] = CACHE / "thinlto"
+
+# Namespace size and entry age (seconds unused) the cache is pruned to after a build
+THINLTO_CACHE_MAX_SIZE: Final[int] = 10 << 30
+THINLTO_CACHE_MAX_AGE: Final[int] = 14 * 86400
+
+# ---- Compile timing
+# Time every translation unit and report the slowest ones after the build
+COMPILE_TIMING: Final[bool] = True
+
+# Rows shown per compile time table
+COMPILE_TIMING_TOP: Final[int] = 20
+
+# ---- Distributed compile
+# Workers running `cli.py worker`: "host", "host:port" or "ssh://[user@]host[:port]"
+# (reached through an SSH tunnel), space or comma separated in GKI_WORKERS
+COMPILE_WORKERS: Final[list[str]] = (
+    os.getenv("GKI_WORKERS", "").replace(",", " ").split()
+)
+
+# Port workers listen on unless a host names another one
+WORKER_PORT: Final[int] = 3632
+
+# ---- Resources
+# Memory one make job is expected to use, by LTO mode (bounds make -j)
+MAKE_MEM_PER_JOB: Final[dict[str, int]] = {"thin": 1 << 30, "full": 2 << 30}
+
+# Memory the final vmlinux LTO link is expected to need, by LTO mode
+LTO_LINK_MEM: Final[dict[str, int]] = {"thin": 4 << 30, "full": 12 << 30}
+
+# Withhold make jobs while /proc/pressure/memory "some avg10" is above this
+MEMORY_PRESSURE_HIGH: Final[float] = 10.0
+
+# ---- Build matrix
+# Variants built at the same time by build-matrix (None: from cores and RAM)
+MATRIX_JOBS: Final[int | None] = None
+
+# Peak memory one kernel build (LTO link included) is expected to use
+MATRIX_MEM_PER_BUILD: Final[int] = 8 << 30
+
 # ---- Boot Image Config
 BOOT_SIGNING_KEY: Final[Path] = ROOT / "key" / "key.pem"
-GKI_URL: Final[str] = (
-    "https://dl.google.com/android/gki/gki-certified-boot-android12-5.10-2025-05_r1.zip"
+GKI_URL: Final[str] = os.getenv(
+    "GKI_URL",
+    "https://dl.google.com/android/gki/gki-certified-boot-android12-5.10-2025-05_r1.zip",
 )
 
 # ---- Logging
@@ -1,4 +1,4 @@
-from typing import Final, TypeAlias
+from typing import Final, NotRequired, TypedDict
 
 from kernel_builder.constants import TOOLCHAIN, WORKSPACE
 
@@ -12,37 +12,62 @@ from .config import ANYKERNEL_BRANCH, ANYKERNEL_REPO, KERNEL_BRANCH, KERNEL_REPO
 #
 # 2. Rules
 #    - Do not use git ssh links (only https/http)
+#
+# 3. Fetch profile (optional keys)
+#
+#    filter  git partial clone filter: "blob:none" (blobless) or "tree:0" (treeless)
+#    sparse  directories to materialize, relative to the repository root
+#    files   glob patterns of single files to materialize, relative to the root
+#
+#    Without sparse/files the whole tree is checked out.
+
+
+class Source(TypedDict):
+    url: str
+    branch: str
+    to: str
+    filter: NotRequired[str]
+    sparse: NotRequired[list[str]]
+    files: NotRequired[list[str]]
 
-Source: TypeAlias = Final[dict[str, str]]
 
-KERNEL: Source = {
+KERNEL: Final[Source] = {
     "url": KERNEL_REPO,
     "branch": KERNEL_BRANCH,
     "to": str(WORKSPACE),
 }
 
-ANYKERNEL: Source = {
+ANYKERNEL: Final[Source] = {
     "url": ANYKERNEL_REPO,
     "branch": ANYKERNEL_BRANCH,
     "to": str(WORKSPACE / "AnyKernel3"),
 }
 
-BUILD_TOOL: Source = {
+BUILD_TOOL: Final[Source] = {
     "url": "android.googlesource.com:kernel/prebuilts/build-tools",
     "branch": "main-kernel-build-2024",
     "to": str(TOOLCHAIN / "build-tools"),
+    # Only avbtool is used (boot image signing)
+    "filter": "blob:none",
+    "files": ["linux-x86/bin/avbtool"],
 }
 
-MKBOOTIMG: Source = {
+MKBOOTIMG: Final[Source] = {
     "url": "android.googlesource.com:platform/system/tools/mkbootimg",
     "branch": "main-kernel-build-2024",
     "to": str(TOOLCHAIN / "mkbootimg"),
+    # mkbootimg.py imports the gki package
+    "filter": "blob:none",
+    "sparse": ["gki"],
+    "files": ["mkbootimg.py", "unpack_bootimg.py"],
 }
 
-SUSFS: Source = {
+SUSFS: Final[Source] = {
     "url": "gitlab.com:simonpunk/susfs4ksu",
     "branch": "gki-android12-5.10",
     "to": str(WORKSPACE / "susfs4ksu"),
+    "filter": "blob:none",
+    "sparse": ["kernel_patches"],
 }
 
 SOURCES: Final[list[Source]] = [
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from typing import Final
 
@@ -5,11 +6,35 @@ from typing import Final
 ROOT: Final[Path] = Path(__file__).resolve().parent.parent
 SRC: Final[Path] = Path(__file__).resolve().parent
 
-OUTPUT: Final[Path] = ROOT / "dist"
-WORKSPACE: Final[Path] = ROOT / "kernel"
-TOOLCHAIN: Final[Path] = ROOT / "toolchain"
+# GKI_* overrides give each build of a matrix run its own tree (see MatrixBuilder)
+# and let tests/e2e run the pipeline in a scratch directory
+OUTPUT: Final[Path] = Path(os.getenv("GKI_OUTPUT", ROOT / "dist"))
+WORKSPACE: Final[Path] = Path(os.getenv("GKI_WORKSPACE", ROOT / "kernel"))
+TOOLCHAIN: Final[Path] = Path(os.getenv("GKI_TOOLCHAIN", ROOT / "toolchain"))
+# Set for the children of a matrix run: the parent synced and linked TOOLCHAIN
+# and holds it, so they build from it without re-syncing or re-linking
+TOOLCHAIN_READONLY: Final[bool] = os.getenv("GKI_TOOLCHAIN_READONLY") == "1"
 PATCHES: Final[Path] = ROOT / "kernel_patches"
+CACHE: Final[Path] = Path(os.getenv("GKI_CACHE", ROOT / ".cache"))
+LOCKFILE: Final[Path] = Path(os.getenv("GKI_LOCKFILE", ROOT / "sources.lock"))
+ENV_FILE: Final[Path] = Path(os.getenv("GKI_ENV_FILE", ROOT / "github.env"))
+MATRIX: Final[Path] = ROOT / "matrix"
+SOURCE_STATE: Final[Path] = CACHE / "sources.json"
+URL_CACHE: Final[Path] = CACHE / "urls.json"
+TOOLCHAIN_STORE: Final[Path] = CACHE / "toolchains"
+GITHUB_CACHE: Final[Path] = CACHE / "github"
+CLANG_CACHE: Final[Path] = CACHE / "clang.json"
 VARIANT_JSON: Final[Path] = SRC / "config" / "variants.json"
+# Per-hunk results of the patches applied by the pre-build steps
+PATCH_REPORTS: Final[Path] = OUTPUT / "patches"
+CC_TIME: Final[Path] = SRC / "utils" / "cc_time.sh"
+REMOTE_CC: Final[Path] = SRC / "utils" / "remote_cc.py"
+
+# Upstream endpoints (tests/e2e points these at a local server)
+GITHUB_API: Final[str] = os.getenv("GKI_GITHUB_API", "https://api.github.com")
+GITHUB_RAW: Final[str] = os.getenv(
+    "GKI_GITHUB_RAW", "https://raw.githubusercontent.com"
+)
 
 # Compiler
 LLVM: Final[str] = "1"
@@ -1,18 +1,29 @@
-import tarfile
+import hashlib
+import json
+import shutil
 import textwrap
 import time
+from collections.abc import Iterable
 from pathlib import Path
 
 from rich import print
 from rich.panel import Panel
 
 from kernel_builder.config.config import (
+    BUILD_ARTIFACTS,
     CLANG_URL,
     CLANG_VARIANT,
     IMAGE_COMP,
-    KERNEL_NAME,
 )
-from kernel_builder.constants import OUTPUT, TOOLCHAIN, WORKSPACE
+from kernel_builder.config.manifest import SUSFS
+from kernel_builder.constants import (
+    LOCKFILE,
+    OUTPUT,
+    PATCHES,
+    TOOLCHAIN,
+    TOOLCHAIN_READONLY,
+    WORKSPACE,
+)
 from kernel_builder.post_build.export_env import GithubExportEnv
 from kernel_builder.post_build.flashable import FlashableBuilder
 from kernel_builder.post_build.kpm import KPMPatcher
@@ -22,17 +33,32 @@ from kernel_builder.pre_build.susfs import SUSFSPatcher
 from kernel_builder.pre_build.variants import Variants
 from kernel_builder.utils.build import Builder
 from kernel_builder.utils.clang import fetch_clang_url
-from kernel_builder.utils.command import aria2c
 from kernel_builder.utils.fs import FileSystem
+from kernel_builder.utils.lockfile import SourceLock
 from kernel_builder.utils.log import log
 from kernel_builder.utils.source import SourceManager
+from kernel_builder.utils.targets import TargetPlan, artifact_name, plan
+from kernel_builder.utils.toolchain import ToolchainStore
+from kernel_builder.utils.trace import span, traced, tracer
+
+# Pre-build fingerprint of a kernel tree whose pre-build steps did not finish
+PREBUILD_PENDING: str = "pending"
 
 
 class KernelBuilder:
-    def __init__(self, ksu: str, susfs: bool, lxc: bool) -> None:
+    def __init__(
+        self,
+        ksu: str,
+        susfs: bool,
+        lxc: bool,
+        incremental: bool = False,
+        artifacts: Iterable[str] | None = None,
+    ) -> None:
         self.ksu_variant: str = ksu
         self.use_susfs: bool = susfs
         self.use_lxc: bool = lxc
+        self.incremental: bool = incremental
+        self.plan: TargetPlan = plan(artifacts or BUILD_ARTIFACTS, IMAGE_COMP)
 
         self.kpm: KPMPatcher = KPMPatcher(ksu)
         self.ksu: KSUInstaller = KSUInstaller(ksu, susfs)
@@ -44,6 +70,14 @@ class KernelBuilder:
         self.builder: Builder = Builder()
         self.fs: FileSystem = FileSystem()
         self.source: SourceManager = SourceManager()
+        if TOOLCHAIN_READONLY:
+            # Sibling builds are using these checkouts
+            self.source.sources = [
+                source
+                for source in self.source.sources
+                if TOOLCHAIN not in Path(source["to"]).parents
+            ]
+        self.toolchain: ToolchainStore = ToolchainStore()
         self.flashable: FlashableBuilder = FlashableBuilder()
 
         boot_dir: Path = WORKSPACE / "out" / "arch" / "arm64" / "boot"
@@ -58,74 +92,157 @@ class KernelBuilder:
             SuSFS: [bold yellow]{"Enabled" if self.use_susfs else "Disabled"}[/bold yellow]
             LXC: [bold yellow]{"Enabled" if self.use_lxc else "Disabled"}[/bold yellow]
             Image Compression: [cyan]{IMAGE_COMP}[/cyan]
+            Incremental: [bold yellow]{"Enabled" if self.incremental else "Disabled"}[/bold yellow]
+            Artifacts: [cyan]{", ".join(self.plan.artifacts)}[/cyan] (make {" ".join(self.plan.targets)})
         """)
 
         print(Panel(build_info, title="[bold]Build Info[/bold]", border_style="dim"))
 
+    @traced("pre-build")
+    def _prebuild(self) -> None:
+        self.ksu.install()
+        self.susfs.apply()
+        self.lxc.apply()
+
+    def _prebuild_fingerprint(self, pins: dict[str, str]) -> str:
+        """
+        Digest of everything the pre-build steps depend on besides the kernel
+        tree itself: the variant, the KernelSU and SuSFS commits and the patches.
+        """
+        inputs: dict[str, str | bool | None] = {
+            "ksu": self.ksu_variant,
+            "susfs": self.use_susfs,
+            "lxc": self.use_lxc,
+            "ksu_ref": self.ksu.ref(),
+            "susfs_ref": pins.get(SourceLock.key(SUSFS["url"], SUSFS["branch"])),
+        }
+        for patch in sorted(PATCHES.glob("*.patch")):
+            inputs[patch.name] = hashlib.sha256(patch.read_bytes()).hexdigest()
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    @traced("pre-build (incremental)")
+    def _prebuild_incremental(self, fingerprint: str) -> None:
+        """
+        Apply pre-build steps to a kept kernel tree. Nothing is touched when
+        their inputs are unchanged, so Kbuild only rebuilds what the source
+        update changed.
+        """
+        applied: str | None = self.source.applied(WORKSPACE)
+
+        if applied == fingerprint:
+            log("Pre-build inputs unchanged, keeping the patched tree")
+            return
+
+        if applied is not None:
+            # Inputs changed: start again from the pristine tree
+            log("Pre-build inputs changed, restoring the kernel tree")
+            self.source.restore(WORKSPACE)
+            self.fs.cd(WORKSPACE)
+            self._prebuild()
+        else:
+            # Unknown state: only run the steps that are not in the tree yet
+            for name, applied_step, step in (
+                ("KernelSU", self.ksu.applied, self.ksu.install),
+                ("SUSFS", self.susfs.applied, self.susfs.apply),
+                ("LXC", self.lxc.applied, self.lxc.apply),
+            ):
+                if applied_step():
+                    log(f"{name} already applied, skipping")
+                else:
+                    step()
+
+        self.source.mark_applied(WORKSPACE, fingerprint)
+
+    @traced("run build")
     def run_build(self) -> None:
         """
         Run the complete build process.
         """
         self.build_info()
+        tracer.annotate(
+            ksu=self.ksu_variant,
+            susfs=self.use_susfs,
+            lxc=self.use_lxc,
+            variant=self.variants.suffix,
+            incremental=self.incremental,
+            artifacts=",".join(self.plan.artifacts),
+        )
         time.sleep(1)
 
-        # Reset paths
-        reset_paths = [WORKSPACE, TOOLCHAIN, OUTPUT]
-        log(f"Resetting paths: {', '.join(map(str, reset_paths))}")
-        for path in reset_paths:
-            self.fs.reset_path(path)
-
-        # Clone sources
-        log("Cloning kernel and toolchain repositories...")
-        self.source.clone_sources()
-
-        # Clone Clang
-        clang_url: str = CLANG_URL or fetch_clang_url(CLANG_VARIANT)
-        dest: Path = TOOLCHAIN
-        tarball: Path = dest / "tarball"
-        clang: Path = dest / "clang"
-
-        aria2c("-d", str(dest), "-o", "tarball", clang_url)
-        self.fs.reset_path(clang)
-
-        try:
-            with tarfile.open(tarball, "r:*") as tar:
-                tar.extractall(clang, filter="data")
-        finally:
-            tarball.unlink(missing_ok=True)
+        # Reset output
+        log(f"Resetting path: {OUTPUT}")
+        with span("reset output"):
+            self.fs.reset_path(OUTPUT)
+
+        # Sync sources (unchanged checkouts are reused)
+        log("Syncing kernel and toolchain repositories...")
+        with span("resolve pins", "git"):
+            pins: dict[str, str] = self.source.resolve_pins(SourceLock.load(LOCKFILE))
+        fingerprint: str = self._prebuild_fingerprint(pins)
+        if not self.incremental and self.source.applied(WORKSPACE) not in (
+            None,
+            fingerprint,
+        ):
+            # Patched for other inputs (or only partly): re-create it pristine
+            self.source.taint(WORKSPACE)
+        self.source.clone_sources(pins, in_place=self.incremental)
+
+        # Link Clang from the toolchain store (downloaded only on a miss); the
+        # entry stays locked against pruning until the build is done
+        if TOOLCHAIN_READONLY:
+            log(f"Using the toolchain linked by the matrix build at {TOOLCHAIN}")
+        else:
+            clang_url: str = CLANG_URL or fetch_clang_url(CLANG_VARIANT)
+            self.toolchain.link(clang_url, TOOLCHAIN / "clang")
 
         # Enter workspace
         self.fs.cd(WORKSPACE)
 
-        # Pre-build steps
-        self.ksu.install()
-        self.susfs.apply()
-        self.lxc.apply()
-
-        # Main build steps
-        self.builder.build()
+        if self.incremental:
+            # Keep out/ and the patched tree, re-apply only what changed
+            self._prebuild_incremental(fingerprint)
+        elif self.source.applied(WORKSPACE) == fingerprint:
+            # Same commits and patches as last time: only out/ is dropped
+            log("Pre-build inputs unchanged, reusing the patched tree")
+            shutil.rmtree(WORKSPACE / "out", ignore_errors=True)
+        else:
+            # Recorded up front, so a failed pre-build taints the tree
+            self.source.mark_applied(WORKSPACE, PREBUILD_PENDING)
+            self._prebuild()
+            self.source.mark_applied(WORKSPACE, fingerprint)
+
+        # Main build steps, only the targets the requested artifacts need
+        self.builder.build(targets=list(self.plan.targets))
 
         # Post build
-        self.kpm.patch()
+        if self.plan.builds_image:
+            self.kpm.patch()
         self.export_env.export_github_env()
 
-        # Build flashable
-        self.flashable.build_anykernel3()
-        self.flashable.build_boot_image()
+        # Build artifacts
+        produced: dict[str, Path] = {}
+        if self.plan.wants("anykernel3"):
+            self.flashable.build_anykernel3()
+            produced["anykernel3"] = OUTPUT / "AnyKernel3.zip"
+        if self.plan.wants("boot"):
+            self.flashable.build_boot_image()
+            produced["boot"] = OUTPUT / "boot.img"
+        if self.plan.wants("modules"):
+            produced["modules"] = self.builder.package_modules(OUTPUT / "modules")
+        if self.plan.wants("vmlinux"):
+            produced["vmlinux"] = Path(
+                shutil.copyfile(WORKSPACE / "out" / "vmlinux", OUTPUT / "vmlinux")
+            )
 
         # Rename artifacts
         log("Renaming build artifacts...")
+        tracer.instant("artifacts")
 
         version: str = self.builder.get_kernel_version()
         suffix: str = self.variants.suffix
 
-        anykernel_src: Path = OUTPUT / "AnyKernel3.zip"
-        boot_src: Path = OUTPUT / "boot.img"
-
-        anykernel_dest: Path = (
-            OUTPUT / f"{KERNEL_NAME}-{version}{suffix}-AnyKernel3.zip"
-        )
-        boot_dest: Path = OUTPUT / f"{KERNEL_NAME}-{version}{suffix}-boot.img"
+        for artifact, src in produced.items():
+            src.rename(OUTPUT / artifact_name(artifact, version, suffix))
 
-        anykernel_src.rename(anykernel_dest)
-        boot_src.rename(boot_dest)
+        # Done with clang: let `toolchain prune` remove its entry again
+        self.toolchain.release()
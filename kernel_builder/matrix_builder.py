@@ -0,0 +1,347 @@
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+
+from rich import print
+from rich.filesize import decimal
+from rich.table import Table
+from sh import ErrorReturnCode, cp
+
+from kernel_builder.config.config import (
+    CLANG_URL,
+    CLANG_VARIANT,
+    MATRIX_JOBS,
+    MATRIX_MEM_PER_BUILD,
+)
+from kernel_builder.constants import (
+    LOCKFILE,
+    MATRIX,
+    OUTPUT,
+    ROOT,
+    TOOLCHAIN,
+    VARIANT_JSON,
+    WORKSPACE,
+)
+from kernel_builder.pre_build.ksu import KSUInstaller
+from kernel_builder.pre_build.lxc import LXCPatcher
+from kernel_builder.pre_build.susfs import SUSFSPatcher
+from kernel_builder.pre_build.variants import Variants
+from kernel_builder.utils.clang import fetch_clang_url
+from kernel_builder.utils.fs import FileSystem
+from kernel_builder.utils.lockfile import SourceLock
+from kernel_builder.utils.log import log
+from kernel_builder.utils.resources import memory_status
+from kernel_builder.utils.source import SourceManager
+from kernel_builder.utils.targets import is_artifact
+from kernel_builder.utils.toolchain import ToolchainStore
+from kernel_builder.utils.variants_parser import (
+    Combination,
+    VariantMatrix,
+    VariantsParser,
+)
+
+
+@dataclass(slots=True)
+class MatrixVariant:
+    ksu: str
+    susfs: bool
+    lxc: bool
+
+    @property
+    def name(self) -> str:
+        return Variants(self.ksu, self.susfs, self.lxc).suffix.lstrip("-")
+
+    @property
+    def combination(self) -> Combination:
+        return self.ksu, self.susfs, self.lxc
+
+    @classmethod
+    def all(cls) -> list["MatrixVariant"]:
+        """
+        Every KSU x SUSFS x LXC combination ``variants.json`` has an entry for.
+        """
+        return [cls(*combo) for combo in variant_matrix().combinations()]
+
+    @classmethod
+    def parse(cls, name: str) -> "MatrixVariant":
+        """
+        Look a variant up by its release name, e.g. ``KSUN-SUSFS-LXC``.
+        """
+        for variant in cls.all():
+            if variant.name.upper() == name.upper():
+                return variant
+        raise ValueError(f"Unknown variant {name!r}")
+
+
+@dataclass(slots=True)
+class MatrixResult:
+    variant: MatrixVariant
+    ok: bool
+    elapsed: float
+    log: Path
+
+
+def variant_inputs(combo: Combination) -> list[Path | str]:
+    """
+    What the pre-build steps apply to the kernel tree for a combination.
+    """
+    ksu, susfs, lxc = combo
+    installer: KSUInstaller = KSUInstaller(ksu, susfs)
+    target: tuple[str, str] | None = installer.target()
+    return [
+        *([f"kernelsu:{target[0]}@{target[1]}"] if target else []),
+        *installer.patches(),
+        *SUSFSPatcher(ksu, susfs).patches(),
+        *LXCPatcher(lxc).patches(),
+    ]
+
+
+def variant_matrix() -> VariantMatrix:
+    return VariantMatrix(VariantsParser(VARIANT_JSON), variant_inputs)
+
+
+def default_jobs() -> int:
+    """
+    Variants that fit on this host at once: at least 4 cores and
+    MATRIX_MEM_PER_BUILD bytes of available memory each.
+    """
+    if MATRIX_JOBS:
+        return MATRIX_JOBS
+    cores: int = os.cpu_count() or 1
+    return max(1, min(cores // 4, memory_status().available // MATRIX_MEM_PER_BUILD))
+
+
+class MatrixBuilder:
+    """
+    Build several variants on one host.
+
+    Sources and the toolchain are synced once into the regular workspace,
+    which then serves as a pristine base: every variant gets a copy of it
+    and runs ``cli.py build`` in a child process with its own workspace,
+    output and env file. The children build with the toolchain as linked
+    here, which stays locked in the store until the last one is done.
+    Copies are reflinked where the filesystem supports
+    it (btrfs, XFS); elsewhere, e.g. on ext4, each one takes the full size
+    of the kernel tree.
+
+    Variants are built in the order of a VariantMatrix, so consecutive
+    builds differ as little as possible. With a single job they also share
+    one incremental tree, and each build only recompiles what its patches
+    and Kconfig delta touch.
+    """
+
+    def __init__(
+        self,
+        variants: list[MatrixVariant],
+        *,
+        jobs: int | None = None,
+        incremental: bool = False,
+        root: Path = MATRIX,
+    ) -> None:
+        self.variants: list[MatrixVariant] = variants
+        self.jobs: int = jobs or default_jobs()
+        self.incremental: bool = incremental
+        self.shared: bool = self.jobs == 1
+        self.root: Path = root
+        self.source: SourceManager = SourceManager()
+        self.lockfile: Path = root / "sources.lock"
+        # Holds the linked clang for as long as the children compile with it
+        self.toolchain: ToolchainStore = ToolchainStore()
+
+    def _workspace(self, variant: MatrixVariant) -> Path:
+        if self.shared:
+            return self.root / "kernel"
+        return self.root / variant.name / "kernel"
+
+    def setup(self) -> None:
+        """
+        Pin, fetch and link everything the variants share, once.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        # Every variant builds the same commits, including KernelSU
+        lock: SourceLock | None = SourceLock.load(LOCKFILE)
+        if lock is None:
+            log("No sources.lock, pinning current branch tips for this run")
+            lock = SourceLock()
+            self.source.lock_sources(lock)
+            KSUInstaller.lock_refs(lock)
+        lock.save(self.lockfile)
+
+        # The base has to be pristine: drop it if an incremental build patched it
+        if self.source.applied(WORKSPACE) is not None:
+            self.source.taint(WORKSPACE)
+        pins: dict[str, str] = self.source.resolve_pins(lock)
+        self.source.clone_sources(pins)
+
+        clang_url: str = CLANG_URL or fetch_clang_url(CLANG_VARIANT)
+        self.toolchain.link(clang_url, TOOLCHAIN / "clang")
+
+        dests: list[Path] = [
+            dest
+            for dest in dict.fromkeys(map(self._workspace, self.variants))
+            if not (self.incremental and dest.is_dir())
+        ]
+        if dests and not self._reflinks():
+            log(
+                f"{self.root} does not support reflinks: each of the "
+                f"{len(dests)} workspaces is a full copy of the kernel tree "
+                f"({decimal(FileSystem.du(WORKSPACE))})",
+                "warning",
+            )
+        for dest in dests:
+            log(f"Preparing workspace {dest}")
+            self.source.taint(dest)
+            shutil.rmtree(dest, ignore_errors=True)
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            cp("-a", "--reflink=auto", str(WORKSPACE), str(dest))
+            self.source.adopt(WORKSPACE, dest)
+
+    def _reflinks(self) -> bool:
+        """
+        Whether copies under root share their blocks with WORKSPACE.
+
+        Hardlinks are no alternative: pre-build steps such as KernelSU's
+        setup script append to files in place, which would edit the base.
+        """
+        probe: Path = self.root / ".reflink-probe"
+        try:
+            cp("--reflink=always", str(WORKSPACE / "Makefile"), str(probe))
+        except ErrorReturnCode:
+            return False
+        finally:
+            probe.unlink(missing_ok=True)
+        return True
+
+    def _build(self, variant: MatrixVariant, make_jobs: int) -> MatrixResult:
+        base: Path = self.root / variant.name
+        base.mkdir(parents=True, exist_ok=True)
+        logfile: Path = base / "build.log"
+        env: dict[str, str] = {
+            **os.environ,
+            "GKI_WORKSPACE": str(self._workspace(variant)),
+            "GKI_OUTPUT": str(base / "dist"),
+            "GKI_LOCKFILE": str(self.lockfile),
+            "GKI_ENV_FILE": str(base / "github.env"),
+            "GKI_MAKE_JOBS": str(make_jobs),
+            # Siblings compile from toolchain/ concurrently: never re-link it
+            "GKI_TOOLCHAIN_READONLY": "1",
+        }
+        cmd: list[str] = [
+            sys.executable,
+            str(ROOT / "cli.py"),
+            "build",
+            "--ksu",
+            variant.ksu,
+            "--susfs" if variant.susfs else "--no-susfs",
+            "--lxc" if variant.lxc else "--no-lxc",
+            *(["--incremental"] if self.incremental or self.shared else []),
+        ]
+
+        log(f"Building {variant.name} (make -j{make_jobs}), log: {logfile}")
+        start: float = time.monotonic()
+        with logfile.open("wb") as out:
+            proc: subprocess.CompletedProcess[bytes] = subprocess.run(
+                cmd,
+                env=env,
+                cwd=ROOT,
+                stdout=out,
+                stderr=subprocess.STDOUT,
+                check=False,
+            )
+        result: MatrixResult = MatrixResult(
+            variant, proc.returncode == 0, time.monotonic() - start, logfile
+        )
+        log(
+            f"{variant.name} {'finished' if result.ok else 'failed'} "
+            f"in {result.elapsed:.0f}s",
+            "info" if result.ok else "error",
+        )
+        return result
+
+    def _order(self) -> None:
+        matrix: VariantMatrix = variant_matrix()
+        combos: list[Combination] = [v.combination for v in self.variants]
+        matrix.check(combos)
+        order: list[Combination] = matrix.order(combos)
+        deltas = matrix.deltas(combos)
+        log(
+            f"Build order changes {matrix.path_cost(order, deltas)} inputs between "
+            f"variants (requested order: {matrix.path_cost(combos, deltas)})"
+        )
+        by_combo: dict[Combination, MatrixVariant] = {
+            v.combination: v for v in self.variants
+        }
+        self.variants = [by_combo[c] for c in order]
+
+    def _collect(self, results: list[MatrixResult]) -> None:
+        """
+        Copy the artifacts of successful builds to OUTPUT. Their names carry
+        the variant already; everything else in a variant's dist/ (ccache,
+        ThinLTO, worker and patch reports, compile times) has the same name
+        in every variant and goes to OUTPUT/<variant>/ instead.
+        """
+        OUTPUT.mkdir(parents=True, exist_ok=True)
+        for result in results:
+            if not result.ok:
+                continue
+            name: str = result.variant.name
+            reports: Path = OUTPUT / name
+            for item in (self.root / name / "dist").iterdir():
+                if item.is_file() and is_artifact(item.name, f"-{name}"):
+                    shutil.copy2(item, OUTPUT / item.name)
+                elif item.is_dir():
+                    shutil.copytree(item, reports / item.name, dirs_exist_ok=True)
+                else:
+                    reports.mkdir(parents=True, exist_ok=True)
+                    shutil.copy2(item, reports / item.name)
+
+    def _report(self, results: list[MatrixResult]) -> None:
+        table: Table = Table(title="Build matrix", title_justify="left")
+        table.add_column("Variant")
+        table.add_column("Status")
+        table.add_column("Time", justify="right")
+        table.add_column("Log")
+        for result in sorted(results, key=lambda r: self.variants.index(r.variant)):
+            table.add_row(
+                result.variant.name,
+                "[green]ok[/green]" if result.ok else "[red]failed[/red]",
+                f"{result.elapsed:.0f}s",
+                str(result.log),
+            )
+        print(table)
+
+    def run(self) -> list[MatrixResult]:
+        """
+        Set up once, then build every variant in delta order, ``jobs`` at a time.
+
+        :return: One result per variant.
+        """
+        results: list[MatrixResult] = []
+        # The toolchain entry setup links stays locked until every child is done
+        with self.toolchain:
+            self.setup()
+            self._order()
+            make_jobs: int = max(1, (os.cpu_count() or 1) // self.jobs)
+            log(f"Building {len(self.variants)} variants, {self.jobs} at a time")
+
+            with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                futures: list[Future[MatrixResult]] = [
+                    pool.submit(self._build, variant, make_jobs)
+                    for variant in self.variants
+                ]
+                for future in as_completed(futures):
+                    results.append(future.result())
+
+        self._collect(results)
+        self._report(results)
+        return results
+
+
+if __name__ == "__main__":
+    raise SystemExit("This file is meant to be imported, not executed.")
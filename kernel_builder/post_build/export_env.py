@@ -1,18 +1,26 @@
 import os
 import re
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 
-import sh
-from dotenv import set_key
-from sh import Command, head, sed
+from dotenv import dotenv_values
 
 from kernel_builder.config.config import KERNEL_NAME, RELEASE_BRANCH, RELEASE_REPO
-from kernel_builder.constants import OUTPUT, ROOT, TOOLCHAIN, WORKSPACE
+from kernel_builder.constants import ENV_FILE, GITHUB_API, OUTPUT, WORKSPACE
 from kernel_builder.pre_build.variants import Variants
 from kernel_builder.utils.build import Builder
+from kernel_builder.utils.clang import clang_binary, clang_version
+from kernel_builder.utils.fs import FileSystem
 from kernel_builder.utils.github import GithubAPI
 from kernel_builder.utils.log import log
+from kernel_builder.utils.trace import traced
+
+KSU_RELEASES: dict[str, str] = {
+    "official_version": f"{GITHUB_API}/repos/tiann/KernelSU/releases/latest",
+    "suki_version": f"{GITHUB_API}/repos/SukiSU-Ultra/SukiSU-Ultra/releases/latest",
+    "next_version": f"{GITHUB_API}/repos/KernelSU-Next/KernelSU-Next/releases/latest",
+}
 
 
 class GithubExportEnv:
@@ -20,45 +28,45 @@ class GithubExportEnv:
         self.builder: Builder = Builder()
         self.variants: Variants = Variants(ksu, susfs, lxc)
         self.gh_api: GithubAPI = GithubAPI()
-        self.env_file: Path = ROOT / "github.env"
+        self.env_file: Path = ENV_FILE
 
     def _write_env(self, env_map: dict[str, str]) -> None:
-        self.env_file.touch()
-        for k, v in env_map.items():
-            set_key(self.env_file, k.strip(), v.strip())
-
-    def export_github_env(self) -> None:
-        # Get Clang version
-        clang: Command = sh.Command(str(TOOLCHAIN / "clang" / "bin" / "clang"))
-        raw_toolchain = head("-n", "1", _in=clang("-v", _err_to_out=True))
-        toolchain: str = str(
-            sed("s/(https..*//; s/ version//", _in=raw_toolchain)
-        ).strip()
-
-        # Get SUSFS version
-        susfs_version: str | None = re.search(
-            r"v\d+\.\d+\.\d+",
-            (
-                WORKSPACE
-                / "susfs4ksu"
-                / "kernel_patches"
-                / "include"
-                / "linux"
-                / "susfs.h"
-            ).read_text(),
-        ).group()  # pyright: ignore[reportOptionalMemberAccess]
-
-        # Get KernelSU version
-        official_version: str = self.gh_api.fetch_latest_tag(
-            "https://api.github.com/repos/tiann/KernelSU/releases/latest"
+        # Merge with existing keys and write once, in dotenv's quoting
+        env: dict[str, str | None] = (
+            dotenv_values(self.env_file) if self.env_file.exists() else {}
         )
-        suki_version: str = self.gh_api.fetch_latest_tag(
-            "https://api.github.com/repos/SukiSU-Ultra/SukiSU-Ultra/releases/latest"
+        env.update({k.strip(): v.strip() for k, v in env_map.items()})
+        FileSystem.write_atomic(
+            self.env_file,
+            "".join(f"{k}={self._quote(v or '')}\n" for k, v in env.items()),
         )
-        next_version: str = self.gh_api.fetch_latest_tag(
-            "https://api.github.com/repos/KernelSU-Next/KernelSU-Next/releases/latest"
+
+    @staticmethod
+    def _quote(value: str) -> str:
+        escaped: str = value.replace("'", "\\'")
+        return f"'{escaped}'"
+
+    @staticmethod
+    def _susfs_version() -> str:
+        susfs_h: Path = (
+            WORKSPACE / "susfs4ksu" / "kernel_patches" / "include" / "linux" / "susfs.h"
         )
-        ksu_version: str = os.getenv("KSU_VERSION", "Unknown")
+        match: re.Match[str] | None = re.search(r"v\d+\.\d+\.\d+", susfs_h.read_text())
+        if match is None:
+            raise RuntimeError(f"Unable to determine SuSFS version from {susfs_h}")
+        return match.group()
+
+    @traced("export env")
+    def export_github_env(self) -> None:
+        # Network lookups and the toolchain probe run side by side
+        with ThreadPoolExecutor(max_workers=len(KSU_RELEASES) + 2) as pool:
+            toolchain: Future[str] = pool.submit(clang_version, clang_binary())
+            susfs_version: Future[str] = pool.submit(self._susfs_version)
+            ksu_versions: dict[str, Future[str]] = {
+                key: pool.submit(self.gh_api.fetch_latest_tag, api)
+                for key, api in KSU_RELEASES.items()
+            }
+            kernel_version: str = self.builder.get_kernel_version()
 
         # Get build timestamp
         now: datetime = datetime.now(timezone.utc)
@@ -67,14 +75,12 @@ class GithubExportEnv:
         # Writing Env
         env_map: dict[str, str] = {
             "output": str(OUTPUT),
-            "version": self.builder.get_kernel_version(),
+            "version": kernel_version,
             "variant": self.variants.suffix,
-            "susfs_version": susfs_version,
-            "ksu_version": ksu_version,
-            "official_version": official_version,
-            "suki_version": suki_version,
-            "next_version": next_version,
-            "toolchain": toolchain,
+            "susfs_version": susfs_version.result(),
+            "ksu_version": os.getenv("KSU_VERSION", "Unknown"),
+            **{key: future.result() for key, future in ksu_versions.items()},
+            "toolchain": toolchain.result(),
             "build_time": current_time,
             "release_repo": RELEASE_REPO,
             "release_branch": RELEASE_BRANCH,
@@ -9,6 +9,7 @@ from kernel_builder.constants import OUTPUT, TOOLCHAIN, WORKSPACE
 from kernel_builder.utils.command import curl
 from kernel_builder.utils.fs import FileSystem
 from kernel_builder.utils.log import log
+from kernel_builder.utils.trace import traced
 
 
 class FlashableBuilder:
@@ -31,6 +32,7 @@ class FlashableBuilder:
         shutil.copyfile(self.image_path, target / self.image_path.name)
         log(f"Staged {self.image_path.name} into {target}")
 
+    @traced("AnyKernel3")
     def build_anykernel3(self) -> None:
         """
         Build a flashable AnyKernel3 ZIP package.
@@ -48,6 +50,7 @@ class FlashableBuilder:
 
         log(f"Created AnyKernel3.zip at {OUTPUT}")
 
+    @traced("boot image")
     def build_boot_image(self) -> None:
         """
         Create and sign the boot image from the GKI release.
@@ -6,11 +6,12 @@ import lz4.frame
 from sh import Command, chmod
 
 from kernel_builder.config.config import IMAGE_COMP
-from kernel_builder.constants import WORKSPACE
+from kernel_builder.constants import GITHUB_API, WORKSPACE
 from kernel_builder.utils.command import curl
 from kernel_builder.utils.fs import FileSystem
 from kernel_builder.utils.github import GithubAPI
 from kernel_builder.utils.log import log
+from kernel_builder.utils.trace import traced
 
 
 class KPMPatcher:
@@ -27,6 +28,21 @@ class KPMPatcher:
             return lz4.frame.open(path, mode)
         return path.open(mode)
 
+    def decompress(self, src: Path, dest: Path) -> None:
+        if self.image_comp == "raw":
+            shutil.copy(src, dest)
+            return
+        with self._open(src, "rb") as fsrc, dest.open("wb") as fdst:
+            shutil.copyfileobj(fsrc, fdst)
+
+    def compress(self, src: Path, dest: Path) -> None:
+        if self.image_comp == "raw":
+            shutil.copy(src, dest)
+            return
+        with src.open("rb") as fsrc, self._open(dest, "wb") as fdst:
+            shutil.copyfileobj(fsrc, fdst)
+
+    @traced("KPM")
     def patch(self) -> None:
         if self.ksu != "SUKI":
             return
@@ -45,7 +61,7 @@ class KPMPatcher:
             self.fs.cd(temp)
 
             latest_kpm_patcher: str = self.gh.fetch_latest_download_url(
-                "https://api.github.com/repos/SukiSU-Ultra/SukiSU_KernelPatch_patch/releases/latest",
+                f"{GITHUB_API}/repos/SukiSU-Ultra/SukiSU_KernelPatch_patch/releases/latest",
                 "patch_linux",
             )
             curl("-o", str(kpm_patcher_path), latest_kpm_patcher)
@@ -53,14 +69,7 @@ class KPMPatcher:
             patcher: Command = Command(kpm_patcher_path)
 
             shutil.move(image_path, temp_img)
-            if self.image_comp == "raw":
-                shutil.copy(temp_img, decompressed)
-            else:
-                with (
-                    self._open(temp_img, "rb") as fsrc,
-                    decompressed.open("wb") as fdst,
-                ):
-                    shutil.copyfileobj(fsrc, fdst)
+            self.decompress(temp_img, decompressed)
 
             patcher()
 
@@ -72,11 +81,7 @@ class KPMPatcher:
             temp_img.unlink(missing_ok=True)
             image_path.unlink(missing_ok=True)
 
-            if self.image_comp == "raw":
-                shutil.copy(patched, temp_img)
-            else:
-                with patched.open("rb") as fsrc, self._open(temp_img, "wb") as fdst:
-                    shutil.copyfileobj(fsrc, fdst)
+            self.compress(patched, temp_img)
             shutil.move(temp_img, image_path)
 
             log("KPM patch applied successfully")
@@ -1,37 +1,38 @@
 from pathlib import Path
 
-from sh import Command
-
-from kernel_builder.config.config import LTO
+from kernel_builder.config.config import KCONFIG_FRAGMENTS, LTO
 from kernel_builder.constants import VARIANT_JSON, WORKSPACE
+from kernel_builder.utils.kconfig import KconfigFile
 from kernel_builder.utils.log import log
+from kernel_builder.utils.trace import traced
 from kernel_builder.utils.variants_parser import VariantsParser
 
 
-def _config(
-    conf: str, mode: bool, target: Path = WORKSPACE / "out" / ".config"
-) -> None:
-    config: Command = Command(str(WORKSPACE / "scripts" / "config"))
-    config("--file", str(target), "--enable" if mode else "--disable", conf)
-    log(f"{'Enabling' if mode else 'Disabling'} config: {conf}")
+def _lto() -> dict[str, bool]:
+    return {
+        "CONFIG_LTO_CLANG": True,  # Enable LTO
+        "CONFIG_LTO_CLANG_THIN": LTO == "thin",
+        "CONFIG_LTO_CLANG_FULL": LTO != "thin",
+    }
 
 
-def _lto() -> None:
-    _config("CONFIG_LTO_CLANG", True)  # Enable LTO
+def overrides() -> dict[str, bool]:
+    """
+    Options set on top of the defconfig: the variant's, then clang LTO.
+    """
+    parser: VariantsParser = VariantsParser(VARIANT_JSON)
+    return {**parser.config(), **_lto()}
 
-    if LTO == "thin":
-        _config("CONFIG_LTO_CLANG_THIN", True)
-        _config("CONFIG_LTO_CLANG_FULL", False)
-    else:
-        _config("CONFIG_LTO_CLANG_THIN", False)
-        _config("CONFIG_LTO_CLANG_FULL", True)
 
+@traced("configurator")
+def configurator(target: Path = WORKSPACE / "out" / ".config") -> None:
+    config: KconfigFile = KconfigFile(target)
 
-def configurator() -> None:
-    parser: VariantsParser = VariantsParser(VARIANT_JSON)
+    config.update(overrides())
 
-    for k, v in parser.config().items():
-        _config(k, v)
+    for fragment in KCONFIG_FRAGMENTS:
+        log(f"Merging config fragment: {fragment}")
+        config.merge(fragment)
 
-    # Clang LTO setup
-    _lto()
+    for sym, old, new in config.save():
+        log(f"Config {sym}: {old or 'undef'} -> {new or 'undef'}")
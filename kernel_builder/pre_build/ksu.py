@@ -2,15 +2,27 @@ import os
 import subprocess
 from pathlib import Path
 
-from kernel_builder.constants import PATCHES, WORKSPACE
-from kernel_builder.utils.command import apply_patch
+from sh import ErrorReturnCode
+
+from kernel_builder.constants import (
+    GITHUB_API,
+    GITHUB_RAW,
+    LOCKFILE,
+    PATCHES,
+    WORKSPACE,
+)
+from kernel_builder.utils.command import apply_patch, patch_report
 from kernel_builder.utils.github import GithubAPI
+from kernel_builder.utils.lockfile import SourceLock
 from kernel_builder.utils.log import log
 from kernel_builder.utils.source import SourceManager
+from kernel_builder.utils.trace import traced
 
 
 class KSUInstaller:
+    VARIANTS: tuple[str, ...] = ("OFFICIAL", "NEXT", "SUKI")
     MANUAL_HOOK_UNSUPPORTED: list[str] = ["NONE", "OFFICIAL"]
+    HOOK_PATCH: Path = PATCHES / "syscall_hooks_v1.5.patch"
     KNOWN_KSU_DRIVER_PATHS: list[Path] = [
         WORKSPACE / "drivers" / "kernelsu",
         WORKSPACE / "drivers" / "staging" / "kernelsu",
@@ -21,8 +33,10 @@ class KSUInstaller:
         self.gh_api: GithubAPI = GithubAPI()
         self.variant: str = ksu
         self.use_susfs: bool = susfs
+        # Commit the KernelSU ref resolved to, once looked up
+        self._commit: str | None = None
 
-    def _install_ksu(self, url: str, ref: str | None) -> None:
+    def _install_ksu(self, url: str, ref: str) -> None:
         # Normalize URL format
         if not self.source.is_simplified(url):
             url = self.source.git_simplifier(url)
@@ -33,24 +47,50 @@ class KSUInstaller:
         else:
             user, repo = url.split(":", 1)[1].split("/", 1)
         latest_tag: str = self._fetch_latest_tag(user, repo)
-        ref = ref or latest_tag
 
-        # Expose latest KernelSU version to environment
-        os.environ["KSU_VERSION"] = latest_tag
+        # Install the commit the pre-build fingerprint recorded, so a branch
+        # moving in between cannot change what is built
+        commit: str | None = self.ref()
+        assert commit is not None
+        version: str = latest_tag
+        if self._locked(url, ref) == commit and not self._is_release(
+            url, latest_tag, commit
+        ):
+            version = commit[:12]
+            log(
+                f"Locked KernelSU commit {version} is not the latest release "
+                f"{latest_tag}, reporting it as the version",
+                "warning",
+            )
+
+        # Expose KernelSU version to environment
+        os.environ["KSU_VERSION"] = version
 
         # Setup KernelSU
-        log(f"Installing KernelSU from {url} | {ref}")
-        self._run_setup(url, ref)
+        log(f"Installing KernelSU from {url} | {ref} ({commit})")
+        self._run_setup(url, commit)
 
         # Setup manual hooks
         self._patch_manual_hooks()
 
+    @staticmethod
+    def _locked(repo: str, ref: str) -> str | None:
+        lock: SourceLock | None = SourceLock.load(LOCKFILE)
+        return lock.commit(repo, ref, kernelsu=True) if lock else None
+
+    @staticmethod
+    def _is_release(repo: str, tag: str, commit: str) -> bool:
+        try:
+            return SourceManager.resolve_ref(repo, tag) == commit
+        except (ErrorReturnCode, ValueError):
+            return False
+
     def _fetch_latest_tag(self, user: str, repo: str) -> str:
-        api_url: str = f"https://api.github.com/repos/{user}/{repo}/releases/latest"
+        api_url: str = f"{GITHUB_API}/repos/{user}/{repo}/releases/latest"
         return self.gh_api.fetch_latest_tag(api_url)
 
     def _run_setup(self, url: str, ref: str) -> None:
-        setup_url: str = f"https://raw.githubusercontent.com/{url.split(':', 1)[1]}/{ref}/kernel/setup.sh"
+        setup_url: str = f"{GITHUB_RAW}/{url.split(':', 1)[1]}/{ref}/kernel/setup.sh"
 
         # Fetch setup script
         script: subprocess.CompletedProcess[bytes] = subprocess.run(
@@ -69,10 +109,89 @@ class KSUInstaller:
             log(f"Skipping manual hooks patch for variant: {self.variant}")
             return
 
-        hook_patch: Path = PATCHES / "syscall_hooks_v1.5.patch"
+        apply_patch(
+            self.HOOK_PATCH,
+            check=False,
+            cwd=WORKSPACE,
+            report=patch_report(self.HOOK_PATCH),
+        )
 
-        apply_patch(hook_patch, check=False, cwd=WORKSPACE)
+    def target(self) -> tuple[str, str] | None:
+        """
+        KernelSU repository and ref for this variant.
 
+        :return: (simplified repo URL, ref), or None if there is nothing to install.
+        """
+        match self.variant.upper():
+            case "OFFICIAL":
+                return "github.com:tiann/KernelSU", "main"
+            case "NEXT":
+                return (
+                    "github.com:ESK-Project/KernelSU-Next",
+                    "next-susfs" if self.use_susfs else "next",
+                )
+            case "SUKI":
+                return (
+                    "github.com:SukiSU-Ultra/SukiSU-Ultra",
+                    "susfs-main" if self.use_susfs else "nongki",
+                )
+            case _:
+                return None
+
+    @classmethod
+    def lock_refs(cls, lock: SourceLock) -> None:
+        """
+        Pin the KernelSU ref of every variant to its current commit.
+
+        :param lock: Lock to add the pins to.
+        :return: None
+        """
+        for variant in cls.VARIANTS:
+            for susfs in (False, True):
+                target: tuple[str, str] | None = cls(variant, susfs).target()
+                if target is None:
+                    continue
+                repo, ref = target
+                lock.pin(repo, ref, SourceManager.resolve_ref(repo, ref), kernelsu=True)
+
+    def patches(self) -> list[Path]:
+        """
+        Patches applied to the kernel tree on top of the KernelSU driver.
+
+        :return: Patch files, in the order they are applied.
+        """
+        if self.variant.upper() in self.MANUAL_HOOK_UNSUPPORTED:
+            return []
+        return [self.HOOK_PATCH]
+
+    def applied(self) -> bool:
+        """
+        Whether KernelSU is already set up in the kernel tree.
+
+        :return: True if there is nothing to install or a driver is present.
+        """
+        if self.target() is None:
+            return True
+        return any(path.exists() for path in self.KNOWN_KSU_DRIVER_PATHS)
+
+    def ref(self) -> str | None:
+        """
+        Commit the configured KernelSU ref resolves to (the locked one if any).
+        It is resolved once, and ``install`` sets up exactly this commit.
+
+        :return: Commit SHA, or None if there is nothing to install.
+        """
+        target: tuple[str, str] | None = self.target()
+        if target is None:
+            return None
+        if self._commit is None:
+            repo, ref = target
+            self._commit = self._locked(repo, ref) or SourceManager.resolve_ref(
+                repo, ref
+            )
+        return self._commit
+
+    @traced("KernelSU")
     def install(self) -> None:
         variant: str = self.variant.upper()
 
@@ -80,24 +199,12 @@ class KSUInstaller:
             log("Skipping KernelSU setup (Disabled)")
             return
 
-        repo: str
-        ref: str | None
-
-        match variant:
-            case "OFFICIAL":
-                repo = "github.com:tiann/KernelSU"
-                ref = "main"
-            case "NEXT":
-                repo = "github.com:ESK-Project/KernelSU-Next"
-                ref = "next-susfs" if self.use_susfs else "next"
-            case "SUKI":
-                repo = "github.com:SukiSU-Ultra/SukiSU-Ultra"
-                ref = "susfs-main" if self.use_susfs else "nongki"
-            case _:
-                log(f"Unknown KernelSU variant {variant}, skipping install")
-                return
+        target: tuple[str, str] | None = self.target()
+        if target is None:
+            log(f"Unknown KernelSU variant {variant}, skipping install")
+            return
 
-        self._install_ksu(repo, ref)
+        self._install_ksu(*target)
 
 
 if __name__ == "__main__":
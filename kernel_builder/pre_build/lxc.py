@@ -1,19 +1,29 @@
 from pathlib import Path
 
-from kernel_builder.constants import PATCHES
-from kernel_builder.utils.command import apply_patch
+from kernel_builder.constants import PATCHES, WORKSPACE
+from kernel_builder.utils.command import apply_patch, is_patch_applied, patch_report
 from kernel_builder.utils.log import log
+from kernel_builder.utils.trace import traced
 
 
 class LXCPatcher:
+    PATCH: Path = PATCHES / "lxc_support.patch"
+
     def __init__(self, lxc: bool) -> None:
         self.lxc: bool = lxc
 
+    def patches(self) -> list[Path]:
+        return [self.PATCH] if self.lxc else []
+
+    def applied(self) -> bool:
+        return not self.lxc or is_patch_applied(self.PATCH, cwd=WORKSPACE)
+
+    @traced("LXC")
     def apply(self) -> None:
-        LXC: Path = PATCHES / "lxc_support.patch"
+        LXC: Path = self.PATCH
         if self.lxc:
             log("Applying LXC Patches")
-            apply_patch(LXC)
+            apply_patch(LXC, report=patch_report(LXC))
         else:
             return
 
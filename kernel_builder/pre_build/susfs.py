@@ -3,11 +3,15 @@ import shutil
 from pathlib import Path
 
 from kernel_builder.constants import WORKSPACE
-from kernel_builder.utils.command import apply_patch
+from kernel_builder.utils.command import apply_patch, is_patch_applied, patch_report
 from kernel_builder.utils.log import log
+from kernel_builder.utils.trace import traced
 
 
 class SUSFSPatcher:
+    SUSFS: Path = WORKSPACE / "susfs4ksu" / "kernel_patches"
+    GKI_SUSFS: Path = SUSFS / "50_add_susfs_in_gki-android12-5.10.patch"
+
     def __init__(self, ksu: str, susfs: bool) -> None:
         self.ksu_variant: str = ksu
         self.susfs: bool = susfs
@@ -22,20 +26,31 @@ class SUSFSPatcher:
             else:
                 shutil.copy2(src_path, dst_path)
 
+    def patches(self) -> list[Path]:
+        if self.ksu_variant == "NONE" or not self.susfs:
+            return []
+        return [self.GKI_SUSFS]
+
+    def applied(self) -> bool:
+        if self.ksu_variant == "NONE" or not self.susfs:
+            return True
+        return is_patch_applied(self.GKI_SUSFS, cwd=WORKSPACE)
+
+    @traced("SUSFS")
     def apply(self) -> None:
         if self.ksu_variant == "NONE" or not self.susfs:
             return
 
         os.chdir(WORKSPACE)
 
-        SUSFS: Path = WORKSPACE / "susfs4ksu" / "kernel_patches"
-        GKI_SUSFS: Path = SUSFS / "50_add_susfs_in_gki-android12-5.10.patch"
+        SUSFS: Path = self.SUSFS
+        GKI_SUSFS: Path = self.GKI_SUSFS
 
         log("Applying kernel-side SUSFS patches")
         self.copy(SUSFS / "fs", WORKSPACE / "fs")
         self.copy(SUSFS / "include" / "linux", WORKSPACE / "include" / "linux")
 
-        apply_patch(GKI_SUSFS)
+        apply_patch(GKI_SUSFS, report=patch_report(GKI_SUSFS))
 
 
 if __name__ == "__main__":
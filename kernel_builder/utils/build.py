@@ -1,23 +1,42 @@
 import os
 import re
+import shutil
 import sys
-from os import cpu_count
+from collections.abc import Callable
 from pathlib import Path
 
-from sh import make
+from sh import RunningCommand, make
 
-from kernel_builder.config.config import BUILD_HOST, BUILD_USER, DEFCONFIG, IMAGE_COMP
+from kernel_builder.config.config import (
+    BUILD_ARTIFACTS,
+    BUILD_HOST,
+    BUILD_USER,
+    DEFCONFIG,
+    IMAGE_COMP,
+    KCONFIG_FRAGMENTS,
+    LTO,
+)
 from kernel_builder.constants import (
     CLANG_TRIPLE,
     CROSS_COMPILE,
     LLVM,
     LLVM_IAS,
+    OUTPUT,
     TOOLCHAIN,
     WORKSPACE,
 )
-from kernel_builder.pre_build.configurator import configurator
+from kernel_builder.pre_build.configurator import configurator, overrides
+from kernel_builder.utils.ccache import Ccache
+from kernel_builder.utils.clang import clang_hash
+from kernel_builder.utils.compile_profile import CompileProfile
+from kernel_builder.utils.config_cache import ConfigCache
+from kernel_builder.utils.distributed import WorkerPool
 from kernel_builder.utils.fs import FileSystem
 from kernel_builder.utils.log import log
+from kernel_builder.utils.resources import Jobserver, ResourceMonitor, job_budget
+from kernel_builder.utils.targets import plan
+from kernel_builder.utils.thinlto import ThinLtoCache
+from kernel_builder.utils.trace import span, traced, tracer
 
 
 class Builder:
@@ -27,7 +46,15 @@ class Builder:
         self.workspace: Path = WORKSPACE
         self.defconfig: str = DEFCONFIG
         self.image_comp: str = IMAGE_COMP
-        self.jobs: int = cpu_count() or 4
+        self.jobs: int = int(os.getenv("GKI_MAKE_JOBS", "0")) or job_budget(LTO)
+        self.jobserver: Jobserver | None = None
+        self.ccache: Ccache = Ccache(basedir=self.workspace)
+        self.config_cache: ConfigCache = ConfigCache()
+        self.profile: CompileProfile = CompileProfile(self.workspace / "out")
+        self.thinlto: ThinLtoCache = ThinLtoCache(self.workspace / "out")
+        self.workers: WorkerPool = WorkerPool(
+            self.workspace / "out", cached=self.ccache.available
+        )
 
         BUILD_ENV_OVERRIDES = {
             # Arch
@@ -38,8 +65,12 @@ class Builder:
             "KBUILD_BUILD_HOST": BUILD_HOST,
             # Clang
             "PATH": f"{self.clang_bin}{os.pathsep}{os.getenv('PATH', '')}",
-            "CC": "ccache clang",
-            "CXX": "ccache clang++",
+            "CC": self.profile.compiler(
+                self.workers.compiler(self.ccache.compiler("clang"))
+            ),
+            "CXX": self.profile.compiler(
+                self.workers.compiler(self.ccache.compiler("clang++"))
+            ),
             # Cross compile
             "CLANG_TRIPLE": CLANG_TRIPLE,
             "CROSS_COMPILE": CROSS_COMPILE,
@@ -50,33 +81,134 @@ class Builder:
         }
         self.make_env: dict[str, str] = {**os.environ, **BUILD_ENV_OVERRIDES}
 
-    def _make(self, args: list[str] | None = None, *, jobs: int) -> None:
-        make(
-            f"-j{jobs}",
-            *(args or []),
-            "O=out",
-            _cwd=Path.cwd(),
-            _env={**self.make_env},
-            _out=sys.stdout,
-            _err=sys.stderr,
+    def _make(
+        self,
+        args: list[str] | None = None,
+        *,
+        jobs: int,
+        env: dict[str, str] | None = None,
+        out: Callable[[str], None] | None = None,
+    ) -> None:
+        # Under a jobserver, make takes its job tokens from it instead of -j
+        js: Jobserver | None = self.jobserver
+        with span(f"make {' '.join(args or [])}", "subprocess", jobs=jobs) as s:
+            proc: RunningCommand = make(
+                *([] if js else [f"-j{jobs}"]),
+                *(args or []),
+                "O=out",
+                _cwd=Path.cwd(),
+                _env={
+                    **self.make_env,
+                    **(env or {}),
+                    **({"MAKEFLAGS": js.makeflags} if js else {}),
+                },
+                _pass_fds=js.fds if js else (),
+                _out=out or sys.stdout,
+                _err=sys.stderr,
+                _bg=True,
+                _bg_exc=False,
+            )
+            s.pid = proc.pid
+            proc.wait()
+
+    @traced("kernel build")
+    def build(self, jobs: int | None = None, targets: list[str] | None = None) -> None:
+        """
+        Configure and run make for ``targets``, by default what the
+        configured BUILD_ARTIFACTS need (see utils/targets.py).
+        """
+        targets = targets or list(plan(BUILD_ARTIFACTS, self.image_comp).targets)
+        jobs = jobs or self.jobs
+        log(f"Start build: {self.defconfig=}, {jobs or self.jobs=}, {targets=}")
+        self.ccache.prepare()
+        self.make_env.update(self.ccache.env())
+        self.thinlto.prepare(self.workspace)
+
+        # make -j is lowered while the host is short on memory, and raised
+        # back up to `jobs` once it recovers. Worker slots are added on top,
+        # a remote compile only preprocesses here
+        with (
+            self.workers.prepare() as pool,
+            Jobserver(jobs + pool.slots) as self.jobserver,
+            ResourceMonitor(self.jobserver, lto=LTO) as monitor,
+        ):
+            self.make_env.update(pool.env())
+            try:
+                with monitor.phase("config"):
+                    self.configure(jobs=jobs)
+
+                log("Starting full build.")
+                self.profile.begin()
+                with monitor.phase("build"):
+                    self._make(
+                        targets,
+                        jobs=jobs,
+                        env=self.profile.env(),
+                        out=self.profile.parse,
+                    )
+                self.profile.finish()
+            finally:
+                self.jobserver = None
+        monitor.report()
+        self.profile.report(dest=OUTPUT / "compile-times.csv")
+        self.workers.report(OUTPUT / "workers.json")
+        self.ccache.report(jobs, OUTPUT / "ccache.json")
+        self.thinlto.report(OUTPUT / "thinlto.json")
+        log("Build completed successfully.")
+
+    @traced("modules archive")
+    def package_modules(self, dest: Path) -> Path:
+        """
+        Install the built modules (stripped) below out/ and pack them.
+
+        :param dest: Archive path without the .tar.gz suffix.
+        :return: Path to the archive.
+        """
+        staging: Path = self.workspace / "out" / "modules_install"
+        self.fs.reset_path(staging)
+        self._make(
+            ["modules_install", f"INSTALL_MOD_PATH={staging}", "INSTALL_MOD_STRIP=1"],
+            jobs=self.jobs,
         )
+        archive: str = shutil.make_archive(str(dest), "gztar", root_dir=staging)
+        log(f"Packed modules into {archive}")
+        return Path(archive)
 
-    def build(self, jobs: int | None = None) -> None:
-        target: str = (
-            "Image" if self.image_comp == "raw" else f"Image.{self.image_comp}"
+    def _config_key(self) -> str:
+        kbuild_env: dict[str, str] = {
+            k: self.make_env[k]
+            for k in ("ARCH", "CLANG_TRIPLE", "CROSS_COMPILE", "LLVM", "LLVM_IAS")
+        }
+        return self.config_cache.key(
+            self.workspace,
+            self.workspace / "arch" / "arm64" / "configs" / self.defconfig,
+            overrides(),
+            fragments=KCONFIG_FRAGMENTS,
+            compiler=clang_hash(),
+            env=kbuild_env,
         )
+
+    @traced("configure")
+    def configure(self, jobs: int | None = None) -> None:
+        """
+        Produce out/.config, from the resolved config cache when its inputs
+        are unchanged, otherwise with defconfig, configurator and olddefconfig.
+        """
         jobs = jobs or self.jobs
-        log(f"Start build: {self.defconfig=}, {jobs or self.jobs=}, {self.image_comp=}")
+        dotconfig: Path = self.workspace / "out" / ".config"
+        key: str = self._config_key()
+        if self.config_cache.restore(key, dotconfig):
+            log("Using cached resolved config, skipping defconfig/olddefconfig")
+            tracer.instant("config cache hit", key=key)
+            return
+
         self._make([self.defconfig], jobs=jobs)
 
         configurator()
 
         log("Making olddefconfig")
         self._make(["olddefconfig"], jobs=jobs)
-
-        log("Starting full build.")
-        self._make([target, "modules"], jobs=jobs)
-        log("Build completed successfully.")
+        self.config_cache.store(key, dotconfig)
 
     def get_kernel_version(self) -> str:
         makefile: str = (self.workspace / "Makefile").read_text()
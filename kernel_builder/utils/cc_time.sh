@@ -0,0 +1,31 @@
+#!/usr/bin/env bash
+# Compiler wrapper used by CompileProfile: runs the compiler given as
+# arguments and, while GKI_TU_LOG is set, appends one tab separated line per
+# call to it: start, end, exit status, working directory, output, source.
+
+[ -n "$GKI_TU_LOG" ] || exec "$@"
+
+start=$EPOCHREALTIME
+"$@"
+status=$?
+end=$EPOCHREALTIME
+
+out=
+src=
+prev=
+for arg in "$@"; do
+    if [ "$prev" = -o ]; then
+        out=$arg
+    else
+        case $arg in
+        -*) ;;
+        *.c | *.S | *.s | *.cc | *.cpp) src=$arg ;;
+        esac
+    fi
+    prev=$arg
+done
+
+# One short write per line, so parallel jobs do not interleave
+[ -n "$out" ] && printf '%s\t%s\t%s\t%s\t%s\t%s\n' \
+    "$start" "$end" "$status" "$PWD" "$out" "$src" >>"$GKI_TU_LOG"
+exit $status
@@ -0,0 +1,263 @@
+import json
+import os
+import shutil
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from rich import print
+from rich.filesize import decimal
+from rich.table import Table
+from sh import Command, ErrorReturnCode
+
+from kernel_builder.config.config import CCACHE_MAX_SIZE, CCACHE_ROOT, CCACHE_SEED
+from kernel_builder.constants import WORKSPACE
+from kernel_builder.utils.clang import clang_hash
+from kernel_builder.utils.download import ZSTD_SUFFIXES, extract_zstd
+from kernel_builder.utils.extract import ParallelExtractor
+from kernel_builder.utils.fs import FileSystem
+from kernel_builder.utils.log import log
+
+# Reproducibility-safe settings, passed as CCACHE_* variables so they apply
+# to every build regardless of the user's ccache.conf
+PROFILE: dict[str, str] = {
+    "CCACHE_COMPILERCHECK": "content",
+    "CCACHE_NOHASHDIR": "1",
+    "CCACHE_SLOPPINESS": "file_macro,include_file_ctime,include_file_mtime,time_macros",
+    "CCACHE_DIRECT": "1",
+    "CCACHE_COMPRESS": "1",
+    "CCACHE_MAXSIZE": CCACHE_MAX_SIZE,
+}
+
+# Files in a cache directory that describe that cache rather than hold results
+_LOCAL_FILES: frozenset[str] = frozenset({"stats", "ccache.conf", "builder.json"})
+
+
+@dataclass(slots=True)
+class CcacheReport:
+    namespace: str
+    hits: int
+    misses: int
+    uncacheable: int
+    hit_rate: float
+    time_saved: float
+    size: int
+    files: int
+
+    def table(self) -> Table:
+        table: Table = Table(title="ccache", title_justify="left", show_header=False)
+        table.add_row("Namespace", self.namespace)
+        table.add_row("Hits / misses", f"{self.hits} / {self.misses}")
+        table.add_row("Hit rate", f"{self.hit_rate:.1%}")
+        table.add_row("Uncacheable", str(self.uncacheable))
+        table.add_row("Time saved (est.)", f"{self.time_saved:.0f}s")
+        table.add_row("Cache size", f"{decimal(self.size)} in {self.files} files")
+        return table
+
+
+class Ccache:
+    """
+    The compiler cache used by Builder.
+
+    Every clang binary gets its own namespace below CCACHE_ROOT (named after
+    its hash), so toolchain updates never evict or pollute each other's
+    entries and a namespace can be shipped around as one directory. Without
+    a ccache executable the builder compiles with plain clang.
+
+    CCACHE_BASEDIR is the workspace being compiled, so paths below it are
+    hashed relative to the tree and kernel/, matrix/*/kernel and worker
+    workspaces share entries wherever they live.
+    """
+
+    def __init__(
+        self,
+        root: Path = CCACHE_ROOT,
+        seed: Path | None = CCACHE_SEED,
+        basedir: Path = WORKSPACE,
+    ) -> None:
+        self.root: Path = root
+        self.seed: Path | None = seed
+        self.basedir: Path = basedir
+        self.binary: str | None = shutil.which("ccache")
+        self.dir: Path | None = None
+        self._before: dict[str, int] = {}
+        self._start: float = 0.0
+
+    @property
+    def available(self) -> bool:
+        return self.binary is not None
+
+    def compiler(self, cc: str) -> str:
+        return f"ccache {cc}" if self.available else cc
+
+    def env(self) -> dict[str, str]:
+        """
+        Variables for make, once ``prepare`` picked the namespace.
+        """
+        if not self.available or self.dir is None:
+            return {}
+        return {
+            **PROFILE,
+            "CCACHE_BASEDIR": str(self.basedir),
+            "CCACHE_DIR": str(self.dir),
+        }
+
+    def _ccache(self, *args: str) -> str:
+        assert self.binary is not None
+        ccache: Command = Command(self.binary)
+        env: dict[str, str] = {**os.environ, **self.env()}
+        return str(ccache(*args, _env=env))
+
+    def stats(self) -> dict[str, int]:
+        """
+        Counters from ``ccache --print-stats``.
+        """
+        if not self.available or self.dir is None:
+            return {}
+        try:
+            output: str = self._ccache("--print-stats")
+        except ErrorReturnCode as e:
+            log(f"ccache --print-stats failed: {e}", "warning")
+            return {}
+        counters: dict[str, int] = {}
+        for line in output.splitlines():
+            key, _, value = line.partition("\t")
+            if value.strip().isdigit():
+                counters[key.strip()] = int(value)
+        return counters
+
+    def prepare(self, binary: Path | None = None) -> None:
+        """
+        Select the namespace for the current clang, seed it if it is empty
+        and remember the counters the build report is computed against.
+
+        :param binary: clang binary, the linked toolchain's by default.
+        :return: None
+        """
+        if not self.available:
+            log("ccache not found, compiling without a cache", "warning")
+            return
+        self.dir = self.root / clang_hash(binary)[:16]
+        self.dir.mkdir(parents=True, exist_ok=True)
+        log(f"Using ccache namespace {self.dir}")
+
+        if self.seed is not None and not any(self.dir.glob("?")):
+            self.prewarm(self.seed)
+        self._before = self.stats()
+        self._start = time.monotonic()
+
+    def prewarm(self, seed: Path) -> int:
+        """
+        Import cache entries from another ccache directory or a tar archive
+        of one. Entries already present are kept; counters and settings of
+        the seed are not imported.
+
+        :param seed: Directory, or .tar / .tar.gz / .tar.zst archive.
+        :return: Number of files imported.
+        """
+        assert self.dir is not None
+        if not seed.exists():
+            log(f"ccache seed {seed} does not exist, skipping prewarm", "warning")
+            return 0
+
+        log(f"Prewarming ccache from {seed}")
+        source: Path = seed
+        staging: Path | None = None
+        if seed.is_file():
+            staging = self.dir.parent / f".{self.dir.name}.seed"
+            shutil.rmtree(staging, ignore_errors=True)
+            with seed.open("rb") as f:
+                if seed.name.endswith(ZSTD_SUFFIXES):
+                    extract_zstd(f, staging)
+                else:
+                    ParallelExtractor(staging).extract(f)
+            source = staging
+
+        imported: int = 0
+        try:
+            for dirpath, _, filenames in os.walk(source):
+                rel: Path = Path(dirpath).relative_to(source)
+                for name in filenames:
+                    dest: Path = self.dir / rel / name
+                    if name in _LOCAL_FILES or dest.exists():
+                        continue
+                    dest.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copy2(Path(dirpath, name), dest)
+                    imported += 1
+        finally:
+            if staging is not None:
+                shutil.rmtree(staging, ignore_errors=True)
+
+        # Recount sizes (and trim to max_size) now that files were added
+        if imported and self.available:
+            self._ccache("--cleanup")
+        log(f"Imported {imported} ccache files")
+        return imported
+
+    def _seconds_per_miss(
+        self, record: Path, elapsed: float, jobs: int, misses: int
+    ) -> float:
+        # Running average of the CPU time a compile takes in this namespace
+        try:
+            history: dict[str, float] = json.loads(record.read_text())
+        except (OSError, ValueError):
+            history = {}
+        average: float = history.get("seconds_per_miss", 0.0)
+        if misses >= 50:
+            sample: float = elapsed * jobs / misses
+            average = sample if not average else 0.8 * average + 0.2 * sample
+            FileSystem.write_atomic(record, json.dumps({"seconds_per_miss": average}))
+        return average
+
+    def report(self, jobs: int, dest: Path | None = None) -> CcacheReport | None:
+        """
+        Compare the counters with those from ``prepare``, print the result
+        and write it to ``dest`` as JSON.
+
+        Time saved is an estimate: hits times the average compile time of a
+        miss in this namespace, spread over ``jobs`` parallel jobs.
+
+        :param jobs: make jobs the build ran with.
+        :param dest: Report file, e.g. next to the artifacts.
+        :return: The report, or None without ccache.
+        """
+        if not self.available or self.dir is None:
+            return None
+        after: dict[str, int] = self.stats()
+
+        def delta(*keys: str) -> int:
+            return sum(after.get(k, 0) - self._before.get(k, 0) for k in keys)
+
+        hits: int = delta("direct_cache_hit", "preprocessed_cache_hit")
+        misses: int = delta("cache_miss")
+        uncacheable: int = delta(
+            "called_for_link",
+            "called_for_preprocessing",
+            "compiler_produced_no_output",
+            "unsupported_compiler_option",
+            "unsupported_source_language",
+            "no_input_file",
+            "multiple_source_files",
+        )
+        elapsed: float = time.monotonic() - self._start
+        per_miss: float = self._seconds_per_miss(
+            self.dir / "builder.json", elapsed, jobs, misses
+        )
+        result: CcacheReport = CcacheReport(
+            namespace=self.dir.name,
+            hits=hits,
+            misses=misses,
+            uncacheable=uncacheable,
+            hit_rate=hits / (hits + misses) if hits + misses else 0.0,
+            time_saved=hits * per_miss / max(1, jobs),
+            size=after.get("cache_size_kibibyte", 0) * 1024,
+            files=after.get("files_in_cache", 0),
+        )
+        print(result.table())
+        if dest is not None:
+            FileSystem.write_atomic(dest, json.dumps(asdict(result), indent=2))
+        return result
+
+
+if __name__ == "__main__":
+    raise SystemExit("This file is meant to be imported, not executed.")
@@ -1,24 +1,28 @@
+import hashlib
+import json
+import os
+import re
+import threading
 from functools import partial
-from typing import Final
+from pathlib import Path
+from typing import Any, Final
 
+import sh
+
+from kernel_builder.constants import CLANG_CACHE, GITHUB_API, TOOLCHAIN
+from kernel_builder.utils.fs import FileSystem
 from kernel_builder.utils.github import GithubAPI
 
 # Toolchain Repo
 AOSP_CLANG: Final[str] = (
-    "https://api.github.com/repos/bachnxuan/aosp_clang_mirror/releases/latest"
-)
-RV_CLANG: Final[str] = "https://api.github.com/repos/Rv-Project/RvClang/releases/latest"
-YUKI_CLANG: Final[str] = (
-    "https://api.github.com/repos/Klozz/Yuki_clang_releases/releases/latest"
-)
-LILIUM_CLANG: Final[str] = (
-    "https://api.github.com/repos/liliumproject/clang/releases/latest"
-)
-TNF_CLANG: Final[str] = (
-    "https://api.github.com/repos/topnotchfreaks/clang/releases/latest"
+    f"{GITHUB_API}/repos/bachnxuan/aosp_clang_mirror/releases/latest"
 )
+RV_CLANG: Final[str] = f"{GITHUB_API}/repos/Rv-Project/RvClang/releases/latest"
+YUKI_CLANG: Final[str] = f"{GITHUB_API}/repos/Klozz/Yuki_clang_releases/releases/latest"
+LILIUM_CLANG: Final[str] = f"{GITHUB_API}/repos/liliumproject/clang/releases/latest"
+TNF_CLANG: Final[str] = f"{GITHUB_API}/repos/topnotchfreaks/clang/releases/latest"
 NEUTRON_CLANG: Final[str] = (
-    "https://api.github.com/repos/Neutron-Toolchains/clang-build-catalogue/releases/latest"
+    f"{GITHUB_API}/repos/Neutron-Toolchains/clang-build-catalogue/releases/latest"
 )
 
 # Partials
@@ -46,3 +50,94 @@ def fetch_clang_url(variants: str) -> str:
             return fetch_clang_tzst(NEUTRON_CLANG)
         case _:
             raise Exception("Unknown clang variant")
+
+
+# ---- Toolchain identity
+_cache_lock: threading.Lock = threading.Lock()
+
+
+def clang_binary(root: Path = TOOLCHAIN / "clang") -> Path:
+    """
+    Resolve the real clang executable (bin/clang is usually a symlink).
+
+    :param root: Toolchain directory.
+    :return: Path to the clang binary.
+    """
+    return (root / "bin" / "clang").resolve()
+
+
+def _read_cache() -> dict[str, Any]:
+    try:
+        return json.loads(CLANG_CACHE.read_text())
+    except (OSError, ValueError):
+        return {"hashes": {}, "versions": {}}
+
+
+def _write_cache(cache: dict[str, Any]) -> None:
+    CLANG_CACHE.parent.mkdir(parents=True, exist_ok=True)
+    FileSystem.write_atomic(CLANG_CACHE, json.dumps(cache, indent=2))
+
+
+def clang_hash(binary: Path | None = None) -> str:
+    """
+    sha256 of the clang binary. The digest is cached against the file's
+    inode, size and mtime, so the binary is only read once per toolchain.
+
+    :param binary: Clang executable (defaults to the linked toolchain).
+    :return: Hex digest.
+    """
+    binary = binary or clang_binary()
+    st: os.stat_result = binary.stat()
+    stamp: list[int] = [st.st_ino, st.st_size, st.st_mtime_ns]
+
+    with _cache_lock:
+        cache: dict[str, Any] = _read_cache()
+        known: dict[str, Any] | None = cache["hashes"].get(str(binary))
+        if known is not None and known["stat"] == stamp:
+            return known["sha256"]
+
+        digest = hashlib.sha256()
+        with binary.open("rb") as f:
+            while chunk := f.read(1 << 20):
+                digest.update(chunk)
+        cache["hashes"][str(binary)] = {"stat": stamp, "sha256": digest.hexdigest()}
+        _write_cache(cache)
+        return digest.hexdigest()
+
+
+def parse_clang_version(output: str) -> str:
+    """
+    Turn ``clang -v`` output into a short toolchain name, e.g.
+    ``Android (12285214, based on r522817) clang 18.0.2``.
+
+    :param output: Combined stdout/stderr of ``clang -v``.
+    :return: First line without the repository URL and the word "version".
+    """
+    line: str = output.splitlines()[0] if output else ""
+    line = re.sub(r"\(https.*", "", line)
+    return line.replace(" version", "", 1).strip()
+
+
+def clang_version(binary: Path | None = None) -> str:
+    """
+    Toolchain version string, cached by the clang binary's hash.
+
+    :param binary: Clang executable (defaults to the linked toolchain).
+    :return: Version string as shown in release notes.
+    """
+    binary = binary or clang_binary()
+    key: str = clang_hash(binary)
+    with _cache_lock:
+        if (version := _read_cache()["versions"].get(key)) is not None:
+            return version
+
+    version = parse_clang_version(str(sh.Command(str(binary))("-v", _err_to_out=True)))
+    with _cache_lock:
+        cache: dict[str, Any] = _read_cache()
+        cache["versions"][key] = version
+        _write_cache(cache)
+    return version
+
+
+if __name__ == "__main__":
+    raise SystemExit("This file is meant to be imported, not executed.")
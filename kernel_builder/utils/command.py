@@ -3,28 +3,77 @@ from pathlib import Path
 import sh
 from sh import Command
 
+from kernel_builder.constants import PATCH_REPORTS
+from kernel_builder.utils.fs import FileSystem
 from kernel_builder.utils.log import log
+from kernel_builder.utils.patch import PatchError, PatchResult, apply, log_result
 
 curl: Command = sh.Command("curl").bake(
     "-fsSL", "--retry", "5", "--retry-all-errors", "--retry-delay", "2"
 )
-patch: Command = sh.Command("patch").bake("-p1", "--forward", "--fuzz=3")
-aria2c: Command = sh.Command("aria2c").bake(
-    "-x16", "-s32", "-k8M", "--file-allocation=falloc", "--timeout=60", "--retry-wait=5"
-)
+ARIA2C_ARGS: list[str] = [
+    "-x16",
+    "-s32",
+    "-k8M",
+    "--file-allocation=falloc",
+    "--timeout=60",
+    "--retry-wait=5",
+]
+
+
+def aria2c(*args: str) -> sh.RunningCommand:
+    # Resolved on use: only non-streaming toolchain downloads need aria2c
+    return sh.Command("aria2c")(*ARIA2C_ARGS, *args)
+
+
+def is_patch_applied(patch_file: Path, *, cwd: Path | None = None) -> bool:
+    """
+    Check whether a patch is already applied (a dry run, nothing is written).
+
+    :param patch_file: Patch to check.
+    :param cwd: Tree the patch applies to.
+    :return: True if every hunk is already present.
+    """
+    return apply(patch_file, cwd, dry_run=True, check=False).already_applied
+
+
+def patch_report(patch_file: Path) -> Path:
+    return PATCH_REPORTS / f"{patch_file.stem}.json"
 
 
 def apply_patch(
-    patch_file: Path, *, check: bool = True, cwd: Path | None = None
-) -> sh.RunningCommand:
+    patch_file: Path,
+    *,
+    check: bool = True,
+    cwd: Path | None = None,
+    dry_run: bool = False,
+    report: Path | None = None,
+) -> PatchResult:
+    """
+    Apply a patch with -p1 and fuzz, skipping hunks that are already applied.
+
+    :param patch_file: Patch to apply.
+    :param check: Raise PatchError (leaving the tree untouched) if a hunk fails.
+    :param cwd: Tree the patch applies to.
+    :param dry_run: Only report what would happen.
+    :param report: JSON file the per-hunk results are written to.
+    :return: Per file and per hunk results.
+    """
     if not patch_file.exists():
         log(f"Patch not found at {patch_file}", "error")
         raise FileNotFoundError()
     log(f"Patching file: {patch_file}")
-    cwd = cwd or Path.cwd()
-    data: bytes = patch_file.read_bytes()
-    return patch(
-        _in=data,
-        _cwd=str(cwd),
-        _ok_code=[0, 1] if not check else [0],
-    )
+    try:
+        result: PatchResult = apply(patch_file, cwd, dry_run=dry_run, check=check)
+    except PatchError as e:
+        if e.result is not None:
+            _report(e.result, report)
+        raise
+    _report(result, report)
+    return result
+
+
+def _report(result: PatchResult, dest: Path | None) -> None:
+    log_result(result)
+    if dest is not None:
+        FileSystem.write_atomic(dest, result.to_json())
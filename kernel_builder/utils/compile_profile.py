@@ -0,0 +1,267 @@
+import csv
+import io
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from rich import print
+from rich.table import Table
+
+from kernel_builder.config.config import COMPILE_TIMING, COMPILE_TIMING_TOP
+from kernel_builder.constants import CC_TIME
+from kernel_builder.utils.fs import FileSystem
+from kernel_builder.utils.log import log
+
+# Kbuild's quiet command lines, e.g. "  CC [M]  drivers/foo.o" or "  LTO     vmlinux.o"
+KBUILD_LINE: re.Pattern[str] = re.compile(
+    r"^ {2}([A-Z][A-Z0-9_]*)(?: \[M\])?\s+(\S+)\s*$"
+)
+
+
+@dataclass(slots=True)
+class CompileRecord:
+    obj: str
+    source: str
+    start: float
+    end: float
+    status: int
+    # "hit", "miss", another ccache result, or "" without ccache
+    cache: str = ""
+
+    @property
+    def seconds(self) -> float:
+        return self.end - self.start
+
+
+@dataclass(slots=True)
+class KbuildStep:
+    tag: str
+    target: str
+    time: float
+
+
+@dataclass(slots=True)
+class CompileReport:
+    records: list[CompileRecord]
+    elapsed: float
+    # Time from the last compile finishing to the end of make
+    tail: float
+    tail_steps: list[tuple[KbuildStep, float]] = field(default_factory=list)
+    top: int = COMPILE_TIMING_TOP
+
+    def directories(self, depth: int = 2) -> list[tuple[str, float, int]]:
+        """
+        Compile time summed per source directory.
+
+        :param depth: Path components that make up a directory, e.g. drivers/gpu.
+        :return: (directory, seconds, units), slowest first.
+        """
+        totals: dict[str, list[float]] = defaultdict(lambda: [0.0, 0])
+        for r in self.records:
+            key: str = "/".join(Path(r.obj).parts[:-1][:depth]) or "."
+            totals[key][0] += r.seconds
+            totals[key][1] += 1
+        return sorted(
+            ((k, v[0], int(v[1])) for k, v in totals.items()),
+            key=lambda row: row[1],
+            reverse=True,
+        )
+
+    def csv(self, start: float) -> str:
+        buffer: io.StringIO = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["object", "source", "seconds", "cache", "start", "status"])
+        for r in self.records:
+            writer.writerow(
+                [
+                    r.obj,
+                    r.source,
+                    f"{r.seconds:.3f}",
+                    r.cache,
+                    f"{r.start - start:.3f}",
+                    r.status,
+                ]
+            )
+        return buffer.getvalue()
+
+    def tables(self) -> list[Table]:
+        slowest: Table = Table(
+            title=f"Slowest {self.top} translation units", title_justify="left"
+        )
+        slowest.add_column("Object")
+        slowest.add_column("Time", justify="right")
+        slowest.add_column("ccache")
+        for r in self.records[: self.top]:
+            slowest.add_row(r.obj, f"{r.seconds:.1f}s", r.cache or "-")
+
+        dirs: Table = Table(title="Compile time by directory", title_justify="left")
+        dirs.add_column("Directory")
+        dirs.add_column("CPU time", justify="right")
+        dirs.add_column("Units", justify="right")
+        for name, seconds, units in self.directories()[: self.top]:
+            dirs.add_row(name, f"{seconds:.0f}s", str(units))
+
+        tail: Table = Table(
+            title=f"Serial link tail: {self.tail:.0f}s of {self.elapsed:.0f}s",
+            title_justify="left",
+        )
+        tail.add_column("Step")
+        tail.add_column("Target")
+        tail.add_column("Time", justify="right")
+        for step, seconds in self.tail_steps:
+            tail.add_row(step.tag, step.target, f"{seconds:.1f}s")
+        return [slowest, dirs, tail]
+
+
+class CompileProfile:
+    """
+    Per translation unit compile times of a make run.
+
+    The compiler is wrapped in cc_time.sh, which logs the wall time of
+    every compile while GKI_TU_LOG is set, and ccache's stats log tells
+    hits from misses. Kbuild's output is parsed as it streams by, which
+    times the serial steps (LD, LTO, KSYMS ...) after the last compile.
+
+    Logging is switched on per make run through the environment, so the
+    configure passes are not timed and the command lines Kbuild records
+    stay the same from one run to the next.
+    """
+
+    def __init__(self, out_dir: Path, enabled: bool = COMPILE_TIMING) -> None:
+        self.out_dir: Path = out_dir
+        self.enabled: bool = enabled
+        self.log: Path = out_dir / ".compile-times.log"
+        self.statslog: Path = out_dir / ".ccache-stats.log"
+        self.steps: list[KbuildStep] = []
+        self.start: float = 0.0
+        self.end: float = 0.0
+
+    def compiler(self, cc: str) -> str:
+        return f"{CC_TIME} {cc}" if self.enabled else cc
+
+    def env(self) -> dict[str, str]:
+        """
+        Variables that turn the logging on, for the make run being profiled.
+        """
+        if not self.enabled:
+            return {}
+        return {"GKI_TU_LOG": str(self.log), "CCACHE_STATSLOG": str(self.statslog)}
+
+    def begin(self) -> None:
+        self.log.unlink(missing_ok=True)
+        self.statslog.unlink(missing_ok=True)
+        self.steps = []
+        self.start = time.time()
+
+    def parse(self, line: str) -> None:
+        """
+        Output callback for make: echo the line and note Kbuild steps.
+        """
+        sys.stdout.write(line)
+        if m := KBUILD_LINE.match(line):
+            self.steps.append(KbuildStep(m[1], m[2], time.time()))
+
+    def finish(self) -> None:
+        self.end = time.time()
+
+    def _cache_results(self) -> dict[str, str]:
+        # ccache's stats log: "# <input file>" followed by the counters it bumped
+        results: dict[str, str] = {}
+        try:
+            lines: list[str] = self.statslog.read_text(errors="replace").splitlines()
+        except OSError:
+            return results
+        source: str | None = None
+        for line in lines:
+            if line.startswith("# "):
+                source = os.path.realpath(self.out_dir / line[2:])
+            elif source is not None and line and source not in results:
+                if line.endswith("cache_hit"):
+                    results[source] = "hit"
+                else:
+                    results[source] = "miss" if line == "cache_miss" else line
+        return results
+
+    def records(self) -> list[CompileRecord]:
+        """
+        Compiles logged by the wrapper, slowest first. Compiler probes
+        (temporary or /dev/null outputs) are left out.
+        """
+        try:
+            lines: list[str] = self.log.read_text(errors="replace").splitlines()
+        except OSError:
+            return []
+        cache: dict[str, str] = self._cache_results()
+        out_dir: Path = self.out_dir.resolve()
+        records: dict[str, CompileRecord] = {}
+        for line in lines:
+            fields: list[str] = line.split("\t")
+            if len(fields) != 6:
+                continue
+            start, end, status, cwd, obj, src = fields
+            if not obj.endswith(".o") or Path(obj).name.startswith(".tmp"):
+                continue
+            obj_path: Path = Path(os.path.realpath(Path(cwd) / obj))
+            source: str = os.path.realpath(Path(cwd) / src) if src else ""
+            try:
+                rel: str = str(obj_path.relative_to(out_dir))
+                record: CompileRecord = CompileRecord(
+                    obj=rel,
+                    source=source,
+                    # EPOCHREALTIME follows the locale's decimal separator
+                    start=float(start.replace(",", ".")),
+                    end=float(end.replace(",", ".")),
+                    status=int(status),
+                    cache=cache.get(source, ""),
+                )
+            except ValueError:
+                continue
+            records[rel] = record
+        return sorted(records.values(), key=lambda r: r.seconds, reverse=True)
+
+    def _tail(
+        self, records: list[CompileRecord]
+    ) -> tuple[float, list[tuple[KbuildStep, float]]]:
+        last: float = max((r.end for r in records), default=self.start)
+        steps: list[KbuildStep] = [s for s in self.steps if s.time >= last]
+        times: list[float] = [s.time for s in steps[1:]] + [self.end]
+        return self.end - last, [(s, t - s.time) for s, t in zip(steps, times)]
+
+    def report(
+        self, top: int = COMPILE_TIMING_TOP, dest: Path | None = None
+    ) -> CompileReport | None:
+        """
+        Print the slowest units, the time per directory and the serial
+        tail, and write every unit to ``dest`` as CSV.
+
+        :param top: Rows shown per table.
+        :param dest: CSV file, e.g. next to the artifacts.
+        :return: The report, or None when timing is off or nothing was compiled.
+        """
+        if not self.enabled:
+            return None
+        records: list[CompileRecord] = self.records()
+        if not records:
+            log("No compiles were timed, skipping the compile time report")
+            return None
+        tail, tail_steps = self._tail(records)
+        result: CompileReport = CompileReport(
+            records=records,
+            elapsed=self.end - self.start,
+            tail=tail,
+            tail_steps=tail_steps,
+            top=top,
+        )
+        for table in result.tables():
+            print(table)
+        if dest is not None:
+            FileSystem.write_atomic(dest, result.csv(self.start))
+        return result
+
+
+if __name__ == "__main__":
+    raise SystemExit("This file is meant to be imported, not executed.")
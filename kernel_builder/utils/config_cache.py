@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from kernel_builder.config.config import KCONFIG_CACHE
+from kernel_builder.utils.fs import FileSystem
+from kernel_builder.utils.log import log
+
+# Resolved configs kept, least recently used are dropped first
+MAX_ENTRIES: int = 64
+
+
+class ConfigCache:
+    """
+    Resolved ``.config`` files keyed by everything that goes into them.
+
+    The key covers the defconfig, every ``Kconfig*`` file in the tree, the
+    config overrides and fragments, the compiler (Kconfig probes it) and
+    the Kbuild environment. On a hit the stored file replaces the
+    ``make defconfig`` / configurator / ``make olddefconfig`` passes.
+    """
+
+    def __init__(self, root: Path | None = KCONFIG_CACHE) -> None:
+        self.root: Path | None = root
+
+    @staticmethod
+    def _kconfig_files(tree: Path) -> list[Path]:
+        files: list[Path] = []
+        for dirpath, dirnames, filenames in os.walk(tree):
+            dirnames[:] = sorted(
+                d
+                for d in dirnames
+                if d not in (".git", "out") and not d.startswith(".")
+            )
+            files.extend(
+                Path(dirpath, f) for f in sorted(filenames) if f.startswith("Kconfig")
+            )
+        return files
+
+    def key(
+        self,
+        tree: Path,
+        defconfig: Path,
+        overrides: dict[str, bool | int | str],
+        *,
+        fragments: list[Path],
+        compiler: str,
+        env: dict[str, str],
+    ) -> str:
+        """
+        Digest of the inputs of a resolved config.
+
+        :param tree: Kernel source tree.
+        :param defconfig: Defconfig file.
+        :param overrides: Options applied on top of the defconfig.
+        :param fragments: Config fragments merged after the overrides.
+        :param compiler: Compiler identity, e.g. its hash.
+        :param env: Kbuild variables that affect Kconfig (ARCH, LLVM ...).
+        :return: Hex digest.
+        """
+        h = hashlib.sha256()
+        h.update(json.dumps([overrides, compiler, env], sort_keys=True).encode())
+        for path in [defconfig, *fragments, *self._kconfig_files(tree)]:
+            name: Path = path.relative_to(tree) if path.is_relative_to(tree) else path
+            h.update(f"{name}\0".encode())
+            h.update(hashlib.sha256(path.read_bytes()).digest())
+        return h.hexdigest()
+
+    def restore(self, key: str, dest: Path) -> bool:
+        """
+        Put the cached config for ``key`` at ``dest``. An identical file is
+        left untouched, so Kbuild does not re-run syncconfig for it.
+
+        :return: True on a hit.
+        """
+        if self.root is None:
+            return False
+        entry: Path = self.root / f"{key}.config"
+        if not entry.is_file():
+            return False
+        entry.touch()
+
+        data: bytes = entry.read_bytes()
+        if dest.is_file() and dest.read_bytes() == data:
+            return True
+        FileSystem.write_atomic(dest, data)
+        return True
+
+    def store(self, key: str, config: Path) -> None:
+        if self.root is None:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        FileSystem.write_atomic(self.root / f"{key}.config", config.read_bytes())
+        self.prune()
+
+    def prune(self, keep: int = MAX_ENTRIES) -> None:
+        if self.root is None or not self.root.is_dir():
+            return
+        entries: list[Path] = sorted(
+            self.root.glob("*.config"), key=lambda p: p.stat().st_mtime, reverse=True
+        )
+        for entry in entries[keep:]:
+            log(f"Dropping cached config {entry.name}")
+            entry.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    raise SystemExit("This file is meant to be imported, not executed.")
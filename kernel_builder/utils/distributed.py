@@ -0,0 +1,400 @@
+import json
+import os
+import shutil
+import socket
+import socketserver
+import subprocess
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Self
+
+from rich import print
+from rich.filesize import decimal
+from rich.table import Table
+
+from kernel_builder.config.config import COMPILE_WORKERS, WORKER_PORT
+from kernel_builder.constants import REMOTE_CC
+from kernel_builder.utils.clang import clang_binary, clang_hash
+from kernel_builder.utils.fs import FileSystem
+from kernel_builder.utils.log import log
+
+CONNECT_TIMEOUT: float = 2.0
+
+
+def request(
+    address: tuple[str, int],
+    header: dict[str, Any],
+    payload: bytes = b"",
+    timeout: float = CONNECT_TIMEOUT,
+) -> tuple[dict[str, Any], bytes]:
+    """
+    One exchange with a worker: a JSON header line followed by ``size``
+    bytes of payload, in both directions.
+    """
+    with socket.create_connection(address, timeout=timeout) as sock:
+        sock.sendall(json.dumps({**header, "size": len(payload)}).encode() + b"\n")
+        sock.sendall(payload)
+        with sock.makefile("rb") as f:
+            reply: dict[str, Any] = json.loads(f.readline())
+            data: bytes = f.read(reply.get("size", 0))
+    return reply, data
+
+
+# ---- Worker side
+class _CompileHandler(socketserver.StreamRequestHandler):
+    server: "CompileServer"
+
+    def _reply(self, header: dict[str, Any], payload: bytes = b"") -> None:
+        self.wfile.write(json.dumps({**header, "size": len(payload)}).encode() + b"\n")
+        self.wfile.write(payload)
+
+    def handle(self) -> None:
+        try:
+            header: dict[str, Any] = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        payload: bytes = self.rfile.read(header.get("size", 0))
+        match header.get("op"):
+            case "hello":
+                self._reply(
+                    {"clang_hash": self.server.clang_hash, "jobs": self.server.jobs}
+                )
+            case "compile":
+                self._compile(header, payload)
+            case op:
+                self._reply({"status": 2, "stderr": f"unknown op {op!r}\n"})
+
+    def _compile(self, header: dict[str, Any], source: bytes) -> None:
+        if header.get("clang_hash") != self.server.clang_hash:
+            self._reply({"status": 2, "stderr": "toolchain mismatch\n"})
+            return
+        with self.server.slots, tempfile.TemporaryDirectory() as tmp:
+            obj: Path = Path(tmp) / "out.o"
+            try:
+                result: subprocess.CompletedProcess[bytes] = subprocess.run(
+                    [str(self.server.clang), *header["args"], "-o", str(obj)],
+                    input=source,
+                    capture_output=True,
+                    cwd=tmp,
+                    timeout=self.server.timeout,
+                    check=False,
+                )
+            except (OSError, subprocess.TimeoutExpired) as e:
+                self._reply({"status": 2, "stderr": f"{e}\n"})
+                return
+            self.server.compiled += 1
+            stderr: str = result.stderr.decode(errors="replace")
+            if result.returncode or not obj.exists():
+                self._reply({"status": result.returncode or 1, "stderr": stderr})
+                return
+            self._reply({"status": 0, "stderr": stderr}, obj.read_bytes())
+
+
+class CompileServer(socketserver.ThreadingTCPServer):
+    """
+    A compile worker (``cli.py worker``).
+
+    Takes preprocessed C from remote_cc.py, compiles it with the local
+    clang and sends the object back. Jobs built for another clang (by
+    hash) are refused, and at most ``jobs`` compiles run at once.
+
+    Compile arguments come from the client as-is, so the server listens on
+    loopback (for SSH tunnels) unless another address is passed explicitly,
+    which should be on a trusted network only.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        address: tuple[str, int] = ("127.0.0.1", WORKER_PORT),
+        clang: Path | None = None,
+        jobs: int | None = None,
+        timeout: float = 600.0,
+    ) -> None:
+        if ":" in address[0]:
+            self.address_family = socket.AF_INET6
+        super().__init__(address, _CompileHandler)
+        self.clang: Path = clang or clang_binary()
+        self.clang_hash: str = clang_hash(self.clang)
+        self.jobs: int = jobs or os.cpu_count() or 1
+        self.slots: threading.BoundedSemaphore = threading.BoundedSemaphore(self.jobs)
+        self.timeout: float = timeout
+        self.compiled: int = 0
+
+
+# ---- Coordinator side
+@dataclass(slots=True)
+class Worker:
+    host: str
+    port: int
+    # Compile slots the worker offers, from its hello reply
+    jobs: int = 0
+    # Set for ssh:// workers: the remote end of the tunnel
+    remote: str | None = None
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.host, self.port
+
+    @property
+    def name(self) -> str:
+        host: str = f"[{self.host}]" if ":" in self.host else self.host
+        return self.remote or f"{host}:{self.port}"
+
+    @classmethod
+    def parse(cls, spec: str) -> "Worker":
+        """
+        :param spec: "host", "host:port" or "ssh://[user@]host[:port]". IPv6
+            addresses are written bare or as "[addr]:port".
+        """
+        ssh: bool = spec.startswith("ssh://")
+        address: str = spec.removeprefix("ssh://")
+        user, at, address = address.rpartition("@")
+        if address.startswith("["):
+            host, _, port = address[1:].partition("]")
+            port = port.removeprefix(":")
+        elif address.count(":") == 1:
+            host, _, port = address.rpartition(":")
+        else:
+            host, port = address, ""
+        return cls(
+            f"{user}{at}{host}", int(port or WORKER_PORT), remote=spec if ssh else None
+        )
+
+
+@dataclass(slots=True)
+class WorkerStats:
+    name: str
+    jobs: int = 0
+    fallbacks: int = 0
+    seconds: float = 0.0
+    sent: int = 0
+    received: int = 0
+
+
+class WorkerPool:
+    """
+    Compile workers used by Builder, distcc style.
+
+    remote_cc.py runs as ccache's CCACHE_PREFIX (or in front of clang when
+    ccache is missing): cache misses are preprocessed locally and compiled
+    on a free worker slot, and anything a worker cannot take is compiled
+    locally. Workers are only used when they run the same clang binary as
+    the builder, so objects are identical to local ones.
+
+    ``ssh://`` workers are reached through an SSH tunnel opened for the
+    build; plain hosts are contacted over TCP directly.
+    """
+
+    def __init__(
+        self,
+        out_dir: Path,
+        hosts: list[str] = COMPILE_WORKERS,
+        cached: bool = False,
+    ) -> None:
+        self.hosts: list[str] = hosts
+        self.cached: bool = cached
+        self.state: Path = out_dir / ".workers"
+        self.log: Path = out_dir / ".workers.log"
+        self.workers: list[Worker] = []
+        self.clang_hash: str = ""
+        self._tunnels: list[subprocess.Popen[bytes]] = []
+        self._start: float = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.hosts)
+
+    @property
+    def slots(self) -> int:
+        return sum(w.jobs for w in self.workers)
+
+    def compiler(self, cc: str) -> str:
+        # With ccache the prefix goes into CCACHE_PREFIX, so hits stay local
+        if not self.enabled or self.cached:
+            return cc
+        return f"{REMOTE_CC} {cc}"
+
+    def env(self) -> dict[str, str]:
+        """
+        Variables for make, once ``prepare`` verified the workers.
+        """
+        if not self.workers:
+            return {}
+        return {
+            "GKI_WORKERS_ACTIVE": " ".join(
+                f"{w.host}:{w.port}/{w.jobs}" for w in self.workers
+            ),
+            "GKI_WORKER_STATE": str(self.state),
+            "GKI_WORKER_LOG": str(self.log),
+            "GKI_CLANG_HASH": self.clang_hash,
+            **({"CCACHE_PREFIX": str(REMOTE_CC)} if self.cached else {}),
+        }
+
+    def _tunnel(self, worker: Worker) -> None:
+        # Forward a free local port to the worker's port on the remote host
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            local: int = sock.getsockname()[1]
+        tunnel: subprocess.Popen[bytes] = subprocess.Popen(
+            [
+                "ssh",
+                "-N",
+                "-o",
+                "BatchMode=yes",
+                "-o",
+                "ExitOnForwardFailure=yes",
+                "-L",
+                f"{local}:localhost:{worker.port}",
+                worker.host,
+            ],
+            stdin=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self._tunnels.append(tunnel)
+        worker.host, worker.port = "127.0.0.1", local
+        deadline: float = time.monotonic() + 10
+        while tunnel.poll() is None and time.monotonic() < deadline:
+            try:
+                socket.create_connection(worker.address, timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+
+    def prepare(self, binary: Path | None = None) -> Self:
+        """
+        Reach every configured worker and keep those running the same clang.
+
+        :param binary: clang binary, the linked toolchain's by default.
+        :return: The pool, to be used as a context manager for the build.
+        """
+        self.workers = []
+        self._start = time.monotonic()
+        if not self.enabled:
+            return self
+        self.clang_hash = clang_hash(binary)
+        for spec in self.hosts:
+            worker: Worker = Worker.parse(spec)
+            if worker.remote is not None and shutil.which("ssh"):
+                self._tunnel(worker)
+            try:
+                reply, _ = request(worker.address, {"op": "hello"})
+            except (OSError, ValueError) as e:
+                log(f"Compile worker {worker.name} is unreachable: {e}", "warning")
+                continue
+            if reply.get("clang_hash") != self.clang_hash:
+                log(
+                    f"Compile worker {worker.name} runs a different clang, skipping",
+                    "warning",
+                )
+                continue
+            worker.jobs = int(reply.get("jobs", 1))
+            self.workers.append(worker)
+
+        shutil.rmtree(self.state, ignore_errors=True)
+        self.state.mkdir(parents=True, exist_ok=True)
+        self.log.unlink(missing_ok=True)
+        if self.workers:
+            log(f"Using {len(self.workers)} compile worker(s), {self.slots} slots")
+        else:
+            log("No compile worker is usable, compiling locally", "warning")
+        return self
+
+    def close(self) -> None:
+        for tunnel in self._tunnels:
+            tunnel.terminate()
+            tunnel.wait()
+        self._tunnels = []
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    def stats(self) -> list[WorkerStats]:
+        """
+        Jobs per worker from the log remote_cc.py writes, busiest first.
+        Compiles that ran on the builder are listed as "localhost".
+        """
+        names: dict[str, str] = {f"{w.host}:{w.port}": w.name for w in self.workers}
+        stats: dict[str, WorkerStats] = {}
+        try:
+            lines: list[str] = self.log.read_text(errors="replace").splitlines()
+        except OSError:
+            lines = []
+        for line in lines:
+            fields: list[str] = line.split("\t")
+            if len(fields) != 5:
+                continue
+            host, mode, seconds, sent, received = fields
+            name: str = names.get(host, host)
+            entry: WorkerStats = stats.setdefault(name, WorkerStats(name))
+            try:
+                if mode == "fallback":
+                    entry.fallbacks += 1
+                    continue
+                entry.jobs += 1
+                entry.seconds += float(seconds)
+                entry.sent += int(sent)
+                entry.received += int(received)
+            except ValueError:
+                continue
+        return sorted(stats.values(), key=lambda s: s.jobs, reverse=True)
+
+    def report(self, dest: Path | None = None) -> list[WorkerStats]:
+        """
+        Print the jobs, fallbacks and throughput of every worker, and write
+        them to ``dest`` as JSON.
+
+        :param dest: Report file, e.g. next to the artifacts.
+        :return: Per worker statistics, empty without workers.
+        """
+        if not self.enabled:
+            return []
+        stats: list[WorkerStats] = self.stats()
+        elapsed: float = max(time.monotonic() - self._start, 1e-9)
+
+        table: Table = Table(title="Compile workers", title_justify="left")
+        table.add_column("Worker")
+        table.add_column("Jobs", justify="right")
+        table.add_column("Fallbacks", justify="right")
+        table.add_column("Jobs/min", justify="right")
+        table.add_column("Avg time", justify="right")
+        table.add_column("Sent / received", justify="right")
+        for s in stats:
+            table.add_row(
+                s.name,
+                str(s.jobs),
+                str(s.fallbacks),
+                f"{s.jobs * 60 / elapsed:.1f}",
+                f"{s.seconds / s.jobs:.2f}s" if s.jobs else "-",
+                f"{decimal(s.sent)} / {decimal(s.received)}",
+            )
+        print(table)
+        if dest is not None:
+            totals: defaultdict[str, int] = defaultdict(int)
+            for s in stats:
+                totals["remote" if s.name != "localhost" else "local"] += s.jobs
+            FileSystem.write_atomic(
+                dest,
+                json.dumps(
+                    {
+                        "elapsed": elapsed,
+                        **totals,
+                        "workers": [asdict(s) for s in stats],
+                    },
+                    indent=2,
+                ),
+            )
+        return stats
+
+
+if __name__ == "__main__":
+    raise SystemExit("This file is meant to be imported, not executed.")
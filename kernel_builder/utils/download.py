@@ -0,0 +1,223 @@
+import hashlib
+import io
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from typing import IO, Final
+
+import requests
+from requests.models import Response
+from rich.progress import (
+    BarColumn,
+    DownloadColumn,
+    Progress,
+    TaskID,
+    TextColumn,
+    TransferSpeedColumn,
+)
+from urllib3.exceptions import HTTPError
+
+from kernel_builder.utils.extract import ParallelExtractor
+from kernel_builder.utils.log import console, log
+from kernel_builder.utils.trace import traced
+
+# Streaming tarfile modes by archive suffix. zstd is not supported by tarfile
+# on Python 3.12 and goes through an external `zstd -dc` instead.
+STREAM_MODES: Final[dict[str, str]] = {
+    ".tar.gz": "r|gz",
+    ".tgz": "r|gz",
+    ".tar.xz": "r|xz",
+    ".tar.bz2": "r|bz2",
+    ".tar": "r|",
+}
+ZSTD_SUFFIXES: Final[tuple[str, ...]] = (".tar.zst", ".tzst")
+
+
+class ResumableStream(io.RawIOBase):
+    """
+    Read-only file object over an HTTP body.
+
+    When the connection drops, the request is re-issued with a ``Range``
+    header starting at the current offset (guarded by ``If-Range`` so a
+    changed file is never spliced), and reading continues transparently.
+    Every byte read is hashed.
+    """
+
+    def __init__(self, url: str, *, retries: int = 5, timeout: int = 60) -> None:
+        self.url: str = url
+        self.retries: int = retries
+        self.timeout: int = timeout
+        self.offset: int = 0
+        self.total: int | None = None
+        self.digest = hashlib.sha256()
+        self._validator: str | None = None
+        self._session: requests.Session = requests.Session()
+        self._resp: Response = self._open()
+
+    def _open(self) -> Response:
+        headers: dict[str, str] = {"Accept-Encoding": "identity"}
+        if self.offset:
+            headers["Range"] = f"bytes={self.offset}-"
+            if self._validator:
+                headers["If-Range"] = self._validator
+        resp: Response = self._session.get(
+            self.url, headers=headers, stream=True, timeout=self.timeout
+        )
+        resp.raise_for_status()
+
+        if self.offset and resp.status_code != 206:
+            # Server ignored the range (or the file changed): cannot resume
+            resp.close()
+            raise OSError(f"Server refused to resume {self.url} at byte {self.offset}")
+        if not self.offset:
+            self._validator = resp.headers.get("ETag") or resp.headers.get(
+                "Last-Modified"
+            )
+            length: str | None = resp.headers.get("Content-Length")
+            self.total = int(length) if length else None
+        return resp
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:  # pyright: ignore[reportIncompatibleMethodOverride]
+        attempts: int = 0
+        while True:
+            try:
+                data: bytes = self._resp.raw.read(len(buffer))
+                if not data and self.total is not None and self.offset < self.total:
+                    raise OSError("Connection closed before end of body")
+                break
+            except (OSError, HTTPError, requests.RequestException) as e:
+                attempts += 1
+                if attempts > self.retries:
+                    raise
+                log(
+                    f"Download interrupted at {self.offset} bytes ({e}), resuming",
+                    "warning",
+                )
+                self._resp.close()
+                self._resp = self._open()
+
+        buffer[: len(data)] = data
+        self.offset += len(data)
+        self.digest.update(data)
+        return len(data)
+
+    def close(self) -> None:
+        self._resp.close()
+        self._session.close()
+        super().close()
+
+
+class _ProgressReader(io.RawIOBase):
+    def __init__(self, raw: ResumableStream, on_read) -> None:
+        self.raw: ResumableStream = raw
+        self.on_read = on_read
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:  # pyright: ignore[reportIncompatibleMethodOverride]
+        n: int = self.raw.readinto(buffer)
+        self.on_read()
+        return n
+
+
+def _extract(fileobj: IO[bytes], mode: str, dest: Path) -> None:
+    ParallelExtractor(dest).extract(fileobj, mode)
+    # Consume trailing padding so the stream (and its digest) reaches EOF
+    while fileobj.read(1 << 20):
+        pass
+
+
+@traced("stream and extract")
+def stream_extract(url: str, dest: Path) -> str:
+    """
+    Download a tar archive and extract it while it downloads, without
+    writing the archive to disk.
+
+    :param url: Archive URL (.tar.gz, .tar.xz, .tar.bz2, .tar or .tar.zst).
+    :param dest: Directory to extract into.
+    :return: sha256 of the downloaded archive.
+    """
+    name: str = url.split("?", 1)[0].lower()
+    dest.mkdir(parents=True, exist_ok=True)
+
+    with (
+        ResumableStream(url) as body,
+        Progress(
+            TextColumn("{task.description}"),
+            BarColumn(),
+            DownloadColumn(),
+            TransferSpeedColumn(),
+            console=console,
+            transient=True,
+        ) as bar,
+    ):
+        task: TaskID = bar.add_task(Path(name).name, total=body.total)
+        reader: io.BufferedReader = io.BufferedReader(
+            _ProgressReader(body, lambda: bar.update(task, completed=body.offset)),
+            buffer_size=1 << 20,
+        )
+
+        if name.endswith(ZSTD_SUFFIXES):
+            extract_zstd(reader, dest)
+        else:
+            mode: str = next(
+                (m for suffix, m in STREAM_MODES.items() if name.endswith(suffix)),
+                "r|*",
+            )
+            _extract(reader, mode, dest)
+
+        log(f"Streamed and extracted {body.offset} bytes from {url}")
+        return body.digest.hexdigest()
+
+
+def extract_zstd(reader: IO[bytes], dest: Path) -> None:
+    zstd: str | None = shutil.which("zstd")
+    if zstd is None:
+        raise FileNotFoundError("zstd is required to extract .tar.zst archives")
+
+    proc: subprocess.Popen[bytes] = subprocess.Popen(
+        [zstd, "-dc"], stdin=subprocess.PIPE, stdout=subprocess.PIPE
+    )
+    assert proc.stdin is not None and proc.stdout is not None
+    feed_error: list[Exception] = []
+
+    def feed() -> None:
+        try:
+            shutil.copyfileobj(reader, proc.stdin, 1 << 20)  # pyright: ignore[reportArgumentType]
+        except (OSError, HTTPError, requests.RequestException) as e:
+            # The download failed, or zstd exited early (EPIPE)
+            feed_error.append(e)
+        finally:
+            proc.stdin.close()  # pyright: ignore[reportOptionalMemberAccess]
+
+    feeder: threading.Thread = threading.Thread(
+        target=feed, name="zstd-feed", daemon=True
+    )
+    feeder.start()
+    try:
+        _extract(proc.stdout, "r|", dest)
+    except BaseException as e:
+        proc.kill()
+        feeder.join()
+        # A download failure shows up as a truncated tar; report the cause
+        if feed_error:
+            raise feed_error[0] from e
+        raise
+    finally:
+        feeder.join()
+        proc.stdout.close()
+        proc.wait()
+
+    if feed_error:
+        raise feed_error[0]
+    if proc.returncode != 0:
+        raise RuntimeError(f"zstd exited with status {proc.returncode}")
+
+
+if __name__ == "__main__":
+    raise SystemExit("This file is meant to be imported, not executed.")
@@ -0,0 +1,269 @@
+import hashlib
+import os
+import shutil
+import tarfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO
+
+from kernel_builder.config.config import EXTRACT_JOBS
+
+# Files at least this large are written by the reader thread in chunks
+# instead of being buffered in memory for a worker.
+LARGE_FILE: int = 64 << 20
+
+
+@dataclass(slots=True)
+class ExtractStats:
+    files: int = 0
+    dirs: int = 0
+    links: int = 0
+    deduped: int = 0
+    size: int = 0
+
+
+def _within(path: str, root: str) -> bool:
+    return path == root or path.startswith(root + os.sep)
+
+
+class _Budget:
+    """Bound the bytes buffered for workers that have not been written yet."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit: int = limit
+        self.used: int = 0
+        self._cond: threading.Condition = threading.Condition()
+
+    def acquire(self, n: int) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: self.used == 0 or self.used + n <= self.limit)
+            self.used += n
+
+    def release(self, n: int) -> None:
+        with self._cond:
+            self.used -= n
+            self._cond.notify_all()
+
+
+class ParallelExtractor:
+    """
+    Extract a tar stream with one reader thread and a pool of writers.
+
+    The reader decompresses the archive sequentially (so streams work) and
+    hands each regular file to a worker, which creates, writes and stamps
+    it. Parent directories are created once per directory, directory
+    metadata and links are applied after every file is written, and files
+    with identical content and metadata are hardlinked to the first copy.
+    Every member goes through ``tarfile.data_filter``.
+    """
+
+    def __init__(
+        self,
+        dest: Path,
+        *,
+        workers: int = EXTRACT_JOBS,
+        dedupe: bool = True,
+        buffer: int = 256 << 20,
+    ) -> None:
+        self.dest: Path = dest
+        self.workers: int = workers
+        self.dedupe: bool = dedupe
+        self.stats: ExtractStats = ExtractStats()
+        self._budget: _Budget = _Budget(buffer)
+        self._made: set[str] = set()
+        self._blobs: dict[tuple[bytes, int, int], str] = {}
+        self._slots: threading.BoundedSemaphore = threading.BoundedSemaphore(
+            workers * 8
+        )
+        self._inflight: dict[str, Future[None]] = {}
+        self._errors: list[BaseException] = []
+        self._lock: threading.Lock = threading.Lock()
+
+    def _makedirs(self, path: str) -> None:
+        if path in self._made:
+            return
+        os.makedirs(path, exist_ok=True)
+        while path not in self._made and path != str(self.dest):
+            self._made.add(path)
+            path = os.path.dirname(path)
+
+    def _unlink(self, path: str) -> None:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            return
+        except IsADirectoryError:
+            # A later member replaces a directory, as tar --recursive-unlink
+            shutil.rmtree(path)
+            self._made = {d for d in self._made if not _within(d, path)}
+        # The path is being replaced: it can no longer be a dedupe source
+        with self._lock:
+            for key in [k for k, v in self._blobs.items() if _within(v, path)]:
+                del self._blobs[key]
+
+    def _create(self, path: str) -> int:
+        flags: int = os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_CLOEXEC
+        try:
+            return os.open(path, flags, 0o600)
+        except FileExistsError:
+            # Never write through an existing hardlink or symlink
+            self._unlink(path)
+            return os.open(path, flags, 0o600)
+
+    def _link(self, src: str, path: str) -> None:
+        try:
+            os.link(src, path)
+        except FileExistsError:
+            self._unlink(path)
+            os.link(src, path)
+
+    @staticmethod
+    def _stamp(path: str | int, member: tarfile.TarInfo) -> None:
+        # data_filter leaves None where the default should be kept
+        if member.mode is not None:  # pyright: ignore[reportUnnecessaryComparison]
+            os.chmod(path, member.mode)
+        if member.mtime is not None:  # pyright: ignore[reportUnnecessaryComparison]
+            os.utime(path, (member.mtime, member.mtime))
+
+    def _write(self, path: str, data: bytes, member: tarfile.TarInfo) -> None:
+        try:
+            key: tuple[bytes, int, int] | None = None
+            if self.dedupe and data:
+                key = (hashlib.blake2b(data).digest(), member.mode, int(member.mtime))
+                with self._lock:
+                    first: str | None = self._blobs.get(key)
+                if first is not None:
+                    self._link(first, path)
+                    with self._lock:
+                        self.stats.deduped += 1
+                    return
+
+            with os.fdopen(self._create(path), "wb") as f:
+                f.write(data)
+                f.flush()
+                self._stamp(f.fileno(), member)
+            if key is not None:
+                with self._lock:
+                    self._blobs.setdefault(key, path)
+        finally:
+            self._budget.release(len(data))
+
+    def _write_large(self, path: str, src: IO[bytes], member: tarfile.TarInfo) -> None:
+        with os.fdopen(self._create(path), "wb") as f:
+            while chunk := src.read(8 << 20):
+                f.write(chunk)
+            f.flush()
+            self._stamp(f.fileno(), member)
+
+    def _done(self, path: str, future: Future[None]) -> None:
+        self._slots.release()
+        with self._lock:
+            if self._inflight.get(path) is future:
+                del self._inflight[path]
+            if (err := future.exception()) is not None:
+                self._errors.append(err)
+
+    def _settle(self, path: str) -> None:
+        # A later entry for the same path replaces the earlier one
+        with self._lock:
+            previous: Future[None] | None = self._inflight.get(path)
+        if previous is not None:
+            wait([previous])
+
+    def _submit(
+        self,
+        pool: ThreadPoolExecutor,
+        path: str,
+        src: IO[bytes],
+        member: tarfile.TarInfo,
+    ) -> None:
+        self._settle(path)
+        self._budget.acquire(member.size)
+        data: bytes = src.read()
+        if self.workers <= 1:
+            self._write(path, data, member)
+            return
+
+        self._slots.acquire()
+        with self._lock:
+            if self._errors:
+                self._slots.release()
+                self._budget.release(len(data))
+                raise self._errors[0]
+            future: Future[None] = pool.submit(self._write, path, data, member)
+            self._inflight[path] = future
+        future.add_done_callback(lambda f: self._done(path, f))
+
+    def extract(self, fileobj: IO[bytes], mode: str = "r|*") -> ExtractStats:
+        """
+        Extract a tar archive read from a file object.
+
+        :param fileobj: Archive stream, read sequentially.
+        :param mode: tarfile stream mode (``r|gz``, ``r|xz``, ``r|*`` ...).
+        :return: Extraction statistics.
+        """
+        dest: str = str(self.dest.resolve())
+        os.makedirs(dest, exist_ok=True)
+        self.dest = Path(dest)
+        dirs: list[tarfile.TarInfo] = []
+        links: list[tarfile.TarInfo] = []
+
+        with (
+            tarfile.open(fileobj=fileobj, mode=mode, bufsize=1 << 20) as tar,  # pyright: ignore[reportCallIssue, reportArgumentType]
+            ThreadPoolExecutor(self.workers, thread_name_prefix="extract") as pool,
+        ):
+            for raw in tar:
+                member: tarfile.TarInfo = tarfile.data_filter(raw, dest)
+                path: str = os.path.join(dest, member.name)
+
+                if member.isdir():
+                    self._makedirs(path)
+                    dirs.append(member)
+                    continue
+                if member.issym() or member.islnk():
+                    # Created last so no file is ever written through a link
+                    links.append(member)
+                    continue
+                if not member.isreg():
+                    continue
+
+                self._makedirs(os.path.dirname(path))
+                src: IO[bytes] | None = tar.extractfile(raw)
+                assert src is not None
+                self.stats.files += 1
+                self.stats.size += member.size
+
+                if member.size >= LARGE_FILE:
+                    self._settle(path)
+                    self._write_large(path, src, member)
+                else:
+                    self._submit(pool, path, src, member)
+
+            pool.shutdown(wait=True)
+            if self._errors:
+                raise self._errors[0]
+
+            for member in links:
+                path = os.path.join(dest, member.name)
+                self._makedirs(os.path.dirname(path))
+                self._unlink(path)
+                if member.issym():
+                    os.symlink(member.linkname, path)
+                else:
+                    os.link(os.path.join(dest, member.linkname), path)
+                self.stats.links += 1
+
+            # Deepest first, so restricting a parent does not block its children
+            for member in sorted(dirs, key=lambda m: m.name, reverse=True):
+                path = os.path.join(dest, member.name)
+                if not os.path.islink(path):
+                    self._stamp(path, member)
+            self.stats.dirs = len(self._made)
+
+        return self.stats
+
+
+if __name__ == "__main__":
+    raise SystemExit("This file is meant to be imported, not executed.")
@@ -1,4 +1,9 @@
+import fcntl
+import os
 import shutil
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
 from os import chdir
 from pathlib import Path
 
@@ -40,6 +45,70 @@ class FileSystem:
                 path.unlink()
         path.mkdir(parents=True)
 
+    @staticmethod
+    def write_atomic(path: Path, data: str | bytes) -> None:
+        """
+        Write a file through a temporary sibling and rename it into place, so
+        readers never see a partially written file.
+
+        :param path: Destination file.
+        :param data: Text or bytes to write.
+        :return: None
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data.encode() if isinstance(data, str) else data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @staticmethod
+    def du(path: Path) -> int:
+        """
+        Apparent size of a file or directory tree in bytes (symlinks not followed).
+
+        :param path: Path to measure.
+        :return: Size in bytes, 0 if the path does not exist.
+        """
+        if not path.exists():
+            return 0
+        if not path.is_dir():
+            return path.lstat().st_size
+        total: int = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                total += os.lstat(os.path.join(root, name)).st_size
+        return total
+
+    @staticmethod
+    @contextmanager
+    def lock(
+        path: Path, *, shared: bool = False, blocking: bool = True
+    ) -> Iterator[None]:
+        """
+        Hold an advisory flock() on a lock file for the duration of the block.
+
+        Locks are per open file, so they serialize threads of this process as
+        well as other builds running on the same host.
+
+        :param path: Lock file to create/open.
+        :param shared: Take a shared (reader) lock instead of an exclusive one.
+        :param blocking: Wait for the lock; otherwise raise BlockingIOError
+            when it is held elsewhere.
+        :return: None
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a") as fd:
+            mode: int = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            fcntl.flock(fd, mode if blocking else mode | fcntl.LOCK_NB)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
 
 if __name__ == "__main__":
     raise SystemExit("This file is meant to be imported, not executed.")
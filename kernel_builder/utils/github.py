@@ -1,17 +1,158 @@
+import hashlib
+import json
 import os
-from typing import Any
+import threading
+import time
+from pathlib import Path
+from typing import Any, ClassVar
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.models import Response
 
+from kernel_builder.constants import GITHUB_CACHE
+from kernel_builder.utils.fs import FileSystem
+from kernel_builder.utils.log import log
+
+# Stop and wait for the rate-limit window to reset below this many calls
+RATE_LIMIT_RESERVE: int = 10
+# Never sleep longer than this for a rate-limit reset
+MAX_BACKOFF: int = 15 * 60
+
 
 class GithubAPI:
-    def _fetch_raw(self, api: str) -> dict[Any, Any]:
-        resp: Response = requests.get(
-            api, headers={"Authorization": f"token {os.getenv('GH_TOKEN')}"}, timeout=10
+    """
+    GitHub REST client shared by the whole build.
+
+    All instances share one pooled session, a per-process memo (an endpoint
+    is fetched at most once per process) and an on-disk cache of
+    ETag-validated responses. A 304 answer to a conditional request does
+    not count against the rate limit.
+    """
+
+    _session: ClassVar[requests.Session | None] = None
+    _memo: ClassVar[dict[str, Any]] = {}
+    _locks: ClassVar[dict[str, threading.Lock]] = {}
+    _guard: ClassVar[threading.Lock] = threading.Lock()
+    remaining: ClassVar[int | None] = None
+    reset_at: ClassVar[float] = 0.0
+
+    def __init__(self, cache: Path | None = GITHUB_CACHE) -> None:
+        self.cache: Path | None = cache
+
+    @classmethod
+    def session(cls) -> requests.Session:
+        with cls._guard:
+            if cls._session is None:
+                session: requests.Session = requests.Session()
+                session.mount("https://", HTTPAdapter(pool_maxsize=16))
+                session.headers["Accept"] = "application/vnd.github+json"
+                if token := os.getenv("GH_TOKEN"):
+                    session.headers["Authorization"] = f"token {token}"
+                cls._session = session
+            return cls._session
+
+    @classmethod
+    def _url_lock(cls, api: str) -> threading.Lock:
+        with cls._guard:
+            return cls._locks.setdefault(api, threading.Lock())
+
+    def _cache_file(self, api: str) -> Path | None:
+        if self.cache is None:
+            return None
+        return self.cache / f"{hashlib.sha256(api.encode()).hexdigest()[:16]}.json"
+
+    def _read_cache(self, api: str) -> dict[str, Any] | None:
+        path: Path | None = self._cache_file(api)
+        if path is None or not path.exists():
+            return None
+        try:
+            cached: dict[str, Any] = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+        return cached if cached.get("url") == api else None
+
+    def _write_cache(self, api: str, etag: str, body: Any) -> None:
+        path: Path | None = self._cache_file(api)
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        FileSystem.write_atomic(
+            path, json.dumps({"url": api, "etag": etag, "body": body})
         )
-        resp.raise_for_status()
-        return resp.json()
+
+    @classmethod
+    def _track(cls, resp: Response) -> None:
+        remaining: str | None = resp.headers.get("X-RateLimit-Remaining")
+        reset: str | None = resp.headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        with cls._guard:
+            cls.remaining = int(remaining)
+            cls.reset_at = float(reset)
+
+    @classmethod
+    def _backoff(cls, wait: float | None = None) -> None:
+        if wait is None:
+            if cls.remaining is None or cls.remaining > RATE_LIMIT_RESERVE:
+                return
+            wait = cls.reset_at - time.time()
+        if wait <= 0:
+            return
+        wait = min(wait, MAX_BACKOFF)
+        log(
+            f"GitHub API rate limit low ({cls.remaining} left), waiting {wait:.0f}s",
+            "warning",
+        )
+        time.sleep(wait)
+
+    @staticmethod
+    def _retry_after(resp: Response) -> float | None:
+        if resp.status_code not in (403, 429):
+            return None
+        if after := resp.headers.get("Retry-After"):
+            return float(after)
+        if resp.headers.get("X-RateLimit-Remaining") == "0":
+            return float(resp.headers.get("X-RateLimit-Reset", 0)) - time.time()
+        return None
+
+    def _get(self, api: str, headers: dict[str, str]) -> Response:
+        resp: Response = self.session().get(api, headers=headers, timeout=10)
+        self._track(resp)
+        return resp
+
+    def _request(self, api: str, etag: str | None) -> Response:
+        headers: dict[str, str] = {"If-None-Match": etag} if etag else {}
+        # Conditional requests are free when answered with 304
+        if etag is None:
+            self._backoff()
+        resp: Response = self._get(api, headers)
+        for _ in range(2):
+            wait: float | None = self._retry_after(resp)
+            if wait is None:
+                break
+            resp.close()
+            self._backoff(max(wait, 1.0))
+            resp = self._get(api, headers)
+        return resp
+
+    def _fetch_raw(self, api: str) -> Any:
+        with self._url_lock(api):
+            if api in self._memo:
+                return self._memo[api]
+
+            cached: dict[str, Any] | None = self._read_cache(api)
+            resp: Response = self._request(api, cached["etag"] if cached else None)
+            if resp.status_code == 304 and cached is not None:
+                data: Any = cached["body"]
+            else:
+                resp.raise_for_status()
+                data = resp.json()
+                if etag := resp.headers.get("ETag"):
+                    self._write_cache(api, etag, data)
+
+            self._memo[api] = data
+            return data
 
     def fetch_latest_download_url(self, repo_api: str, extension: str) -> str:
         data: dict[Any, Any] = self._fetch_raw(repo_api)
@@ -0,0 +1,172 @@
+import re
+from pathlib import Path
+
+from kernel_builder.utils.fs import FileSystem
+
+_LINE: re.Pattern[str] = re.compile(
+    r"^(?:(CONFIG_\w+)=(.*)|# (CONFIG_\w+) is not set)$"
+)
+
+
+class KconfigFile:
+    """
+    In-process equivalent of the kernel's ``scripts/config``.
+
+    The file is parsed once, any number of options are changed in memory
+    and the result is written back in a single pass. Edits follow
+    ``scripts/config`` exactly: every existing line of a symbol (set or
+    "is not set") is replaced in place, new symbols are appended at the
+    end, and ``undefine`` drops every line of a symbol.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path: Path = path
+        text: str = path.read_text() if path.exists() else ""
+        self.lines: list[str | None] = list(text.splitlines())
+        self._index: dict[str, list[int]] = {}
+        for pos, line in enumerate(self.lines):
+            if sym := self._symbol_of(line):
+                self._index.setdefault(sym, []).append(pos)
+        self._before: dict[str, str | None] = {
+            sym: self.state(sym) for sym in self._index
+        }
+
+    @staticmethod
+    def _symbol_of(line: str | None) -> str | None:
+        if line is None or not (m := _LINE.match(line)):
+            return None
+        return m[1] or m[3]
+
+    @staticmethod
+    def symbol(name: str) -> str:
+        """
+        Normalize an option name the way ``scripts/config`` does.
+
+        :param name: ``CONFIG_FOO``, ``FOO`` or ``foo``.
+        :return: ``CONFIG_FOO``
+        """
+        name = name.upper()
+        return name if name.startswith("CONFIG_") else f"CONFIG_{name}"
+
+    def _set_line(self, sym: str, line: str) -> None:
+        positions: list[int] = self._index.get(sym, [])
+        if positions:
+            for pos in positions:
+                self.lines[pos] = line
+        else:
+            self._index[sym] = [len(self.lines)]
+            self.lines.append(line)
+
+    def state(self, name: str) -> str | None:
+        """
+        Current value of an option, like ``scripts/config --state``.
+
+        :param name: Option name.
+        :return: ``n`` if not set, the value with string quotes removed, or
+            None if the option is undefined.
+        """
+        sym: str = self.symbol(name)
+        lines: list[str] = [
+            line for pos in self._index.get(sym, []) if (line := self.lines[pos])
+        ]
+        if f"# {sym} is not set" in lines:
+            return "n"
+        for line in lines:
+            if line.startswith(f"{sym}="):
+                value: str = line[len(sym) + 1 :]
+                value = value.removeprefix('"').removesuffix('"')
+                return value.replace('\\"', '"')
+        return None
+
+    def enable(self, name: str) -> None:
+        sym: str = self.symbol(name)
+        self._set_line(sym, f"{sym}=y")
+
+    def disable(self, name: str) -> None:
+        sym: str = self.symbol(name)
+        self._set_line(sym, f"# {sym} is not set")
+
+    def module(self, name: str) -> None:
+        sym: str = self.symbol(name)
+        self._set_line(sym, f"{sym}=m")
+
+    def set_val(self, name: str, value: str | int) -> None:
+        """
+        Set an unquoted value (int, hex or tristate), like ``--set-val``.
+        """
+        sym: str = self.symbol(name)
+        self._set_line(sym, f"{sym}={value}")
+
+    def set_str(self, name: str, value: str) -> None:
+        """
+        Set a quoted string value, like ``--set-str``.
+        """
+        sym: str = self.symbol(name)
+        escaped: str = value.replace('"', '\\"')
+        self._set_line(sym, f'{sym}="{escaped}"')
+
+    def undefine(self, name: str) -> None:
+        sym: str = self.symbol(name)
+        for pos in self._index.pop(sym, []):
+            self.lines[pos] = None
+
+    def set(self, name: str, value: bool | int | str) -> None:
+        """
+        Set an option from a Python value: booleans enable or disable it,
+        ints are written as is and strings are quoted.
+        """
+        if isinstance(value, bool):
+            self.enable(name) if value else self.disable(name)
+        elif isinstance(value, int):
+            self.set_val(name, value)
+        else:
+            self.set_str(name, value)
+
+    def update(self, options: dict[str, bool | int | str]) -> None:
+        for name, value in options.items():
+            self.set(name, value)
+
+    def merge(self, fragment: Path) -> None:
+        """
+        Apply a config fragment: each ``CONFIG_X=...`` or ``# CONFIG_X is
+        not set`` line in it overrides the option. Other lines are ignored.
+
+        :param fragment: Fragment file.
+        :return: None
+        """
+        for line in fragment.read_text().splitlines():
+            if sym := self._symbol_of(line.strip()):
+                self._set_line(sym, line.strip())
+
+    def diff(self) -> list[tuple[str, str | None, str | None]]:
+        """
+        Options changed since the file was read.
+
+        :return: (symbol, old state, new state) per changed option, in file order.
+        """
+        result: list[tuple[str, str | None, str | None]] = []
+        for sym in dict.fromkeys([*self._before, *self._index]):
+            old, new = self._before.get(sym), self.state(sym)
+            if old != new:
+                result.append((sym, old, new))
+        return result
+
+    def render(self) -> str:
+        lines: list[str] = [line for line in self.lines if line is not None]
+        return "".join(f"{line}\n" for line in lines)
+
+    def save(self) -> list[tuple[str, str | None, str | None]]:
+        """
+        Write the file back if anything changed.
+
+        :return: The changes written, as returned by ``diff``.
+        """
+        changes = self.diff()
+        text: str = self.render()
+        if not self.path.exists() or text != self.path.read_text():
+            FileSystem.write_atomic(self.path, text)
+        return changes
+
+
+if __name__ == "__main__":
+    raise SystemExit("This file is meant to be imported, not executed.")
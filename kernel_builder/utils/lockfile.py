@@ -0,0 +1,61 @@
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from kernel_builder.utils.fs import FileSystem
+
+
+@dataclass(slots=True)
+class SourceLock:
+    """
+    Commit pins written by ``kernel_builder lock``.
+
+    Entries are keyed by ``<url>@<ref>`` so the same pin applies wherever the
+    source is checked out.
+    """
+
+    VERSION = 1
+
+    sources: dict[str, dict[str, str]] = field(default_factory=dict)
+    kernelsu: dict[str, dict[str, str]] = field(default_factory=dict)
+
+    @staticmethod
+    def key(url: str, ref: str) -> str:
+        return f"{url}@{ref}"
+
+    @classmethod
+    def load(cls, path: Path) -> "SourceLock | None":
+        """
+        Read a lockfile.
+
+        :param path: Lockfile path.
+        :return: The lock, or None if the file does not exist.
+        """
+        if not path.exists():
+            return None
+        data: dict[str, Any] = json.loads(path.read_text())
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f"Unsupported lockfile version in {path}")
+        return cls(sources=data.get("sources", {}), kernelsu=data.get("kernelsu", {}))
+
+    def save(self, path: Path) -> None:
+        data: dict[str, Any] = {
+            "version": self.VERSION,
+            "sources": dict(sorted(self.sources.items())),
+            "kernelsu": dict(sorted(self.kernelsu.items())),
+        }
+        FileSystem.write_atomic(path, json.dumps(data, indent=2) + "\n")
+
+    def pin(self, url: str, ref: str, commit: str, *, kernelsu: bool = False) -> None:
+        table: dict[str, dict[str, str]] = self.kernelsu if kernelsu else self.sources
+        table[self.key(url, ref)] = {"url": url, "ref": ref, "commit": commit}
+
+    def commit(self, url: str, ref: str, *, kernelsu: bool = False) -> str | None:
+        table: dict[str, dict[str, str]] = self.kernelsu if kernelsu else self.sources
+        entry: dict[str, str] | None = table.get(self.key(url, ref))
+        return entry["commit"] if entry else None
+
+
+if __name__ == "__main__":
+    raise SystemExit("This file is meant to be imported, not executed.")
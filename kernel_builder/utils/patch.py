@@ -0,0 +1,563 @@
+import json
+import os
+import re
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Literal
+
+from kernel_builder.config.config import PATCH_FUZZ, PATCH_JOBS
+from kernel_builder.utils.fs import FileSystem
+from kernel_builder.utils.log import log
+
+HUNK_HEADER: re.Pattern[str] = re.compile(
+    r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)$"
+)
+
+HunkStatus = Literal["applied", "already applied", "failed"]
+
+
+class PatchError(RuntimeError):
+    def __init__(self, message: str, result: "PatchResult | None" = None) -> None:
+        super().__init__(message)
+        self.result: PatchResult | None = result
+
+
+# ---- Parsing
+@dataclass(slots=True)
+class Hunk:
+    old_start: int
+    old_len: int
+    new_start: int
+    new_len: int
+    # (" " | "-" | "+", line with its line ending)
+    lines: list[tuple[str, str]] = field(default_factory=list)
+    section: str = ""
+
+    @property
+    def old(self) -> list[str]:
+        return [text for op, text in self.lines if op != "+"]
+
+    @property
+    def new(self) -> list[str]:
+        return [text for op, text in self.lines if op != "-"]
+
+    def context(self) -> tuple[int, int]:
+        """
+        :return: Context lines before and after the change.
+        """
+        ops: list[str] = [op for op, _ in self.lines]
+        lead: int = next((i for i, op in enumerate(ops) if op != " "), len(ops))
+        trail: int = next(
+            (i for i, op in enumerate(reversed(ops)) if op != " "), len(ops)
+        )
+        return lead, trail
+
+
+@dataclass(slots=True)
+class FilePatch:
+    # None for /dev/null, i.e. a created or deleted file
+    old_path: str | None
+    new_path: str | None
+    hunks: list[Hunk] = field(default_factory=list)
+    # From git extended headers
+    new_mode: int | None = None
+    binary: bool = False
+
+    @property
+    def path(self) -> str:
+        path: str | None = self.new_path or self.old_path
+        assert path is not None
+        return path
+
+
+def _strip(path: str, strip: int) -> str | None:
+    path = path.rstrip("\r\n").split("\t")[0].strip()
+    if path.startswith('"') and path.endswith('"'):
+        path = path[1:-1]
+    if path == "/dev/null":
+        return None
+    parts: list[str] = path.split("/")
+    return "/".join(parts[strip:]) if len(parts) > strip else parts[-1]
+
+
+def _git_paths(line: str, strip: int) -> tuple[str | None, str | None]:
+    # "diff --git a/x b/x": split at the " b/" closest to the middle
+    rest: str = line.rstrip("\r\n")[len("diff --git ") :]
+    cut: int = rest.find(" b/", len(rest) // 2 - 2)
+    if cut < 0:
+        cut = rest.rfind(" ")
+    return _strip(rest[:cut], strip), _strip(rest[cut + 1 :], strip)
+
+
+def _no_newline(hunk: Hunk) -> None:
+    # "\ No newline at end of file" refers to the hunk line before it
+    if hunk.lines:
+        op, text = hunk.lines[-1]
+        hunk.lines[-1] = (op, text.rstrip("\r\n"))
+
+
+def _parse_hunk(lines: list[str], i: int, header: re.Match[str]) -> tuple[Hunk, int]:
+    hunk: Hunk = Hunk(
+        old_start=int(header[1]),
+        old_len=int(header[2]) if header[2] is not None else 1,
+        new_start=int(header[3]),
+        new_len=int(header[4]) if header[4] is not None else 1,
+        section=header[5].strip(),
+    )
+    old, new = hunk.old_len, hunk.new_len
+    while (old > 0 or new > 0) and i < len(lines):
+        line: str = lines[i]
+        op: str = line[:1]
+        if op == "\\":
+            _no_newline(hunk)
+            i += 1
+            continue
+        if op in (" ", "-", "+"):
+            hunk.lines.append((op, line[1:]))
+        elif line in ("\n", "\r\n"):
+            # Context line whose leading space was stripped by an editor
+            op = " "
+            hunk.lines.append((op, line))
+        elif old == new:
+            break
+        else:
+            raise PatchError(f"Malformed hunk at patch line {i + 1}: {line!r}")
+        old -= op != "+"
+        new -= op != "-"
+        i += 1
+    if old != new:
+        raise PatchError(f"Patch ends inside the hunk at @@ -{hunk.old_start}")
+    # Trailing blank context lines dropped by a mailer or editor, as patch does
+    hunk.lines.extend([(" ", "\n")] * old)
+    while i < len(lines) and lines[i].startswith("\\"):
+        _no_newline(hunk)
+        i += 1
+    return hunk, i
+
+
+def parse(text: str, strip: int = 1) -> list[FilePatch]:
+    """
+    Parse a unified diff, plain or git style (format-patch mail headers,
+    ``diff --git`` extended headers and the signature are skipped).
+
+    :param text: Patch text.
+    :param strip: Leading path components to drop, as ``patch -p``.
+    :return: One entry per file section, in patch order.
+    :raises PatchError: For a hunk that is cut short or malformed.
+    """
+    lines: list[str] = text.splitlines(keepends=True)
+    files: list[FilePatch] = []
+    current: FilePatch | None = None
+    # A "diff --git" section still waiting for its ---/+++ lines
+    git_header: bool = False
+    i: int = 0
+    while i < len(lines):
+        line: str = lines[i]
+        if line.startswith("diff --git "):
+            current = FilePatch(*_git_paths(line, strip))
+            files.append(current)
+            git_header = True
+        elif git_header and current is not None and not line.startswith("---"):
+            if line.startswith(("new file mode ", "new mode ")):
+                current.new_mode = int(line.split()[-1], 8)
+                if line.startswith("new file"):
+                    current.old_path = None
+            elif line.startswith("deleted file mode "):
+                current.new_path = None
+            elif line.startswith(("GIT binary patch", "Binary files ")):
+                current.binary = True
+            elif line.startswith("@@ ") or not line.startswith(
+                (
+                    "index ",
+                    "old mode ",
+                    "similarity",
+                    "dissimilarity",
+                    "rename ",
+                    "copy ",
+                )
+            ):
+                git_header = False
+                continue
+        elif (
+            line.startswith("--- ")
+            and i + 1 < len(lines)
+            and lines[i + 1].startswith("+++ ")
+        ):
+            old_path: str | None = _strip(line[4:], strip)
+            new_path: str | None = _strip(lines[i + 1][4:], strip)
+            if git_header and current is not None:
+                current.old_path, current.new_path = old_path, new_path
+            else:
+                current = FilePatch(old_path, new_path)
+                files.append(current)
+            git_header = False
+            i += 2
+            continue
+        elif (m := HUNK_HEADER.match(line)) and current is not None:
+            hunk, i = _parse_hunk(lines, i + 1, m)
+            current.hunks.append(hunk)
+            continue
+        i += 1
+    return files
+
+
+# ---- Applying
+@dataclass(slots=True)
+class HunkResult:
+    index: int
+    status: HunkStatus
+    # 1-based line the hunk was found at, 0 when it failed
+    line: int = 0
+    offset: int = 0
+    fuzz: int = 0
+
+
+@dataclass(slots=True)
+class FileResult:
+    path: str
+    hunks: list[HunkResult] = field(default_factory=list)
+    created: bool = False
+    deleted: bool = False
+    error: str = ""
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.error) or any(h.status == "failed" for h in self.hunks)
+
+    @property
+    def already_applied(self) -> bool:
+        return not self.error and all(h.status == "already applied" for h in self.hunks)
+
+
+@dataclass(slots=True)
+class PatchResult:
+    patch: str
+    files: list[FileResult]
+    dry_run: bool = False
+
+    @property
+    def failed(self) -> list[FileResult]:
+        return [f for f in self.files if f.failed]
+
+    @property
+    def already_applied(self) -> bool:
+        """
+        Every hunk of every file is present already (nothing left to do).
+        """
+        return bool(self.files) and all(f.already_applied for f in self.files)
+
+    def hunks(self) -> Iterator[tuple[str, HunkResult]]:
+        for f in self.files:
+            for h in f.hunks:
+                yield f.path, h
+
+    def summary(self) -> dict[str, int]:
+        counts: dict[str, int] = {"applied": 0, "already applied": 0, "failed": 0}
+        for _, h in self.hunks():
+            counts[h.status] += 1
+        return counts
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "patch": self.patch,
+                "dry_run": self.dry_run,
+                "summary": self.summary(),
+                "files": [
+                    {
+                        **asdict(f),
+                        "failed": f.failed,
+                        "already_applied": f.already_applied,
+                    }
+                    for f in self.files
+                ],
+            },
+            indent=2,
+        )
+
+
+def _find(
+    lines: list[str], needle: list[str], expected: int, lowest: int
+) -> int | None:
+    """
+    Position of ``needle`` in ``lines`` closest to ``expected``, not before
+    ``lowest``.
+    """
+    last: int = len(lines) - len(needle)
+    if last < lowest:
+        return None
+    if not needle:
+        return min(max(expected, lowest), len(lines))
+    first: str = needle[0]
+    n: int = len(needle)
+    for delta in range(max(expected - lowest, last - expected) + 1):
+        for pos in (expected + delta, expected - delta) if delta else (expected,):
+            if (
+                lowest <= pos <= last
+                and lines[pos] == first
+                and lines[pos : pos + n] == needle
+            ):
+                return pos
+    return None
+
+
+def _locate(
+    lines: list[str],
+    hunk: Hunk,
+    expected: int,
+    lowest: int,
+    max_fuzz: int,
+) -> tuple[HunkStatus, int, int, int] | None:
+    """
+    Find a hunk, forward or already applied, trying less fuzz first.
+
+    :return: (status, position, lines trimmed before, lines trimmed after),
+        or None if it is in neither form.
+    """
+    lead, trail = hunk.context()
+    forms: tuple[tuple[HunkStatus, list[str]], ...] = (
+        ("applied", hunk.old),
+        ("already applied", hunk.new),
+    )
+    for fuzz in range(max_fuzz + 1):
+        top: int = min(fuzz, lead)
+        bottom: int = min(fuzz, trail)
+        if fuzz and top == min(fuzz - 1, lead) and bottom == min(fuzz - 1, trail):
+            continue
+        # The form found closer to where the hunk should be wins; on a tie
+        # the longer one, e.g. a deletion's old lines also contain its new ones
+        best: tuple[int, int, HunkStatus, int] | None = None
+        for status, form in forms:
+            needle: list[str] = form[top : len(form) - bottom]
+            # Fuzz never trims a hunk down to nothing
+            if not needle and form:
+                continue
+            pos: int | None = _find(lines, needle, expected + top, lowest)
+            if pos is None:
+                continue
+            candidate = (abs(pos - top - expected), -len(needle), status, pos - top)
+            if best is None or candidate[:2] < best[:2]:
+                best = candidate
+        if best is not None:
+            return best[2], best[3], top, bottom
+    return None
+
+
+@dataclass(slots=True)
+class _Change:
+    result: FileResult
+    # Content to write to ``path`` (None: leave the file alone)
+    content: str | None = None
+    mode: int | None = None
+    remove: str | None = None
+
+
+def _read(path: Path) -> str | None:
+    try:
+        return path.read_bytes().decode("utf-8", "surrogateescape")
+    except FileNotFoundError:
+        return None
+
+
+def _apply_file(
+    fp: FilePatch, text: str | None, max_fuzz: int
+) -> tuple[FileResult, str | None]:
+    """
+    Apply one file section to the file's content in memory.
+
+    :return: The result and the new content (None when the file is deleted).
+    """
+    result: FileResult = FileResult(fp.path)
+    if fp.binary:
+        result.error = "binary patches are not supported"
+        return result, text
+    if fp.old_path is None and text is not None:
+        # Creation of a file that exists: applied if it matches
+        if text == "".join(h for hunk in fp.hunks for h in hunk.new):
+            result.hunks = [
+                HunkResult(n, "already applied", 1) for n in range(1, len(fp.hunks) + 1)
+            ]
+        else:
+            result.error = "file to be created already exists"
+        return result, text
+    if fp.old_path is not None and text is None:
+        if fp.new_path is None:
+            result.hunks = [
+                HunkResult(n, "already applied") for n in range(1, len(fp.hunks) + 1)
+            ]
+        else:
+            result.error = "file not found"
+        return result, text
+
+    lines: list[str] = (text or "").splitlines(keepends=True)
+    shift: int = 0
+    lowest: int = 0
+    for n, hunk in enumerate(fp.hunks, 1):
+        # An insertion (no old lines) goes after line old_start
+        expected: int = hunk.old_start - (1 if hunk.old_len else 0) + shift
+        found = _locate(lines, hunk, expected, lowest, max_fuzz)
+        if found is None:
+            result.hunks.append(HunkResult(n, "failed"))
+            continue
+        status, pos, top, bottom = found
+        fuzz: int = max(top, bottom)
+        offset: int = pos - expected
+        result.hunks.append(HunkResult(n, status, pos + 1, offset, fuzz))
+        if status == "applied":
+            old: list[str] = hunk.old[top : len(hunk.old) - bottom]
+            new: list[str] = hunk.new[top : len(hunk.new) - bottom]
+            lines[pos + top : pos + top + len(old)] = new
+            lowest = pos + top + len(new)
+            shift += offset + len(new) - len(old)
+        else:
+            lowest = pos + len(hunk.new) - bottom
+            shift += offset + len(hunk.new) - len(hunk.old)
+
+    if fp.new_path is None and not result.failed:
+        if lines:
+            result.error = "file to be deleted is not empty after patching"
+            return result, "".join(lines)
+        result.deleted = True
+        return result, None
+    result.created = fp.old_path is None
+    return result, "".join(lines)
+
+
+def _apply_group(root: Path, group: list[FilePatch], max_fuzz: int) -> list[_Change]:
+    # Sections of one file are applied in patch order on the same content
+    changes: list[_Change] = []
+    source: str | None = group[0].old_path or group[0].new_path
+    assert source is not None
+    text: str | None = _read(root / source)
+    target: str | None = group[0].new_path
+    # A rename that was applied before: carry on from the new name
+    renamed: bool = (
+        text is None and target not in (None, source) and (root / target).exists()
+    )
+    if renamed:
+        assert target is not None
+        text = _read(root / target)
+    for fp in group:
+        before: str | None = text
+        result, text = _apply_file(fp, text, max_fuzz)
+        change: _Change = _Change(result, mode=fp.new_mode)
+        moved: bool = bool(fp.old_path and fp.new_path and fp.old_path != fp.new_path)
+        if text is None:
+            change.remove = fp.old_path if before is not None else None
+        else:
+            change.content = text if text != before or (moved and not renamed) else None
+            if moved and not renamed:
+                change.remove = fp.old_path
+        changes.append(change)
+    return changes
+
+
+def apply(
+    patch_file: Path,
+    cwd: Path | None = None,
+    *,
+    strip: int = 1,
+    fuzz: int = PATCH_FUZZ,
+    dry_run: bool = False,
+    check: bool = True,
+    jobs: int = PATCH_JOBS,
+) -> PatchResult:
+    """
+    Apply a unified diff in-process, like ``patch -p1 --forward``.
+
+    Hunks are looked up at their line number first, then further away
+    (offset), then with up to ``fuzz`` context lines ignored at either end.
+    A hunk whose result is already in the file is skipped, so applying a
+    patch twice is harmless. Files are processed in parallel and written
+    only once every file was computed.
+
+    :param patch_file: Patch to apply.
+    :param cwd: Tree the patch applies to.
+    :param strip: Leading path components to drop, as ``patch -p``.
+    :param fuzz: Context lines that may be ignored at either end of a hunk.
+    :param dry_run: Only report what would happen.
+    :param check: Raise, without touching the tree, if any hunk fails.
+        Otherwise the hunks that apply are written, like patch does.
+    :param jobs: Files processed at the same time.
+    :return: Per file and per hunk results.
+    :raises PatchError: If ``check`` and a hunk or file failed.
+    """
+    root: Path = cwd or Path.cwd()
+    files: list[FilePatch] = parse(
+        patch_file.read_bytes().decode("utf-8", "surrogateescape"), strip
+    )
+    if not files:
+        raise PatchError(f"No file to patch in {patch_file}")
+
+    groups: dict[str, list[FilePatch]] = {}
+    for fp in files:
+        groups.setdefault(fp.old_path or fp.path, []).append(fp)
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(groups)))) as pool:
+        changes: list[_Change] = [
+            change
+            for group_changes in pool.map(
+                lambda g: _apply_group(root, g, fuzz), groups.values()
+            )
+            for change in group_changes
+        ]
+
+    result: PatchResult = PatchResult(
+        str(patch_file), [c.result for c in changes], dry_run
+    )
+    if check and result.failed:
+        raise PatchError(
+            f"{patch_file.name} does not apply: "
+            + ", ".join(f.path for f in result.failed),
+            result,
+        )
+    if dry_run:
+        return result
+
+    for change in changes:
+        if change.result.failed and not change.result.hunks:
+            continue
+        path: Path = root / change.result.path
+        if change.content is not None:
+            mode: int | None = change.mode
+            if mode is None and path.exists():
+                mode = path.stat().st_mode
+            FileSystem.write_atomic(
+                path, change.content.encode("utf-8", "surrogateescape")
+            )
+            os.chmod(path, (mode or 0o644) & 0o7777)
+        elif change.mode is not None and path.exists():
+            # Mode-only change ("old mode"/"new mode")
+            if path.stat().st_mode & 0o7777 != change.mode & 0o7777:
+                os.chmod(path, change.mode & 0o7777)
+        if change.remove is not None and (root / change.remove).exists():
+            (root / change.remove).unlink()
+    return result
+
+
+def log_result(result: PatchResult) -> None:
+    for f in result.files:
+        if f.error:
+            log(f"{f.path}: {f.error}", "error")
+            continue
+        for h in f.hunks:
+            if h.status == "failed":
+                log(f"{f.path}: hunk #{h.index} FAILED", "error")
+            elif h.status == "already applied":
+                log(f"{f.path}: hunk #{h.index} already applied at {h.line}")
+            elif h.offset or h.fuzz:
+                log(
+                    f"{f.path}: hunk #{h.index} applied at {h.line} "
+                    f"(offset {h.offset}, fuzz {h.fuzz})"
+                )
+    counts: dict[str, int] = result.summary()
+    log(
+        f"{Path(result.patch).name}: {counts['applied']} hunks applied, "
+        f"{counts['already applied']} already applied, {counts['failed']} failed",
+        "warning" if counts["failed"] else "info",
+    )
+
+
+if __name__ == "__main__":
+    raise SystemExit("This file is meant to be imported, not executed.")
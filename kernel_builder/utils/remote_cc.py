@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Compiler prefix used by WorkerPool (``CCACHE_PREFIX``, or in front of clang
+without ccache): ``remote_cc.py clang <args>``.
+
+A plain ``-c`` compile of one C file is preprocessed here (which also
+writes Kbuild's dependency file) and the preprocessed source is compiled
+on a free worker slot. Everything else, and every job that finds no free
+slot or whose worker fails, runs locally with the original arguments.
+
+Runs as a standalone script, so it imports nothing from kernel_builder.
+
+Environment (set by WorkerPool.env):
+    GKI_WORKERS_ACTIVE  verified workers, "host:port/slots" separated by spaces
+    GKI_WORKER_STATE    directory holding one lock file per worker slot
+    GKI_WORKER_LOG      file every job appends its result to
+    GKI_CLANG_HASH      sha256 of the local clang, checked again by the worker
+"""
+
+import fcntl
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+CONNECT_TIMEOUT: float = 2.0
+COMPILE_TIMEOUT: float = float(os.getenv("GKI_WORKER_TIMEOUT", "600"))
+
+# Options whose value is the next argument
+_WITH_VALUE: frozenset[str] = frozenset(
+    {
+        "-o",
+        "-MF",
+        "-MT",
+        "-MQ",
+        "-I",
+        "-D",
+        "-U",
+        "-include",
+        "-imacros",
+        "-isystem",
+        "-iquote",
+        "-x",
+    }
+)
+# Only meaningful while preprocessing, which already happened here
+_PREPROCESSOR: tuple[str, ...] = (
+    "-I",
+    "-D",
+    "-U",
+    "-Wp,",
+    "-MD",
+    "-MMD",
+    "-MF",
+    "-MT",
+    "-MQ",
+    "-include",
+    "-imacros",
+    "-isystem",
+    "-iquote",
+)
+
+
+def source_of(args: list[str]) -> str | None:
+    """
+    The C source of a compile that can run remotely, else None.
+    """
+    if (
+        "-c" not in args
+        or "-o" not in args
+        or {"-E", "-S", "-M", "-MM", "-"} & set(args)
+    ):
+        return None
+    sources: list[str] = []
+    skip: bool = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in _WITH_VALUE:
+            skip = True
+        elif not arg.startswith("-"):
+            sources.append(arg)
+    if len(sources) != 1 or not sources[0].endswith(".c"):
+        return None
+    return sources[0]
+
+
+def preprocess_args(args: list[str]) -> list[str]:
+    out: list[str] = []
+    skip: bool = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg == "-o":
+            skip = True
+        else:
+            out.append("-E" if arg == "-c" else arg)
+    return out
+
+
+def remote_args(args: list[str], source: str) -> list[str]:
+    out: list[str] = []
+    skip: bool = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in _WITH_VALUE:
+            skip = True
+        elif arg == source or arg.startswith(_PREPROCESSOR):
+            continue
+        else:
+            out.append(arg)
+    # Debug info names the build directory, not the worker's scratch directory
+    return [*out, f"-fdebug-compilation-dir={os.getcwd()}", "-x", "cpp-output", "-"]
+
+
+def workers() -> list[tuple[str, int, int]]:
+    found: list[tuple[str, int, int]] = []
+    for spec in os.getenv("GKI_WORKERS_ACTIVE", "").split():
+        address, _, slots = spec.partition("/")
+        host, _, port = address.rpartition(":")
+        found.append((host, int(port), int(slots or 1)))
+    return found
+
+
+def acquire(state: Path) -> tuple[tuple[str, int], int] | None:
+    """
+    Lock a free worker slot.
+
+    :return: ((host, port), locked fd), or None when every slot is busy.
+    """
+    hosts: list[tuple[str, int, int]] = workers()
+    random.shuffle(hosts)
+    for host, port, slots in hosts:
+        for slot in range(slots):
+            fd: int = os.open(
+                state / f"{host}_{port}_{slot}.lock", os.O_RDWR | os.O_CREAT, 0o644
+            )
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            return (host, port), fd
+    return None
+
+
+def compile_remote(
+    address: tuple[str, int], args: list[str], source: bytes
+) -> tuple[int, str, bytes]:
+    header: dict[str, object] = {
+        "op": "compile",
+        "args": args,
+        "clang_hash": os.getenv("GKI_CLANG_HASH", ""),
+        "size": len(source),
+    }
+    with socket.create_connection(address, timeout=CONNECT_TIMEOUT) as sock:
+        sock.settimeout(COMPILE_TIMEOUT)
+        sock.sendall(json.dumps(header).encode() + b"\n" + source)
+        with sock.makefile("rb") as f:
+            reply: dict[str, object] = json.loads(f.readline())
+            data: bytes = f.read(int(reply["size"]))  # pyright: ignore[reportArgumentType]
+    if len(data) != reply["size"]:
+        raise OSError("Connection closed before the object was received")
+    return int(reply["status"]), str(reply["stderr"]), data  # pyright: ignore[reportArgumentType]
+
+
+def record(host: str, mode: str, seconds: float, sent: int, received: int) -> None:
+    log: str | None = os.getenv("GKI_WORKER_LOG")
+    if log:
+        with open(log, "a") as f:
+            f.write(f"{host}\t{mode}\t{seconds:.3f}\t{sent}\t{received}\n")
+
+
+def local(argv: list[str], host: str = "localhost", mode: str = "local") -> int:
+    start: float = time.time()
+    status: int = subprocess.run(argv, check=False).returncode
+    record(host, mode, time.time() - start, 0, 0)
+    return status
+
+
+def main(argv: list[str]) -> int:
+    if not argv:
+        print("usage: remote_cc.py <compiler> <args...>", file=sys.stderr)
+        return 2
+    args: list[str] = argv[1:]
+    source: str | None = source_of(args)
+    state: str | None = os.getenv("GKI_WORKER_STATE")
+    if source is None or not state:
+        return local(argv)
+    slot = acquire(Path(state))
+    if slot is None:
+        return local(argv)
+
+    (host, port), fd = slot
+    start: float = time.time()
+    try:
+        pre: subprocess.CompletedProcess[bytes] = subprocess.run(
+            [argv[0], *preprocess_args(args)], stdout=subprocess.PIPE, check=False
+        )
+        if pre.returncode:
+            return pre.returncode
+        status, stderr, obj = compile_remote(
+            (host, port), remote_args(args, source), pre.stdout
+        )
+    except (OSError, ValueError, KeyError) as e:
+        print(
+            f"remote_cc: {host}:{port} failed ({e}), compiling locally", file=sys.stderr
+        )
+        status = -1
+    finally:
+        os.close(fd)
+
+    if status:
+        # Let the local compiler report the error (or prove it was the worker's)
+        return local(argv, f"{host}:{port}", "fallback")
+    sys.stderr.write(stderr)
+    output: str = args[args.index("-o") + 1]
+    Path(output).write_bytes(obj)
+    record(f"{host}:{port}", "remote", time.time() - start, len(pre.stdout), len(obj))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
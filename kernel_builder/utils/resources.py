@@ -0,0 +1,318 @@
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Self
+
+from rich import print
+from rich.table import Table
+
+from kernel_builder.config.config import (
+    LTO_LINK_MEM,
+    MAKE_MEM_PER_JOB,
+    MEMORY_PRESSURE_HIGH,
+)
+from kernel_builder.utils.log import log
+from kernel_builder.utils.trace import tracer
+
+PAGE_SIZE: int = os.sysconf("SC_PAGE_SIZE")
+
+
+@dataclass(slots=True)
+class MemoryStatus:
+    available: int
+    total: int
+    # /proc/pressure/memory "some avg10", None without PSI
+    pressure: float | None
+
+
+def memory_status() -> MemoryStatus:
+    """
+    Available and total memory from /proc/meminfo, plus memory pressure.
+
+    :return: Current memory status.
+    """
+    info: dict[str, int] = {}
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                info[key] = int(value.split()[0]) * 1024
+    except OSError:
+        total: int = PAGE_SIZE * os.sysconf("SC_PHYS_PAGES")
+        info = {"MemTotal": total, "MemAvailable": total}
+
+    pressure: float | None = None
+    try:
+        with open("/proc/pressure/memory") as f:
+            some: str = f.readline()
+        pressure = float(some.split("avg10=", 1)[1].split()[0])
+    except (OSError, IndexError, ValueError):
+        pass
+    return MemoryStatus(info["MemAvailable"], info["MemTotal"], pressure)
+
+
+def job_budget(
+    lto: str, cpus: int | None = None, status: MemoryStatus | None = None
+) -> int:
+    """
+    Make jobs that fit in the available memory for an LTO mode.
+
+    :param lto: ``thin`` or ``full``.
+    :param cpus: Upper bound, defaults to the CPU count.
+    :param status: Memory status, read when omitted.
+    :return: Job count, at least 1.
+    """
+    status = status or memory_status()
+    cpus = cpus or os.cpu_count() or 1
+    if status.available < LTO_LINK_MEM[lto]:
+        log(
+            f"Only {status.available >> 20} MiB available, the {lto} LTO link may "
+            f"need {LTO_LINK_MEM[lto] >> 20} MiB",
+            "warning",
+        )
+    return max(1, min(cpus, status.available // MAKE_MEM_PER_JOB[lto]))
+
+
+def tree_rss(root: int) -> tuple[int, int]:
+    """
+    Resident memory of every descendant of a process.
+
+    :param root: PID whose descendants are measured.
+    :return: (total RSS, largest single RSS) in bytes.
+    """
+    children: dict[int, list[int]] = {}
+    rss: dict[int, int] = {}
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat", "rb") as f:
+                data: bytes = f.read()
+            # Fields after the command name, which may contain spaces
+            fields: list[bytes] = data[data.rindex(b")") + 2 :].split()
+            ppid, pages = int(fields[1]), int(fields[21])
+        except (OSError, ValueError, IndexError):
+            continue
+        pid: int = int(entry.name)
+        children.setdefault(ppid, []).append(pid)
+        rss[pid] = pages * PAGE_SIZE
+
+    total: int = 0
+    largest: int = 0
+    stack: list[int] = list(children.get(root, []))
+    while stack:
+        pid = stack.pop()
+        total += rss[pid]
+        largest = max(largest, rss[pid])
+        stack.extend(children.get(pid, []))
+    return total, largest
+
+
+class Jobserver:
+    """
+    A GNU make jobserver owned by the builder.
+
+    make is started without ``-j`` and with ``MAKEFLAGS`` pointing at this
+    pipe, so every make and sub-make draws job tokens from it. Withholding
+    tokens lowers the parallelism of the running build, handing them back
+    raises it again, up to the initial job count.
+    """
+
+    def __init__(self, jobs: int) -> None:
+        self.limit: int = max(1, jobs)
+        self.held: int = 0
+        self.read_fd, self.write_fd = os.pipe()
+        # sh does not mark pass_fds inheritable the way subprocess does
+        os.set_inheritable(self.read_fd, True)
+        os.set_inheritable(self.write_fd, True)
+        # A second, non-blocking open of the read end, so withholding a token
+        # never blocks and make's own descriptor stays blocking
+        self._reader: int = os.open(
+            f"/proc/self/fd/{self.read_fd}", os.O_RDONLY | os.O_NONBLOCK
+        )
+        # make always holds one implicit token
+        os.write(self.write_fd, b"+" * (self.limit - 1))
+
+    @property
+    def jobs(self) -> int:
+        return self.limit - self.held
+
+    @property
+    def fds(self) -> tuple[int, int]:
+        return self.read_fd, self.write_fd
+
+    @property
+    def makeflags(self) -> str:
+        return f"-j --jobserver-auth={self.read_fd},{self.write_fd}"
+
+    def shrink(self) -> bool:
+        """
+        Take one token away from make, once a job has returned it.
+
+        :return: True if a token was withheld.
+        """
+        if self.jobs <= 1:
+            return False
+        try:
+            if not os.read(self._reader, 1):
+                return False
+        except BlockingIOError:
+            return False
+        self.held += 1
+        return True
+
+    def grow(self) -> bool:
+        """
+        Hand one withheld token back to make.
+
+        :return: True if a token was returned.
+        """
+        if not self.held:
+            return False
+        os.write(self.write_fd, b"+")
+        self.held -= 1
+        return True
+
+    def close(self) -> None:
+        for fd in (self._reader, self.read_fd, self.write_fd):
+            os.close(fd)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+
+@dataclass(slots=True)
+class PhaseStats:
+    name: str
+    elapsed: float = 0.0
+    peak_rss: int = 0
+    largest_rss: int = 0
+    peak_pressure: float = 0.0
+    min_jobs: int = 0
+    max_jobs: int = 0
+
+
+class ResourceMonitor:
+    """
+    Sample memory while make runs, throttle it through a Jobserver and
+    record peak RSS per build phase.
+
+    Parallelism drops by one job per sample while memory pressure is above
+    MEMORY_PRESSURE_HIGH or less than one job's worth of memory is
+    available, and recovers by one job per sample once pressure is low and
+    there is room for two more jobs.
+    """
+
+    def __init__(
+        self,
+        jobserver: Jobserver | None,
+        *,
+        lto: str,
+        interval: float = 1.0,
+        pressure_high: float = MEMORY_PRESSURE_HIGH,
+    ) -> None:
+        self.jobserver: Jobserver | None = jobserver
+        self.per_job: int = MAKE_MEM_PER_JOB[lto]
+        self.interval: float = interval
+        self.pressure_high: float = pressure_high
+        self.phases: list[PhaseStats] = []
+        self._current: PhaseStats | None = None
+        self._stop: threading.Event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock: threading.Lock = threading.Lock()
+
+    def _adjust(self, status: MemoryStatus) -> None:
+        js: Jobserver | None = self.jobserver
+        if js is None:
+            return
+        pressure: float = status.pressure or 0.0
+        if pressure >= self.pressure_high or status.available < self.per_job:
+            if js.shrink():
+                log(
+                    f"Memory pressure {pressure:.1f}%, "
+                    f"{status.available >> 20} MiB available: make -j{js.jobs}",
+                    "warning",
+                )
+        elif pressure < self.pressure_high / 4 and status.available > 2 * self.per_job:
+            js.grow()
+
+    def sample(self) -> None:
+        status: MemoryStatus = memory_status()
+        total, largest = tree_rss(os.getpid())
+        self._adjust(status)
+        tracer.counter(
+            "memory (MiB)", available=status.available >> 20, build_rss=total >> 20
+        )
+        if self.jobserver is not None:
+            tracer.counter("make jobs", jobs=self.jobserver.jobs)
+        with self._lock:
+            phase: PhaseStats | None = self._current
+            if phase is None:
+                return
+            jobs: int = self.jobserver.jobs if self.jobserver else 0
+            phase.peak_rss = max(phase.peak_rss, total)
+            phase.largest_rss = max(phase.largest_rss, largest)
+            phase.peak_pressure = max(phase.peak_pressure, status.pressure or 0.0)
+            phase.min_jobs = min(phase.min_jobs, jobs) if phase.min_jobs else jobs
+            phase.max_jobs = max(phase.max_jobs, jobs)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[PhaseStats]:
+        stats: PhaseStats = PhaseStats(name)
+        start: float = time.monotonic()
+        with self._lock:
+            self.phases.append(stats)
+            self._current = stats
+        try:
+            yield stats
+        finally:
+            self.sample()
+            with self._lock:
+                stats.elapsed = time.monotonic() - start
+                self._current = None
+
+    def __enter__(self) -> Self:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="resources", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def report(self) -> None:
+        table: Table = Table(title="Build resources", title_justify="left")
+        table.add_column("Phase")
+        table.add_column("Time", justify="right")
+        table.add_column("Peak RSS", justify="right")
+        table.add_column("Largest process", justify="right")
+        table.add_column("Peak pressure", justify="right")
+        table.add_column("Jobs", justify="right")
+        for p in self.phases:
+            table.add_row(
+                p.name,
+                f"{p.elapsed:.0f}s",
+                f"{p.peak_rss >> 20} MiB",
+                f"{p.largest_rss >> 20} MiB",
+                f"{p.peak_pressure:.1f}%",
+                f"{p.min_jobs}-{p.max_jobs}"
+                if p.min_jobs != p.max_jobs
+                else str(p.max_jobs),
+            )
+        print(table)
+
+
+if __name__ == "__main__":
+    raise SystemExit("This file is meant to be imported, not executed.")
@@ -1,38 +1,192 @@
+import hashlib
+import json
+import os
 import re
+import signal
+import tempfile
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass, field
 from pathlib import Path
 from re import Pattern
-from shutil import rmtree
+from shutil import copyfile, rmtree
+from threading import Event, Lock
+from typing import Any, Final
 from urllib.parse import ParseResult, urlparse, urlunparse
 
 import requests
-from sh import git
+from requests.models import Response
+from rich import print
+from rich.filesize import decimal
+from rich.progress import (
+    BarColumn,
+    Progress,
+    SpinnerColumn,
+    TaskID,
+    TextColumn,
+    TimeElapsedColumn,
+)
+from rich.table import Table
+from sh import ErrorReturnCode, RunningCommand, SignalException, git, tar
 
-from kernel_builder.config.manifest import SOURCES
-from kernel_builder.utils.log import log
+from kernel_builder.config.config import FETCH_JOBS, GIT_MIRRORS
+from kernel_builder.config.manifest import SOURCES, Source
+from kernel_builder.constants import SOURCE_STATE, URL_CACHE
+from kernel_builder.utils.fs import FileSystem
+from kernel_builder.utils.lockfile import SourceLock
+from kernel_builder.utils.log import console, log
+from kernel_builder.utils.trace import span, traced
+
+# Lifetime of resolved URLs in URL_CACHE
+URL_CACHE_TTL: Final[int] = 7 * 24 * 60 * 60
+
+
+class CloneCancelled(Exception):
+    """Raised when a clone is aborted because another source failed."""
+
+
+class GitProgress:
+    """
+    Parse ``git clone --progress`` output into (phase, percent) updates.
+
+    git redraws its progress line with carriage returns, so output is buffered
+    and split on both ``\\r`` and ``\\n``. Lines that are not progress reports
+    are kept so they can be shown if the clone fails.
+    """
+
+    PROGRESS: Pattern[str] = re.compile(r"^(?:remote: )?([A-Za-z ]+):\s+(\d+)%")
+
+    def __init__(self, callback: Callable[[str, float], None]) -> None:
+        self.callback: Callable[[str, float], None] = callback
+        self.messages: list[str] = []
+        self._buffer: str = ""
+
+    def __call__(self, chunk: str | bytes) -> None:
+        if isinstance(chunk, bytes):
+            chunk = chunk.decode(errors="replace")
+        *lines, self._buffer = re.split(r"[\r\n]", self._buffer + chunk)
+        for line in lines:
+            self._feed(line)
+
+    def _feed(self, line: str) -> None:
+        match = self.PROGRESS.match(line)
+        if match:
+            self.callback(match.group(1).strip(), float(match.group(2)))
+        elif line.strip():
+            self.messages.append(line.strip())
+
+
+@dataclass(slots=True)
+class FetchStats:
+    transferred: int = 0
+    materialized: int = 0
+    elapsed: float = 0.0
+    commit: str = ""
 
 
 @dataclass(slots=True)
 class SourceManager:
-    sources: list[dict[str, str]] = field(default_factory=lambda: SOURCES.copy())
+    sources: list[Source] = field(default_factory=lambda: SOURCES.copy())
+    jobs: int = FETCH_JOBS
+    mirrors: Path | None = GIT_MIRRORS
+    state: Path | None = SOURCE_STATE
+    _running: dict[str, RunningCommand] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _cancelled: Event = field(default_factory=Event, init=False, repr=False)
+    _lock: Lock = field(default_factory=Lock, init=False, repr=False)
+
+    @staticmethod
+    def _simplify_known(url: str) -> str | None:
+        """
+        Simplify URLs of well-known forges by parsing alone.
+
+        :param url: Full git URL.
+        :return: Simplified link, or None if the host is not a known forge.
+        """
+        parsed: ParseResult = urlparse(url)
+        host: str = parsed.netloc.lower().removeprefix("www.")
+        parts: list[str] = [p for p in parsed.path.split("/") if p]
+
+        if host == "github.com" and len(parts) >= 2:
+            # github.com/<owner>/<repo>[/tree/<branch>/...]
+            parts = parts[:2]
+        elif host == "gitlab.com" and len(parts) >= 2:
+            # gitlab.com/<group>[/<subgroup>...]/<repo>[/-/tree/<branch>]
+            if "-" in parts:
+                parts = parts[: parts.index("-")]
+        elif host.endswith(".googlesource.com") and parts:
+            # <host>.googlesource.com/<path/to/project>[/+/refs/heads/<branch>]
+            if "+" in parts:
+                parts = parts[: parts.index("+")]
+        else:
+            return None
+
+        if not parts:
+            return None
+        parts[-1] = parts[-1].removesuffix(".git")
+        return f"{host}:{'/'.join(parts)}"
 
     @staticmethod
     def git_simplifier(url: str) -> str:
-        with requests.get(url, allow_redirects=True) as resp:
-            parsed: ParseResult = urlparse(resp.url)
-            cleaned: str = parsed.path.strip("/").removesuffix(".git")
-            return f"{parsed.netloc}:{cleaned}"
+        """
+        Convert a full git URL to a simplified link.
+
+        Known forges are handled without any request. Other hosts are resolved
+        with a HEAD request following redirects (a streamed GET if HEAD is
+        refused), and the result is cached on disk for URL_CACHE_TTL seconds.
+
+        :param url: Full git URL.
+        :return: Simplified link.
+        """
+        known: str | None = SourceManager._simplify_known(url)
+        if known:
+            return known
+
+        # Sources are simplified from several clone threads (and builds) at once
+        lock: Path = URL_CACHE.with_suffix(".lock")
+        with FileSystem.lock(lock, shared=True):
+            entry: dict[str, Any] | None = SourceManager._read_url_cache().get(url)
+        if entry and time.time() - entry["time"] < URL_CACHE_TTL:
+            return entry["simplified"]
+
+        resp: Response = requests.head(url, allow_redirects=True, timeout=10)
+        resp.close()
+        if resp.status_code in (403, 405):
+            # Some servers refuse HEAD: follow the redirects with a GET, body unread
+            resp = requests.get(url, allow_redirects=True, stream=True, timeout=10)
+            resp.close()
+        parsed: ParseResult = urlparse(resp.url)
+        cleaned: str = parsed.path.strip("/").removesuffix(".git")
+        simplified: str = f"{parsed.netloc}:{cleaned}"
+
+        with FileSystem.lock(lock):
+            cache: dict[str, dict[str, Any]] = SourceManager._read_url_cache()
+            cache[url] = {"simplified": simplified, "time": time.time()}
+            FileSystem.write_atomic(URL_CACHE, json.dumps(cache, indent=2))
+        return simplified
+
+    @staticmethod
+    def _read_url_cache() -> dict[str, dict[str, Any]]:
+        try:
+            return json.loads(URL_CACHE.read_text())
+        except (OSError, ValueError):
+            return {}
 
     @staticmethod
     def is_simplified(url: str) -> bool:
         valid_char: Pattern[str] = re.compile(r"^[A-Za-z0-9_.-]+$")
         try:
             host, rest = url.split(":", 1)
-            owner, repo = rest.split("/", 1)
         except ValueError:
             return False
 
-        for part in (host, owner, repo):
+        # <owner>/<repo>, or deeper for GitLab subgroups and Gerrit projects
+        parts: list[str] = rest.split("/")
+        if len(parts) < 2:
+            return False
+        for part in (host, *parts):
             if not part or not valid_char.fullmatch(part):
                 return False
 
@@ -40,7 +194,7 @@ class SourceManager:
 
     @staticmethod
     def restore_simplified(simplified: str) -> str:
-        if simplified.startswith(("http://", "https://")):
+        if "://" in simplified:
             url = simplified
         else:
             host, repo = simplified.split(":", 1)
@@ -61,42 +215,863 @@ class SourceManager:
             else:
                 path.unlink(missing_ok=True)
 
-    def clone_repo(
-        self, repo: dict[str, str], *, depth: int = 1, args: list[str] | None = None
+    @staticmethod
+    def resolve_ref(url: str, ref: str) -> str:
+        """
+        Resolve a branch or tag of a remote repository to a commit SHA.
+
+        :param url: Simplified or full git URL.
+        :param ref: Branch, tag or commit SHA.
+        :return: Full commit SHA.
+        """
+        if re.fullmatch(r"[0-9a-f]{40}", ref):
+            return ref
+        output: str = str(git("ls-remote", SourceManager.restore_simplified(url), ref))
+        refs: dict[str, str] = {}
+        for line in output.splitlines():
+            sha, _, name = line.partition("\t")
+            refs[name.strip()] = sha.strip()
+        for name in (f"refs/heads/{ref}", f"refs/tags/{ref}^{{}}", f"refs/tags/{ref}"):
+            if name in refs:
+                return refs[name]
+        raise ValueError(f"Ref {ref!r} not found in {url}")
+
+    def resolve_pins(self, lock: SourceLock | None = None) -> dict[str, str]:
+        """
+        Commit wanted for every source: the locked SHA when the lockfile has
+        one, otherwise the current tip of the branch. Only sources missing
+        from the lockfile are looked up with ``git ls-remote``.
+
+        :param lock: Optional lockfile contents.
+        :return: Mapping of SourceLock.key(url, branch) to commit SHA.
+        """
+        pins: dict[str, str] = {}
+        unpinned: dict[str, Source] = {}
+        for source in self.sources:
+            key: str = SourceLock.key(source["url"], source["branch"])
+            locked: str | None = (
+                lock.commit(source["url"], source["branch"]) if lock else None
+            )
+            if locked:
+                pins[key] = locked
+            else:
+                unpinned[key] = source
+        if not unpinned:
+            # The lockfile is authoritative: no remote is asked
+            return pins
+        if lock is not None:
+            log(
+                f"{', '.join(unpinned)} not in the lockfile, "
+                "using the current branch tip",
+                "warning",
+            )
+
+        def resolve(source: Source) -> str:
+            return self.resolve_ref(source["url"], source["branch"])
+
+        with ThreadPoolExecutor(max_workers=max(1, self.jobs)) as pool:
+            pins.update(zip(unpinned, pool.map(resolve, unpinned.values())))
+        return pins
+
+    def lock_sources(self, lock: SourceLock) -> None:
+        """
+        Pin every source to the current tip of its branch.
+
+        :param lock: Lock to add the pins to.
+        :return: None
+        """
+        for key, commit in self.resolve_pins().items():
+            url, _, ref = key.rpartition("@")
+            lock.pin(url, ref, commit)
+
+    def _read_state(self) -> dict[str, dict[str, str]]:
+        if self.state is None or not self.state.exists():
+            return {}
+        return json.loads(self.state.read_text())
+
+    def _update_state(
+        self, dest: str, record: dict[str, str] | None, *, nested: bool = True
     ) -> None:
         """
-        Clone a git repository.
+        Record (or forget, with None) what is materialized at ``dest``.
+        Forgetting a path also forgets every source checked out inside it,
+        unless ``nested`` is False.
+        """
+        if self.state is None:
+            return
+        key: Path = Path(dest).resolve()
+        with FileSystem.lock(self.state.with_suffix(".lock")):
+            state: dict[str, dict[str, str]] = self._read_state()
+            if record is None:
+                state = {
+                    path: entry
+                    for path, entry in state.items()
+                    if Path(path) != key
+                    and (not nested or key not in Path(path).parents)
+                }
+            else:
+                state[str(key)] = record
+            FileSystem.write_atomic(self.state, json.dumps(state, indent=2))
 
-        :param repo: Dictionary with keys 'url', 'branch', and 'to'.
-        :param depth: Depth of the clone, default is 1.
-        :param args: Additional arguments to pass to git clone.
+    @staticmethod
+    def _record(source: Source, commit: str) -> dict[str, str]:
+        profile: dict[str, Any] = {
+            k: source[k] for k in ("filter", "sparse", "files") if k in source
+        }
+        return {
+            "url": source["url"],
+            "branch": source["branch"],
+            "commit": commit,
+            "profile": json.dumps(profile, sort_keys=True),
+        }
+
+    def taint(self, path: Path) -> None:
+        """
+        Mark a checkout as modified (patched, built in) so the next sync
+        re-creates it instead of reusing it.
+
+        :param path: Checkout destination.
+        :return: None
+        """
+        self._forget(path)
+
+    def applied(self, path: Path) -> str | None:
+        """
+        Fingerprint of the pre-build steps applied to a checkout.
+
+        :param path: Checkout destination.
+        :return: Fingerprint recorded by mark_applied, or None.
+        """
+        return self._read_state().get(str(path.resolve()), {}).get("prebuild")
+
+    def mark_applied(self, path: Path, fingerprint: str) -> None:
+        """
+        Record the pre-build steps applied to a checkout. The record is
+        dropped whenever the checkout is re-created or updated.
+
+        :param path: Checkout destination.
+        :param fingerprint: Digest of the pre-build inputs.
+        :return: None
+        """
+        record: dict[str, str] | None = self._read_state().get(str(path.resolve()))
+        if record is not None:
+            self._update_state(str(path), {**record, "prebuild": fingerprint})
+
+    def _forget(self, dest: Path) -> None:
+        """
+        Forget a checkout and the sources nested in it, together with their
+        persistent indexes, so indexes of re-created or removed workspaces
+        do not pile up.
+        """
+        key: Path = dest.resolve()
+        for path in [key, *map(Path, self._read_state())]:
+            if path == key or key in path.parents:
+                index: Path | None = self._index_path(path)
+                if index is not None:
+                    index.unlink(missing_ok=True)
+        self._update_state(str(dest), None)
+
+    def _index_path(self, dest: Path) -> Path | None:
+        if self.state is None:
+            return None
+        key: str = hashlib.sha256(str(dest.resolve()).encode()).hexdigest()[:16]
+        return self.state.with_name("index") / key
+
+    def adopt(self, src: Path, dest: Path) -> None:
+        """
+        Register a copy of a checkout (and the sources nested in it) made at
+        ``dest``, so syncing ``dest`` reuses it instead of cloning again.
+
+        :param src: Recorded checkout that was copied.
+        :param dest: Location of the copy.
+        :return: None
+        """
+        src, dest = src.resolve(), dest.resolve()
+        state: dict[str, dict[str, str]] = self._read_state()
+        for path, record in state.items():
+            if Path(path) != src and src not in Path(path).parents:
+                continue
+            target: Path = dest / Path(path).relative_to(src)
+            checkout: dict[str, str] = {
+                k: v for k, v in record.items() if k != "prebuild"
+            }
+            self._update_state(str(target), checkout)
+
+            # Carry the index over so the copy can be updated in place too
+            index: Path | None = self._index_path(Path(path))
+            copy: Path | None = self._index_path(target)
+            if index is None or copy is None or not index.exists():
+                continue
+            copyfile(index, copy)
+            if self.mirrors is not None:
+                git(
+                    f"--git-dir={self.mirror_path(record['url'])}",
+                    f"--work-tree={target}",
+                    "update-index",
+                    "-q",
+                    "--refresh",
+                    _env={**os.environ, "GIT_INDEX_FILE": str(copy)},
+                    _ok_code=[0, 1],
+                )
+
+    def _updatable(self, source: Source) -> bool:
+        """
+        Whether a checkout can be updated in place: it was written from the
+        mirror with a persistent index and is still on disk.
+        """
+        if self.mirrors is None or self._pathspecs(source):
+            return False
+        dest: Path = Path(source["to"])
+        index: Path | None = self._index_path(dest)
+        return (
+            index is not None
+            and index.exists()
+            and dest.is_dir()
+            and str(dest.resolve()) in self._read_state()
+        )
+
+    def _clean(self, source: Source, mirror: Path, reporter: GitProgress) -> None:
+        """
+        Remove untracked files from an in-place checkout (left by pre-build
+        steps), keeping the Kbuild output and nested sources.
+        """
+        dest: Path = Path(source["to"]).resolve()
+        keep: list[str] = ["/out"] + [
+            f"/{Path(other['to']).resolve().relative_to(dest)}"
+            for other in self.sources
+            if dest in Path(other["to"]).resolve().parents
+        ]
+        self._git(
+            source["to"],
+            f"--git-dir={mirror}",
+            f"--work-tree={dest}",
+            "clean",
+            "-ffdq",
+            *(f"--exclude={path}" for path in keep),
+            reporter=reporter,
+            label=source["url"],
+            env={"GIT_INDEX_FILE": str(self._index_path(dest))},
+        )
+
+    def update_repo(
+        self,
+        repo: Source,
+        *,
+        depth: int = 1,
+        commit: str | None = None,
+        progress: Callable[[str, float], None] | None = None,
+    ) -> FetchStats:
+        """
+        Bring an existing checkout to a new commit in place.
+
+        Only files that differ from the index (changed upstream or modified
+        locally) are rewritten and untracked files are removed, so unchanged
+        sources keep their timestamps and Kbuild only rebuilds what changed.
+
+        :param repo: Source entry that satisfies _updatable.
+        :param depth: History depth kept in the mirror.
+        :param commit: Commit to check out instead of the branch tip.
+        :param progress: Optional callback receiving (phase, percent) updates.
+        :return: Bytes transferred and the checked out commit.
+        """
+        reporter: GitProgress = GitProgress(progress or (lambda phase, pct: None))
+        mirror: Path = self.mirror_path(repo["url"])
+        before: int = FileSystem.du(mirror)
+        self.update_mirror(repo, depth=depth, commit=commit, reporter=reporter)
+        head: str = self._checkout_from_mirror(repo, mirror, commit, reporter)
+        self._clean(repo, mirror, reporter)
+        self._strip_git_dotfiles(Path(repo["to"]))
+        return FetchStats(
+            transferred=max(FileSystem.du(mirror) - before, 0),
+            commit=head,
+        )
+
+    def restore(self, path: Path) -> None:
+        """
+        Return a checkout to its recorded commit, undoing local changes.
+
+        :param path: Checkout destination.
         :return: None
         """
-        git.clone(
+        source: Source = next(
+            s for s in self.sources if Path(s["to"]).resolve() == path.resolve()
+        )
+        state: dict[str, dict[str, str]] = self._read_state()
+        commit: str = state[str(path.resolve())]["commit"]
+        log(f"Restoring {source['to']} to {commit}")
+        if self._updatable(source):
+            self.update_repo(source, commit=commit)
+            self._update_state(source["to"], self._record(source, commit), nested=False)
+            return
+
+        # Re-create it (and the sources inside it) at the recorded commits
+        pins: dict[str, str] = {
+            SourceLock.key(s["url"], s["branch"]): record["commit"]
+            for s in self.sources
+            if (record := state.get(str(Path(s["to"]).resolve()))) is not None
+        }
+        self.taint(path)
+        self.clone_sources(pins)
+
+    def _git(
+        self,
+        key: str,
+        *args: str,
+        reporter: GitProgress,
+        label: str,
+        env: dict[str, str] | None = None,
+    ) -> None:
+        """
+        Run a git command in its own session so it can be cancelled as a group.
+
+        :param key: Identifier used to track the running process.
+        :param args: Arguments passed to git.
+        :param reporter: Progress parser receiving git's stderr.
+        :param label: Name used when logging git's error output.
+        :param env: Extra environment variables for git.
+        :return: None
+        """
+        if self._cancelled.is_set():
+            raise CloneCancelled(label)
+
+        proc: RunningCommand = git(
+            *args,
+            _err=reporter,
+            _err_bufsize=0,
+            _bg=True,
+            _bg_exc=False,
+            _new_session=True,
+            _env={**os.environ, **(env or {})},
+        )
+        with self._lock:
+            self._running[key] = proc
+
+        try:
+            proc.wait()
+        except SignalException:
+            raise CloneCancelled(label)
+        except Exception:
+            for message in reporter.messages[-5:]:
+                log(f"[{label}] {message}", "error")
+            raise
+        finally:
+            with self._lock:
+                self._running.pop(key, None)
+
+    def mirror_path(self, url: str) -> Path:
+        """
+        Location of the bare mirror for a source URL.
+
+        :param url: Simplified or full git URL.
+        :return: Path of the bare repository inside the mirror cache.
+        """
+        if self.mirrors is None:
+            raise RuntimeError("Git mirror cache is disabled")
+        parsed: ParseResult = urlparse(self.restore_simplified(url))
+        name: str = f"{parsed.netloc}/{parsed.path.strip('/').removesuffix('.git')}"
+        return self.mirrors / f"{re.sub(r'[^A-Za-z0-9._-]+', '_', name)}.git"
+
+    @staticmethod
+    def _pathspecs(repo: Source) -> list[str]:
+        """
+        Paths selected by a source's fetch profile, as git pathspecs.
+
+        :param repo: Source entry.
+        :return: Pathspecs, empty when the whole tree is wanted.
+        """
+        return [
+            *repo.get("sparse", []),
+            *(f":(glob){f}" for f in repo.get("files", [])),
+        ]
+
+    @staticmethod
+    def _sparse_patterns(repo: Source) -> list[str]:
+        """
+        Paths selected by a source's fetch profile, as non-cone sparse patterns.
+
+        :param repo: Source entry.
+        :return: Patterns, empty when the whole tree is wanted.
+        """
+        return [
+            *(f"/{d.strip('/')}/" for d in repo.get("sparse", [])),
+            *(f"/{f.lstrip('/')}" for f in repo.get("files", [])),
+        ]
+
+    @staticmethod
+    def _has_commit(git_dir: Path, commit: str) -> bool:
+        return (
+            git(
+                f"--git-dir={git_dir}",
+                "cat-file",
+                "-e",
+                f"{commit}^{{commit}}",
+                _ok_code=[0, 1, 128],
+                _return_cmd=True,
+            ).exit_code
+            == 0
+        )
+
+    @staticmethod
+    def _rev_parse(git_dir: Path, ref: str) -> str:
+        return str(
+            git(f"--git-dir={git_dir}", "rev-parse", f"{ref}^{{commit}}")
+        ).strip()
+
+    def update_mirror(
+        self,
+        repo: Source,
+        *,
+        depth: int = 1,
+        commit: str | None = None,
+        reporter: GitProgress | None = None,
+    ) -> Path:
+        """
+        Create or incrementally update the bare mirror of a source.
+
+        The branch is stored as ``refs/heads/<branch>`` in the mirror. Only
+        objects missing from the mirror are transferred on later runs. A
+        ``filter`` in the fetch profile makes the mirror a partial clone that
+        lazily fetches the blobs a checkout actually needs.
+
+        :param repo: Source entry.
+        :param depth: History depth kept in the mirror.
+        :param commit: Pinned commit. Nothing is fetched if the mirror has it.
+        :param reporter: Progress parser receiving git's stderr.
+        :return: Path to the bare mirror.
+        """
+        mirror: Path = self.mirror_path(repo["url"])
+        reporter = reporter or GitProgress(lambda phase, pct: None)
+        url: str = self.restore_simplified(repo["url"])
+
+        with FileSystem.lock(mirror.with_suffix(".lock")):
+            if not (mirror / "HEAD").exists():
+                git.init("-q", "--bare", str(mirror))
+                git("-C", str(mirror), "remote", "add", "origin", url)
+
+            if commit and self._has_commit(mirror, commit):
+                return mirror
+
+            filter_args: list[str] = []
+            if "filter" in repo:
+                for key, value in (
+                    ("remote.origin.promisor", "true"),
+                    ("remote.origin.partialclonefilter", repo["filter"]),
+                    ("extensions.partialClone", "origin"),
+                ):
+                    git("-C", str(mirror), "config", key, value)
+                filter_args = [f"--filter={repo['filter']}"]
+
+            self._git(
+                repo["to"],
+                "-C",
+                str(mirror),
+                "fetch",
+                "--progress",
+                "--no-tags",
+                "--depth",
+                str(depth),
+                *filter_args,
+                "origin",
+                f"+{repo['branch']}:refs/heads/{repo['branch']}",
+                reporter=reporter,
+                label=repo["url"],
+            )
+
+            # The branch moved past the pin: fetch the pinned commit itself
+            if commit and not self._has_commit(mirror, commit):
+                self._git(
+                    repo["to"],
+                    "-C",
+                    str(mirror),
+                    "fetch",
+                    "--progress",
+                    "--no-tags",
+                    "--depth",
+                    str(depth),
+                    *filter_args,
+                    "origin",
+                    commit,
+                    reporter=reporter,
+                    label=repo["url"],
+                )
+        return mirror
+
+    def _checkout_from_mirror(
+        self,
+        repo: Source,
+        mirror: Path,
+        commit: str | None,
+        reporter: GitProgress,
+    ) -> str:
+        pathspecs: list[str] = self._pathspecs(repo)
+        ref: str = commit or f"refs/heads/{repo['branch']}"
+        dest: Path = Path(repo["to"])
+        dest.mkdir(parents=True, exist_ok=True)
+
+        if not pathspecs:
+            # Populate the work tree straight from the mirror's object store.
+            # `clone --shared` would be simpler, but git ignores it for shallow
+            # repositories and copies the packs. The index is kept next to the
+            # source state so a later sync can update the tree in place, only
+            # rewriting files that differ.
+            index: Path | None = self._index_path(dest)
+            with (
+                FileSystem.lock(mirror.with_suffix(".lock"), shared=True),
+                tempfile.TemporaryDirectory() as tmp,
+            ):
+                if index is not None:
+                    index.parent.mkdir(parents=True, exist_ok=True)
+                self._git(
+                    repo["to"],
+                    f"--git-dir={mirror}",
+                    f"--work-tree={dest}",
+                    "read-tree",
+                    "--reset",
+                    "-u",
+                    ref,
+                    reporter=reporter,
+                    label=repo["url"],
+                    env={"GIT_INDEX_FILE": str(index or Path(tmp) / "index")},
+                )
+                return self._rev_parse(mirror, ref)
+
+        # Export only the selected paths. In a partial mirror this lazily
+        # fetches just the blobs being written, so it takes the write lock.
+        if self._cancelled.is_set():
+            raise CloneCancelled(repo["url"])
+        with FileSystem.lock(mirror.with_suffix(".lock")):
+            tar(
+                "-x",
+                "-C",
+                str(dest),
+                _in=git(
+                    f"--git-dir={mirror}",
+                    "archive",
+                    "--format=tar",
+                    ref,
+                    "--",
+                    *pathspecs,
+                    _piped=True,
+                ),
+            )
+            return self._rev_parse(mirror, ref)
+
+    def _clone_direct(
+        self,
+        repo: Source,
+        depth: int,
+        commit: str | None,
+        reporter: GitProgress,
+        args: list[str],
+    ) -> str:
+        patterns: list[str] = self._sparse_patterns(repo)
+        git_dir: Path = Path(repo["to"]) / ".git"
+        self._git(
+            repo["to"],
+            "clone",
+            "--progress",
             "--depth",
             str(depth),
             "--single-branch",
             "--no-tags",
             "-b",
             repo["branch"],
-            *(args or []),
+            *([f"--filter={repo['filter']}"] if "filter" in repo else []),
+            *(["--no-checkout"] if patterns or commit else []),
+            *args,
             self.restore_simplified(repo["url"]),
             repo["to"],
+            reporter=reporter,
+            label=repo["url"],
         )
+        if patterns:
+            git("-C", repo["to"], "sparse-checkout", "set", "--no-cone", *patterns)
+        if commit and not self._has_commit(git_dir, commit):
+            self._git(
+                repo["to"],
+                "-C",
+                repo["to"],
+                "fetch",
+                "--progress",
+                "--no-tags",
+                "--depth",
+                str(depth),
+                "origin",
+                commit,
+                reporter=reporter,
+                label=repo["url"],
+            )
+        if patterns or commit:
+            self._git(
+                repo["to"],
+                "-C",
+                repo["to"],
+                "checkout",
+                "--progress",
+                *(["--detach", commit] if commit else [repo["branch"]]),
+                reporter=reporter,
+                label=repo["url"],
+            )
+        return self._rev_parse(git_dir, "HEAD")
+
+    def clone_repo(
+        self,
+        repo: Source,
+        *,
+        depth: int = 1,
+        commit: str | None = None,
+        args: list[str] | None = None,
+        progress: Callable[[str, float], None] | None = None,
+    ) -> FetchStats:
+        """
+        Clone a git repository.
+
+        With the mirror cache enabled the mirror is updated first and the work
+        tree is written straight from it, so no objects are copied.
+        The source's fetch profile (filter, sparse, files) limits what is
+        downloaded and written.
+
+        :param repo: Source entry with keys 'url', 'branch', 'to' and an
+            optional fetch profile.
+        :param depth: Depth of the clone, default is 1.
+        :param commit: Commit to check out instead of the branch tip.
+        :param args: Additional arguments to pass to git clone (direct clones).
+        :param progress: Optional callback receiving (phase, percent) updates.
+        :return: Bytes transferred and materialized, and the checked out commit.
+        """
+        reporter: GitProgress = GitProgress(progress or (lambda phase, pct: None))
+        dest: Path = Path(repo["to"])
+
+        if self.mirrors is not None:
+            mirror: Path = self.mirror_path(repo["url"])
+            before: int = FileSystem.du(mirror)
+            self.update_mirror(repo, depth=depth, commit=commit, reporter=reporter)
+            head: str = self._checkout_from_mirror(repo, mirror, commit, reporter)
+            transferred: int = FileSystem.du(mirror) - before
+        else:
+            head = self._clone_direct(repo, depth, commit, reporter, args or [])
+            transferred = FileSystem.du(dest / ".git")
+
         # Strip git dotfiles
-        self._strip_git_dotfiles(Path(repo["to"]))
+        self._strip_git_dotfiles(dest)
+
+        return FetchStats(
+            transferred=max(transferred, 0),
+            materialized=FileSystem.du(dest),
+            commit=head,
+        )
 
-    def clone_sources(self) -> None:
+    def _cancel(self) -> None:
         """
-        Clone all sources in SOURCES.
+        Stop every running clone and prevent new ones from starting.
+        """
+        self._cancelled.set()
+        with self._lock:
+            running: list[RunningCommand] = list(self._running.values())
+        for proc in running:
+            try:
+                proc.process.signal_group(signal.SIGTERM)
+            except ProcessLookupError:
+                pass
 
-        :return: None
+    @staticmethod
+    def _waits_on(source: Source, others: list[Source]) -> bool:
         """
+        A source nested inside another source's checkout has to wait for the
+        parent clone, since git refuses to clone into a non-empty directory.
+        """
+        dest: Path = Path(source["to"]).resolve()
+        return any(
+            Path(other["to"]).resolve() in dest.parents
+            for other in others
+            if other is not source
+        )
+
+    def _report(self, stats: dict[str, FetchStats], reused: set[str]) -> None:
+        table: Table = Table(title="Source fetch", title_justify="left")
+        table.add_column("Source")
+        table.add_column("Branch")
+        table.add_column("Time", justify="right")
+        table.add_column("Transferred", justify="right")
+        table.add_column("Materialized", justify="right")
         for source in self.sources:
-            log(
-                f"Cloning {source['url']} into {source['to']} on branch {source['branch']}"
+            entry: FetchStats | None = stats.get(source["to"])
+            if entry is None:
+                status: str = "reused" if source["to"] in reused else "-"
+                table.add_row(source["url"], source["branch"], status, "-", "-")
+                continue
+            table.add_row(
+                source["url"],
+                source["branch"],
+                f"{entry.elapsed:.1f}s",
+                decimal(entry.transferred),
+                decimal(entry.materialized),
             )
-            self.clone_repo(source)
+        print(table)
+
+    def _reusable(self, pins: dict[str, str], in_place: bool = False) -> set[str]:
+        """
+        Destinations whose recorded checkout already matches its pin. A source
+        nested in a checkout that has to be re-created is never reusable.
+        """
+        state: dict[str, dict[str, str]] = self._read_state()
+        reused: set[str] = set()
+        for source in sorted(
+            self.sources, key=lambda s: len(Path(s["to"]).resolve().parts)
+        ):
+            dest: Path = Path(source["to"]).resolve()
+            parents_ok: bool = all(
+                other["to"] in reused or (in_place and self._updatable(other))
+                for other in self.sources
+                if Path(other["to"]).resolve() in dest.parents
+            )
+            commit: str | None = pins.get(
+                SourceLock.key(source["url"], source["branch"])
+            )
+            if (
+                parents_ok
+                and commit
+                and dest.is_dir()
+                and self._same_checkout(state.get(str(dest)), source, commit)
+            ):
+                reused.add(source["to"])
+        return reused
+
+    def _same_checkout(
+        self, record: dict[str, str] | None, source: Source, commit: str
+    ) -> bool:
+        if record is None:
+            return False
+        checkout: dict[str, str] = {k: v for k, v in record.items() if k != "prebuild"}
+        return checkout == self._record(source, commit)
+
+    @traced("clone sources")
+    def clone_sources(
+        self, pins: dict[str, str] | None = None, *, in_place: bool = False
+    ) -> None:
+        """
+        Clone all sources in SOURCES concurrently.
+
+        Up to ``jobs`` clones run at once. Sources checked out inside another
+        source are started once their parent is done. If one clone fails the
+        others are terminated and the first error is re-raised.
+
+        With ``pins`` every source is checked out at its pinned commit, and a
+        source whose recorded checkout already matches the pin is left as is.
+        The destinations of the others are reset before cloning.
+
+        With ``in_place`` a stale checkout that was written from the mirror is
+        updated in place instead of being reset (see update_repo).
+
+        :param pins: Optional mapping of SourceLock.key(url, branch) to commit.
+        :param in_place: Update existing checkouts instead of re-creating them.
+        :return: None
+        """
+        self._cancelled.clear()
+        reused: set[str] = self._reusable(pins, in_place) if pins is not None else set()
+        for source in self.sources:
+            if source["to"] in reused:
+                log(f"Reusing {source['url']} in {source['to']}, commit unchanged")
+        pending: list[Source] = [s for s in self.sources if s["to"] not in reused]
+        active: dict[Future[FetchStats], Source] = {}
+        stats: dict[str, FetchStats] = {}
+        error: Exception | None = None
+
+        with (
+            Progress(
+                SpinnerColumn(),
+                TextColumn("{task.description}"),
+                BarColumn(),
+                TextColumn("{task.percentage:>3.0f}%"),
+                TimeElapsedColumn(),
+                console=console,
+                transient=True,
+            ) as bar,
+            ThreadPoolExecutor(
+                max_workers=max(1, self.jobs), thread_name_prefix="clone"
+            ) as pool,
+        ):
+            tasks: dict[str, TaskID] = {
+                source["to"]: bar.add_task(source["url"], total=100, start=False)
+                for source in self.sources
+            }
+
+            def fetch(source: Source) -> FetchStats:
+                task: TaskID = tasks[source["to"]]
+
+                def update(phase: str, percent: float) -> None:
+                    bar.update(
+                        task,
+                        completed=percent,
+                        description=f"{source['url']} [dim]{phase}[/dim]",
+                    )
+
+                bar.start_task(task)
+                log(
+                    f"Cloning {source['url']} into {source['to']} on branch {source['branch']}"
+                )
+                start: float = time.monotonic()
+                commit: str | None = None
+                result: FetchStats
+                if pins is not None:
+                    commit = pins.get(SourceLock.key(source["url"], source["branch"]))
+                with span(f"fetch {source['to']}", "git", url=source["url"]) as s:
+                    if in_place and self._updatable(source):
+                        # Nested checkouts survive an in-place update
+                        self._update_state(source["to"], None, nested=False)
+                        result = self.update_repo(
+                            source, commit=commit, progress=update
+                        )
+                    else:
+                        if pins is not None:
+                            self._forget(Path(source["to"]))
+                            FileSystem.reset_path(Path(source["to"]))
+                        result = self.clone_repo(source, commit=commit, progress=update)
+                    s.args["commit"] = result.commit
+                if pins is not None and result.commit:
+                    self._update_state(
+                        source["to"], self._record(source, result.commit)
+                    )
+                result.elapsed = time.monotonic() - start
+                bar.update(task, completed=100, description=source["url"])
+                return result
+
+            while (pending or active) and error is None:
+                blockers: list[Source] = pending + list(active.values())
+                for source in [s for s in pending if not self._waits_on(s, blockers)]:
+                    pending.remove(source)
+                    active[pool.submit(fetch, source)] = source
+
+                done, _ = wait(active, return_when=FIRST_COMPLETED)
+                for future in done:
+                    source = active.pop(future)
+                    try:
+                        stats[source["to"]] = future.result()
+                    except (
+                        CloneCancelled,
+                        ErrorReturnCode,
+                        OSError,
+                        ValueError,
+                        RuntimeError,
+                        requests.RequestException,
+                    ) as e:
+                        if error is None:
+                            log(f"Fetching {source['url']} failed: {e!r}", "error")
+                            error = e
+                            self._cancel()
+                    except BaseException:
+                        # Not a fetch failure: stop the other clones and re-raise
+                        self._cancel()
+                        raise
+
+            # Let terminated clones unwind before leaving the pool
+            wait(active)
+
+        if error is not None:
+            log(f"Source fetch aborted: {error!r}", "error")
+            raise error
+
+        self._report(stats, reused)
 
 
 if __name__ == "__main__":
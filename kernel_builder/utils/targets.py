@@ -0,0 +1,126 @@
+import re
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Final
+
+from kernel_builder.config.config import IMAGE_COMP, KERNEL_NAME
+
+# Output artifacts a build can produce, and what each one is
+ARTIFACTS: Final[dict[str, str]] = {
+    "anykernel3": "Flashable AnyKernel3 zip",
+    "boot": "Signed boot.img",
+    "modules": "Stripped GKI modules (modules_install) as a tarball",
+    "vmlinux": "Unstripped vmlinux with debug info",
+}
+
+# File each artifact is written to in the output directory before it is
+# renamed for release (see artifact_name)
+ARTIFACT_FILES: Final[dict[str, str]] = {
+    "anykernel3": "AnyKernel3.zip",
+    "boot": "boot.img",
+    "modules": "modules.tar.gz",
+    "vmlinux": "vmlinux",
+}
+
+# Kbuild targets each artifact needs, "{image}" being the (compressed) image
+_TARGETS: Final[dict[str, tuple[str, ...]]] = {
+    "anykernel3": ("{image}",),
+    "boot": ("{image}",),
+    "modules": ("modules",),
+    "vmlinux": ("vmlinux",),
+}
+
+# Targets another target already builds as a prerequisite
+_BUILT_BY: Final[dict[str, frozenset[str]]] = {
+    "Image": frozenset({"vmlinux"}),
+    "Image.gz": frozenset({"Image", "vmlinux"}),
+    "Image.lz4": frozenset({"Image", "vmlinux"}),
+}
+
+
+def artifact_name(artifact: str, version: str, suffix: str) -> str:
+    """
+    Release file name of an artifact, e.g. ``ESK-5.10.236-KSUN-SUSFS-boot.img``.
+
+    :param artifact: Name from ARTIFACTS.
+    :param version: Kernel version (VERSION.PATCHLEVEL.SUBLEVEL).
+    :param suffix: Variant suffix, with its leading dash.
+    :return: File name.
+    """
+    return f"{KERNEL_NAME}-{version}{suffix}-{ARTIFACT_FILES[artifact]}"
+
+
+def is_artifact(filename: str, suffix: str) -> bool:
+    """
+    Whether a file name is exactly what artifact_name gives for a variant,
+    for any kernel version.
+    """
+    files: str = "|".join(map(re.escape, ARTIFACT_FILES.values()))
+    return (
+        re.fullmatch(
+            rf"{re.escape(KERNEL_NAME)}-\d+\.\d+\.\d+{re.escape(suffix)}-(?:{files})",
+            filename,
+        )
+        is not None
+    )
+
+
+def image_target(image_comp: str = IMAGE_COMP) -> str:
+    return "Image" if image_comp == "raw" else f"Image.{image_comp}"
+
+
+@dataclass(frozen=True, slots=True)
+class TargetPlan:
+    artifacts: tuple[str, ...]
+    # Kbuild targets for the build's make run, in the order they are passed
+    targets: tuple[str, ...]
+    image: str
+
+    def wants(self, artifact: str) -> bool:
+        return artifact in self.artifacts
+
+    @property
+    def builds_image(self) -> bool:
+        return self.image in self.targets
+
+
+def plan(artifacts: Iterable[str], image_comp: str = IMAGE_COMP) -> TargetPlan:
+    """
+    Map the requested artifacts to the fewest Kbuild targets that produce
+    them. Nothing else is built: the flashables need the image only, so
+    modules are compiled only when the modules tarball is requested.
+
+    :param artifacts: Names from ARTIFACTS, in any order.
+    :param image_comp: Image compression ("raw", "gz", "lz4").
+    :return: The plan.
+    :raises ValueError: For an unknown artifact or an empty request.
+    """
+    requested: list[str] = []
+    for name in artifacts:
+        name = name.lower()
+        if name not in ARTIFACTS:
+            raise ValueError(
+                f"Unknown artifact {name!r} (choose from {', '.join(ARTIFACTS)})"
+            )
+        if name not in requested:
+            requested.append(name)
+    if not requested:
+        raise ValueError("No artifact requested")
+
+    image: str = image_target(image_comp)
+    targets: list[str] = []
+    for name in requested:
+        for target in _TARGETS[name]:
+            target = target.format(image=image)
+            if target not in targets:
+                targets.append(target)
+    covered: set[str] = set().union(*(_BUILT_BY.get(t, ()) for t in targets))
+    # The image first, so the flashables are ready before anything else
+    ordered: list[str] = sorted(
+        (t for t in targets if t not in covered), key=lambda t: t != image
+    )
+    return TargetPlan(tuple(requested), tuple(ordered), image)
+
+
+if __name__ == "__main__":
+    raise SystemExit("This file is meant to be imported, not executed.")
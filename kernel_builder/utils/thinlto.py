@@ -0,0 +1,239 @@
+import json
+import os
+import re
+import shutil
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from rich import print
+from rich.filesize import decimal
+from rich.table import Table
+
+from kernel_builder.config.config import (
+    LTO,
+    THINLTO_CACHE,
+    THINLTO_CACHE_MAX_AGE,
+    THINLTO_CACHE_MAX_SIZE,
+)
+from kernel_builder.utils.clang import clang_hash
+from kernel_builder.utils.fs import FileSystem
+from kernel_builder.utils.log import log
+
+# Directory Kbuild passes to ld.lld as --thinlto-cache-dir, relative to out/
+KBUILD_CACHE_DIR: str = ".thinlto-cache"
+
+# Name prefix of the backend objects LLVM keeps in a cache directory
+ENTRY_PREFIX: str = "llvmcache-"
+
+
+def _last_used(st: os.stat_result) -> float:
+    return max(st.st_atime, st.st_mtime)
+
+
+@dataclass(slots=True)
+class ThinLtoReport:
+    namespace: str
+    hits: int
+    misses: int
+    hit_rate: float
+    size: int
+    files: int
+    pruned: int = 0
+
+    def table(self) -> Table:
+        table: Table = Table(
+            title="ThinLTO cache", title_justify="left", show_header=False
+        )
+        table.add_row("Namespace", self.namespace)
+        table.add_row("Hits / misses", f"{self.hits} / {self.misses}")
+        table.add_row("Hit rate", f"{self.hit_rate:.1%}")
+        table.add_row("Cache size", f"{decimal(self.size)} in {self.files} files")
+        table.add_row("Pruned", f"{self.pruned} files")
+        return table
+
+
+class ThinLtoCache:
+    """
+    A ThinLTO backend cache that outlives out/.
+
+    Kbuild links with ``--thinlto-cache-dir=.thinlto-cache`` under
+    CONFIG_LTO_CLANG_THIN, but that directory lives in out/ and is lost
+    with every fresh tree. It is replaced by a link to a namespace below
+    THINLTO_CACHE named after the clang hash, like Ccache does, so fresh,
+    incremental and matrix builds share backend objects of unchanged code.
+
+    An entry's last use is the later of its access and modification time.
+    ``prepare`` sets both to that value, so the next read updates the
+    access time even on relatime mounts; entries read since then are hits
+    and new entries are misses. On noatime mounts no hit is seen.
+    """
+
+    def __init__(
+        self,
+        out_dir: Path,
+        root: Path | None = THINLTO_CACHE,
+        max_size: int = THINLTO_CACHE_MAX_SIZE,
+        max_age: int = THINLTO_CACHE_MAX_AGE,
+    ) -> None:
+        self.out_dir: Path = out_dir
+        self.root: Path | None = root
+        self.max_size: int = max_size
+        self.max_age: int = max_age
+        self.dir: Path | None = None
+        # Entry name -> last use, as of prepare
+        self._before: dict[str, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.root is not None and LTO == "thin"
+
+    @staticmethod
+    def supported(tree: Path) -> bool:
+        """
+        Whether the kernel's Makefile hands lld a ThinLTO cache directory.
+        """
+        try:
+            makefile: str = (tree / "Makefile").read_text(errors="replace")
+        except OSError:
+            return False
+        # $(extmod-prefix) or $(extmod_prefix), depending on the kernel version
+        return (
+            re.search(r"--thinlto-cache-dir=\S*\.thinlto-cache", makefile) is not None
+        )
+
+    def _entries(self) -> list[os.DirEntry[str]]:
+        assert self.dir is not None
+        with os.scandir(self.dir) as it:
+            return [
+                e
+                for e in it
+                if e.name.startswith(ENTRY_PREFIX) and e.is_file(follow_symlinks=False)
+            ]
+
+    def _link(self) -> None:
+        assert self.dir is not None
+        link: Path = self.out_dir / KBUILD_CACHE_DIR
+        if link.is_symlink():
+            if link.resolve() == self.dir.resolve():
+                return
+            link.unlink()
+        elif link.is_dir():
+            # A cache Kbuild filled before: keep its entries
+            for entry in link.iterdir():
+                if not (self.dir / entry.name).exists():
+                    shutil.move(entry, self.dir / entry.name)
+            shutil.rmtree(link)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        link.symlink_to(self.dir, target_is_directory=True)
+
+    def prepare(self, tree: Path, binary: Path | None = None) -> None:
+        """
+        Link out/.thinlto-cache to the namespace of the current clang and
+        remember its entries for the report.
+
+        :param tree: Kernel source tree (its Makefile must use the cache).
+        :param binary: clang binary, the linked toolchain's by default.
+        :return: None
+        """
+        if not self.enabled or self.root is None:
+            return
+        if not self.supported(tree):
+            log(
+                "Kernel Makefile sets no --thinlto-cache-dir, "
+                "ThinLTO backends are not cached",
+                "warning",
+            )
+            return
+        self.dir = self.root / clang_hash(binary)[:16]
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._link()
+        log(f"Using ThinLTO cache {self.dir}")
+        self._before = {}
+        for entry in self._entries():
+            used: float = _last_used(entry.stat(follow_symlinks=False))
+            os.utime(entry.path, (used, used))
+            self._before[entry.name] = used
+
+    def report(self, dest: Path | None = None) -> ThinLtoReport | None:
+        """
+        Count reused (hit) and new (miss) entries since ``prepare``, prune
+        the cache, print the result and write it to ``dest`` as JSON.
+
+        :param dest: Report file, e.g. next to the artifacts.
+        :return: The report, or None when the cache is not in use.
+        """
+        if self.dir is None:
+            return None
+        hits: int = 0
+        misses: int = 0
+        for entry in self._entries():
+            used: float | None = self._before.get(entry.name)
+            if used is None:
+                misses += 1
+            elif entry.stat(follow_symlinks=False).st_atime > used:
+                hits += 1
+        pruned: int = self.prune()
+        entries: list[os.DirEntry[str]] = self._entries()
+        result: ThinLtoReport = ThinLtoReport(
+            namespace=self.dir.name,
+            hits=hits,
+            misses=misses,
+            hit_rate=hits / (hits + misses) if hits + misses else 0.0,
+            size=sum(e.stat(follow_symlinks=False).st_size for e in entries),
+            files=len(entries),
+            pruned=pruned,
+        )
+        print(result.table())
+        if dest is not None:
+            FileSystem.write_atomic(dest, json.dumps(asdict(result), indent=2))
+        return result
+
+    def prune(self, now: float | None = None) -> int:
+        """
+        Drop entries unused for ``max_age`` seconds, then the least recently
+        used ones until the namespace fits in ``max_size``. Namespaces of
+        other toolchains go once none of their entries is younger than
+        ``max_age``.
+
+        :param now: Reference time, the current time by default.
+        :return: Number of entries removed from the current namespace.
+        """
+        if self.dir is None or self.root is None:
+            return 0
+        now = now or time.time()
+        entries: list[tuple[float, int, Path]] = []
+        removed: int = 0
+        for entry in self._entries():
+            st: os.stat_result = entry.stat(follow_symlinks=False)
+            if now - _last_used(st) > self.max_age:
+                Path(entry.path).unlink(missing_ok=True)
+                removed += 1
+            else:
+                entries.append((_last_used(st), st.st_size, Path(entry.path)))
+
+        size: int = sum(e[1] for e in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            size -= entry_size
+            removed += 1
+
+        for namespace in self.root.iterdir():
+            if namespace == self.dir or not namespace.is_dir():
+                continue
+            ages: list[float] = [
+                now - _last_used(p.stat()) for p in namespace.iterdir() if p.is_file()
+            ]
+            if min(ages, default=self.max_age + 1) > self.max_age:
+                log(f"Removing unused ThinLTO cache {namespace}")
+                shutil.rmtree(namespace, ignore_errors=True)
+
+        if removed:
+            log(f"Pruned {removed} ThinLTO cache entries")
+        return removed
+
+
+if __name__ == "__main__":
+    raise SystemExit("This file is meant to be imported, not executed.")
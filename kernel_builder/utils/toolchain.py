@@ -0,0 +1,328 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import AbstractContextManager, ExitStack
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Self
+
+import requests
+from requests.models import Response
+
+from kernel_builder.config.config import CLANG_STREAM
+from kernel_builder.constants import TOOLCHAIN_STORE
+from kernel_builder.utils.command import aria2c
+from kernel_builder.utils.download import stream_extract
+from kernel_builder.utils.extract import ParallelExtractor
+from kernel_builder.utils.fs import FileSystem
+from kernel_builder.utils.log import log
+from kernel_builder.utils.trace import traced
+
+
+@dataclass(slots=True)
+class ToolchainEntry:
+    key: str
+    url: str
+    etag: str
+    sha256: str
+    size: int
+    files: int
+    manifest: str
+    created: float
+    last_used: float
+
+
+class ToolchainStore:
+    """
+    Extracted toolchains keyed by the archive URL plus its ETag.
+
+    Layout::
+
+        <root>/<key>/tree        extracted archive
+        <root>/<key>/entry.json  metadata, written last (marks the entry complete)
+        <root>/<key>.lock        flock() guarding install, use and prune
+
+    Installs hold the exclusive lock. ``get`` returns with a shared lock
+    held until ``release`` (or process exit), so an entry in use by any
+    build is skipped by ``prune`` instead of removed under its compiles.
+    Lock files are never deleted: a process blocked on an unlinked one
+    would hold a lock nobody else sees.
+    """
+
+    def __init__(
+        self, root: Path = TOOLCHAIN_STORE, *, stream: bool = CLANG_STREAM
+    ) -> None:
+        self.root: Path = root
+        self.stream: bool = stream
+        # Shared locks on the entries this store handed out
+        self._leases: dict[str, ExitStack] = {}
+
+    @staticmethod
+    def _key(url: str, etag: str) -> str:
+        return hashlib.sha256(f"{url}\n{etag}".encode()).hexdigest()[:16]
+
+    @staticmethod
+    def _manifest(tree: Path) -> tuple[str, int, int]:
+        """
+        Digest of every (path, size) pair in a tree.
+
+        :param tree: Extracted toolchain directory.
+        :return: (digest, number of files, total size)
+        """
+        digest = hashlib.sha256()
+        files: int = 0
+        size: int = 0
+        for root, dirs, names in os.walk(tree):
+            dirs.sort()
+            for name in sorted(names):
+                path: str = os.path.join(root, name)
+                st: os.stat_result = os.lstat(path)
+                digest.update(f"{os.path.relpath(path, tree)}\0{st.st_size}\n".encode())
+                files += 1
+                size += st.st_size
+        return digest.hexdigest(), files, size
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.root / key
+
+    def _lock(
+        self, key: str, *, shared: bool = False, blocking: bool = True
+    ) -> AbstractContextManager[None]:
+        return FileSystem.lock(
+            self.root / f"{key}.lock", shared=shared, blocking=blocking
+        )
+
+    def _read(self, key: str) -> ToolchainEntry | None:
+        meta: Path = self._entry_dir(key) / "entry.json"
+        if not meta.exists():
+            return None
+        return ToolchainEntry(**json.loads(meta.read_text()))
+
+    def _write(self, entry: ToolchainEntry) -> None:
+        FileSystem.write_atomic(
+            self._entry_dir(entry.key) / "entry.json",
+            json.dumps(asdict(entry), indent=2),
+        )
+
+    def identity(self, url: str) -> str:
+        """
+        ETag of the archive (Last-Modified and size when there is none).
+
+        :param url: Archive URL.
+        :return: Identity string used in the store key.
+        """
+        resp: Response = requests.head(url, allow_redirects=True, timeout=30)
+        resp.raise_for_status()
+        resp.close()
+        etag: str | None = resp.headers.get("ETag")
+        if etag:
+            return etag.strip('"')
+        return f"{resp.headers.get('Last-Modified', '')}:{resp.headers.get('Content-Length', '')}"
+
+    def entries(self) -> list[ToolchainEntry]:
+        if not self.root.exists():
+            return []
+        found: list[ToolchainEntry | None] = [
+            self._read(path.name) for path in self.root.iterdir() if path.is_dir()
+        ]
+        return sorted(
+            (e for e in found if e is not None),
+            key=lambda e: e.last_used,
+            reverse=True,
+        )
+
+    def verify(self, entry: ToolchainEntry) -> bool:
+        """
+        Check that an entry's tree still matches its recorded manifest.
+
+        :param entry: Store entry.
+        :return: True if intact.
+        """
+        tree: Path = self._entry_dir(entry.key) / "tree"
+        if not tree.is_dir():
+            return False
+        digest, files, size = self._manifest(tree)
+        return (digest, files, size) == (entry.manifest, entry.files, entry.size)
+
+    @traced("download clang")
+    def _download(self, url: str, archive: Path) -> str:
+        """
+        Download an archive to disk with aria2c.
+
+        :return: sha256 of the archive.
+        """
+        aria2c("-d", str(archive.parent), "-o", archive.name, url)
+        digest = hashlib.sha256()
+        with archive.open("rb") as f:
+            while chunk := f.read(1 << 20):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _install(self, url: str, etag: str, key: str) -> ToolchainEntry:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.root, prefix=f".{key}-") as tmp:
+            staging: Path = Path(tmp)
+            archive: Path = staging / "tarball"
+            tree: Path = staging / "tree"
+
+            sha256: str
+            if self.stream:
+                log(f"Streaming toolchain {url} into store entry {key}")
+                sha256 = stream_extract(url, tree)
+            else:
+                log(f"Downloading toolchain {url}")
+                sha256 = self._download(url, archive)
+
+                log(f"Extracting toolchain into store entry {key}")
+                with archive.open("rb") as f:
+                    ParallelExtractor(tree).extract(f)
+                archive.unlink()
+
+            manifest, files, size = self._manifest(tree)
+            now: float = time.time()
+            entry: ToolchainEntry = ToolchainEntry(
+                key=key,
+                url=url,
+                etag=etag,
+                sha256=sha256,
+                size=size,
+                files=files,
+                manifest=manifest,
+                created=now,
+                last_used=now,
+            )
+
+            dest: Path = self._entry_dir(key)
+            shutil.rmtree(dest, ignore_errors=True)
+            dest.mkdir()
+            tree.rename(dest / "tree")
+            self._write(entry)
+        return entry
+
+    def get(self, url: str) -> Path:
+        """
+        Return the extracted tree for an archive URL, downloading and
+        extracting it only when the store has no intact entry for it.
+
+        :param url: Archive URL.
+        :return: Path to the extracted toolchain.
+        """
+        try:
+            etag: str = self.identity(url)
+        except requests.RequestException as err:
+            # Offline: fall back to the newest entry for the same URL
+            cached: list[ToolchainEntry] = [e for e in self.entries() if e.url == url]
+            if not cached:
+                raise
+            log(f"Could not check {url} ({err}), using cached toolchain", "warning")
+            etag = cached[0].etag
+
+        key: str = self._key(url, etag)
+        tree: Path = self._entry_dir(key) / "tree"
+        # Checked again below, so a damaged tree this store handed out before
+        # can be re-extracted
+        held: ExitStack | None = self._leases.pop(key, None)
+        if held is not None:
+            held.close()
+        while True:
+            with ExitStack() as lease:
+                lease.enter_context(self._lock(key, shared=True))
+                entry: ToolchainEntry | None = self._read(key)
+                if entry is not None and self.verify(entry):
+                    log(f"Using cached toolchain {key} for {url}")
+                    entry.last_used = time.time()
+                    self._write(entry)
+                    self._leases[key] = lease.pop_all()
+                    return tree
+            # Missing or damaged: (re-)install it, then take the shared lock
+            with self._lock(key):
+                entry = self._read(key)
+                if entry is not None and not self.verify(entry):
+                    log(
+                        f"Toolchain store entry {key} is corrupted, re-extracting",
+                        "warning",
+                    )
+                    entry = None
+                if entry is None:
+                    self._install(url, etag, key)
+
+    def release(self) -> None:
+        """
+        Drop the shared locks taken by ``get``, once the build is done with
+        its toolchain.
+        """
+        for lease in self._leases.values():
+            lease.close()
+        self._leases = {}
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.release()
+
+    @traced("link clang")
+    def link(self, url: str, dest: Path) -> None:
+        """
+        Point ``dest`` at the store entry for ``url`` (symlink).
+
+        :param url: Archive URL.
+        :param dest: Path the build expects the toolchain at.
+        :return: None
+        """
+        tree: Path = self.get(url)
+        if dest.is_symlink() and dest.resolve() == tree.resolve():
+            return
+        if dest.exists() and not dest.is_symlink():
+            if dest.is_dir():
+                shutil.rmtree(dest)
+            else:
+                dest.unlink()
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        # Swap the link atomically: concurrent builds may be using it
+        tmp: Path = dest.with_name(f".{dest.name}.{os.getpid()}")
+        tmp.unlink(missing_ok=True)
+        tmp.symlink_to(tree, target_is_directory=True)
+        os.replace(tmp, dest)
+        log(f"Linked {dest} -> {tree}")
+
+    def remove(self, key: str) -> bool:
+        """
+        Delete an entry unless a build holds it.
+
+        :param key: Store key.
+        :return: True if removed, False if the entry is in use.
+        """
+        try:
+            with self._lock(key, blocking=False):
+                shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        except BlockingIOError:
+            log(f"Toolchain store entry {key} is in use, keeping it", "warning")
+            return False
+        return True
+
+    def prune(
+        self, *, keep: int = 1, older_than: float | None = None
+    ) -> list[ToolchainEntry]:
+        """
+        Remove old entries. Entries a build is using are skipped.
+
+        :param keep: Number of most recently used entries always kept.
+        :param older_than: Only remove entries unused for this many seconds.
+        :return: Removed entries.
+        """
+        removed: list[ToolchainEntry] = []
+        now: float = time.time()
+        for entry in self.entries()[keep:]:
+            if older_than is not None and now - entry.last_used < older_than:
+                continue
+            if self.remove(entry.key):
+                removed.append(entry)
+        return removed
+
+
+if __name__ == "__main__":
+    raise SystemExit("This file is meant to be imported, not executed.")
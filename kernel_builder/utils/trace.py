@@ -0,0 +1,180 @@
+import functools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from kernel_builder.utils.fs import FileSystem
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    cat: str
+    args: dict[str, Any] = field(default_factory=dict)
+    # Set to a child's PID to show the span on that process' track
+    pid: int | None = None
+
+
+class Tracer:
+    """
+    Collect Chrome trace events (the JSON format Perfetto and
+    chrome://tracing open) for the build.
+
+    Spans become complete ("X") events on the thread that ran them, so
+    nesting follows from their timestamps; subprocess spans can be moved to
+    the child's own process track. Nothing is recorded until ``start``.
+    """
+
+    def __init__(self) -> None:
+        self.path: Path | None = None
+        self.events: list[dict[str, Any]] = []
+        self.metadata: dict[str, Any] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._threads: set[int] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    @staticmethod
+    def _now() -> float:
+        return time.perf_counter_ns() / 1000
+
+    def start(self, path: Path) -> None:
+        self.path = path
+        self.events = []
+        self._threads = set()
+        self.metadata = {
+            "argv": sys.argv,
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        }
+        self._emit(
+            "M", "process_name", pid=os.getpid(), args={"name": "kernel_builder"}
+        )
+
+    def _emit(self, ph: str, name: str, **event: Any) -> None:
+        event.setdefault("pid", os.getpid())
+        event.setdefault("tid", threading.get_native_id())
+        with self._lock:
+            tid: int = event["tid"]
+            if event["pid"] == os.getpid() and tid not in self._threads:
+                self._threads.add(tid)
+                self.events.append(
+                    {
+                        "ph": "M",
+                        "name": "thread_name",
+                        "pid": event["pid"],
+                        "tid": tid,
+                        "args": {"name": threading.current_thread().name},
+                    }
+                )
+            self.events.append({"ph": ph, "name": name, **event})
+
+    @contextmanager
+    def span(self, name: str, cat: str = "build", **args: Any) -> Iterator[Span]:
+        """
+        Time a block as one trace event.
+
+        :param name: Event name.
+        :param cat: Category, e.g. ``build`` or ``subprocess``.
+        :param args: Shown with the event in the viewer.
+        :return: The span, whose ``args`` and ``pid`` may be updated inside the block.
+        """
+        span: Span = Span(name, cat, args)
+        if not self.enabled:
+            yield span
+            return
+        start: float = self._now()
+        tid: int = threading.get_native_id()
+        try:
+            yield span
+        except BaseException as e:
+            span.args["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            event: dict[str, Any] = {
+                "cat": span.cat,
+                "ts": start,
+                "dur": self._now() - start,
+                "args": span.args,
+            }
+            if span.pid is not None:
+                self.process(span.pid, span.name)
+                event.update(pid=span.pid, tid=span.pid)
+            else:
+                event["tid"] = tid
+            self._emit("X", span.name, **event)
+
+    def instant(self, name: str, **args: Any) -> None:
+        if self.enabled:
+            self._emit("i", name, ts=self._now(), s="t", args=args)
+
+    def counter(self, name: str, **values: float) -> None:
+        """
+        Record a sample of one or more series, drawn as a graph in the viewer.
+        """
+        if self.enabled:
+            self._emit("C", name, ts=self._now(), args=values)
+
+    def process(self, pid: int, name: str) -> None:
+        if self.enabled:
+            self._emit("M", "process_name", pid=pid, tid=pid, args={"name": name})
+
+    def annotate(self, **metadata: Any) -> None:
+        self.metadata.update(metadata)
+
+    def save(self) -> Path | None:
+        """
+        Write the trace file.
+
+        :return: Its path, or None if tracing is off.
+        """
+        if self.path is None:
+            return None
+        with self._lock:
+            trace: dict[str, Any] = {
+                "traceEvents": list(self.events),
+                "displayTimeUnit": "ms",
+                "otherData": self.metadata,
+            }
+        FileSystem.write_atomic(self.path, json.dumps(trace, default=str))
+        return self.path
+
+
+tracer: Tracer = Tracer()
+
+
+def span(name: str, cat: str = "build", **args: Any):
+    return tracer.span(name, cat, **args)
+
+
+def traced[**P, R](
+    name: str, cat: str = "build"
+) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """
+    Decorator form of ``span``.
+    """
+
+    def decorator(fn: Callable[P, R]) -> Callable[P, R]:
+        @functools.wraps(fn)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            with tracer.span(name, cat):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+if __name__ == "__main__":
+    raise SystemExit("This file is meant to be imported, not executed.")
@@ -1,22 +1,57 @@
 import json
 import os
+import re
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from itertools import combinations as pairs, pairwise
 from pathlib import Path
 from typing import Any
 
+# (KSU variant, SUSFS, LXC)
+Combination = tuple[str, bool, bool]
+
+_DIFF_FILE: re.Pattern[str] = re.compile(r"^\+\+\+ (?:b/)?(\S+)", re.MULTILINE)
+_DEFCONFIG_SYMBOL: re.Pattern[str] = re.compile(
+    r"^\+(?:(CONFIG_\w+)=(\S+)|# (CONFIG_\w+) is not set)$", re.MULTILINE
+)
+
 
 class VariantsParser:
     def __init__(self, variant_json: Path) -> None:
         self.variants: list[dict[str, Any]] = json.loads(variant_json.read_text())
 
-    def _check_env(self, key: str, val: bool) -> bool:
-        return os.getenv(key, "").lower() == str(val).lower()
+        # Entries indexed by their env, one table per distinct set of env keys
+        self._index: dict[tuple[str, ...], dict[tuple[str, ...], int]] = {}
+        for pos, entry in enumerate(self.variants):
+            env: dict[str, Any] = entry.get("env", {})
+            keys: tuple[str, ...] = tuple(sorted(env))
+            values: tuple[str, ...] = tuple(self._norm(env[k]) for k in keys)
+            self._index.setdefault(keys, {}).setdefault(values, pos)
+
+    @staticmethod
+    def _norm(val: Any) -> str:
+        return str(val).lower()
 
     def _detect_variant(self) -> dict[str, bool] | None:
-        for entry in self.variants:
-            env_map = entry.get("env", {})
-            if all(self._check_env(key, val) for key, val in env_map.items()):
-                return entry
-        return None
+        # The first entry in file order wins, as with a linear scan
+        hits: list[int] = []
+        for keys, table in self._index.items():
+            values = tuple(os.getenv(k, "").lower() for k in keys)
+            if (pos := table.get(values)) is not None:
+                hits.append(pos)
+        return self.variants[min(hits)] if hits else None
+
+    def entry(self, ksu: str, susfs: bool) -> dict[str, Any] | None:
+        """
+        Look up the entry for a KernelSU variant without touching the environment.
+
+        :param ksu: KernelSU variant, e.g. ``NEXT``.
+        :param susfs: Whether SUSFS is enabled.
+        :return: The matching entry, or None.
+        """
+        table = self._index.get(("KSU", "SUSFS"), {})
+        pos: int | None = table.get((self._norm(ksu), self._norm(susfs)))
+        return self.variants[pos] if pos is not None else None
 
     def name(self) -> str:
         v: dict[str, Any] | None = self._detect_variant()
@@ -29,3 +64,198 @@ class VariantsParser:
         if not v:
             raise RuntimeError("No matching variant for current environment")
         return v.get("config", {})
+
+
+@dataclass(frozen=True, slots=True)
+class VariantDelta:
+    kconfig: frozenset[str]
+    files: frozenset[str]
+
+    @property
+    def cost(self) -> int:
+        return len(self.kconfig) + len(self.files)
+
+
+@dataclass(frozen=True, slots=True)
+class _Inputs:
+    kconfig: dict[str, str]
+    # (patch or source, file) pairs, so the same file patched differently differs
+    files: frozenset[tuple[str, str]]
+
+
+class VariantMatrix:
+    """
+    Every KSU x SUSFS x LXC combination in ``variants.json`` and how far
+    apart they are.
+
+    Two variants differ by the Kconfig symbols they set differently (from
+    ``variants.json`` and any defconfig hunks in their patches) and by the
+    files their patches touch. Building them in an order that keeps
+    consecutive deltas small lets ccache and an incremental ``out/`` reuse
+    as many objects as possible.
+    """
+
+    def __init__(
+        self,
+        parser: VariantsParser,
+        inputs: Callable[[Combination], Iterable[Path | str]] | None = None,
+    ) -> None:
+        """
+        :param parser: Parsed ``variants.json``.
+        :param inputs: Patch files (or opaque source identifiers) a combination
+            applies to the kernel tree. Missing files count as one opaque input.
+        """
+        self.parser: VariantsParser = parser
+        self.inputs: Callable[[Combination], Iterable[Path | str]] = inputs or (
+            lambda _: ()
+        )
+        self._patches: dict[Path, tuple[frozenset[str], dict[str, str]]] = {}
+        self._cache: dict[Combination, _Inputs] = {}
+
+    def combinations(self) -> list[Combination]:
+        """
+        Expand every ``variants.json`` entry with and without LXC.
+
+        :return: Combinations in file order.
+        """
+        result: list[Combination] = []
+        for entry in self.parser.variants:
+            env: dict[str, Any] = entry.get("env", {})
+            if "KSU" not in env:
+                continue
+            for lxc in (False, True):
+                result.append((env["KSU"], bool(env.get("SUSFS", False)), lxc))
+        return result
+
+    def check(self, combos: Iterable[Combination]) -> None:
+        """
+        :raises RuntimeError: If any combination has no ``variants.json`` entry.
+        """
+        missing: list[str] = [
+            f"{ksu}{'+SUSFS' if susfs else ''}"
+            for ksu, susfs, _ in combos
+            if self.parser.entry(ksu, susfs) is None
+        ]
+        if missing:
+            raise RuntimeError(f"No variants.json entry for: {', '.join(missing)}")
+
+    def _patch(self, patch: Path) -> tuple[frozenset[str], dict[str, str]]:
+        if patch not in self._patches:
+            text: str = patch.read_text(errors="replace")
+            files: frozenset[str] = frozenset(_DIFF_FILE.findall(text))
+            symbols: dict[str, str] = {}
+            for sym, val, unset in _DEFCONFIG_SYMBOL.findall(text):
+                if sym:
+                    symbols[sym] = val
+                else:
+                    symbols[unset] = "n"
+            self._patches[patch] = (files, symbols)
+        return self._patches[patch]
+
+    def _inputs(self, combo: Combination) -> _Inputs:
+        if combo in self._cache:
+            return self._cache[combo]
+
+        entry: dict[str, Any] | None = self.parser.entry(combo[0], combo[1])
+        kconfig: dict[str, str] = {
+            k: "y" if v else "n" for k, v in (entry or {}).get("config", {}).items()
+        }
+        files: set[tuple[str, str]] = set()
+        for item in self.inputs(combo):
+            if isinstance(item, Path) and item.is_file():
+                touched, symbols = self._patch(item)
+                files.update((item.name, f) for f in touched)
+                kconfig.update(symbols)
+            else:
+                files.add((str(item), str(item)))
+
+        self._cache[combo] = _Inputs(kconfig, frozenset(files))
+        return self._cache[combo]
+
+    def delta(self, a: Combination, b: Combination) -> VariantDelta:
+        """
+        What has to change to go from building ``a`` to building ``b``.
+        """
+        x, y = self._inputs(a), self._inputs(b)
+        kconfig: frozenset[str] = frozenset(
+            k
+            for k in x.kconfig.keys() | y.kconfig.keys()
+            if x.kconfig.get(k) != y.kconfig.get(k)
+        )
+        return VariantDelta(kconfig, frozenset(f for _, f in x.files ^ y.files))
+
+    def deltas(
+        self, combos: list[Combination]
+    ) -> dict[tuple[Combination, Combination], VariantDelta]:
+        """
+        Delta between every pair of combinations, in both directions.
+        """
+        result: dict[tuple[Combination, Combination], VariantDelta] = {}
+        for a, b in pairs(combos, 2):
+            result[a, b] = result[b, a] = self.delta(a, b)
+        return result
+
+    @staticmethod
+    def path_cost(
+        order: list[Combination],
+        deltas: dict[tuple[Combination, Combination], VariantDelta],
+    ) -> int:
+        return sum(deltas[a, b].cost for a, b in pairwise(order))
+
+    def order(self, combos: list[Combination]) -> list[Combination]:
+        """
+        Build order with small deltas between consecutive builds.
+
+        Walks a minimum spanning tree of the deltas depth first, cheapest
+        edge first, starting from the variant with the fewest inputs, then
+        shortens the path with 2-opt moves.
+
+        :param combos: Combinations to build.
+        :return: The same combinations, reordered.
+        """
+        combos = list(dict.fromkeys(combos))
+        if len(combos) < 3:
+            return combos
+        deltas = self.deltas(combos)
+
+        def size(c: Combination) -> int:
+            i: _Inputs = self._inputs(c)
+            return len(i.kconfig) + len(i.files)
+
+        # Prim's algorithm
+        start: Combination = min(combos, key=lambda c: (size(c), combos.index(c)))
+        children: dict[Combination, list[Combination]] = {c: [] for c in combos}
+        best: dict[Combination, tuple[int, Combination]] = {
+            c: (deltas[start, c].cost, start) for c in combos if c != start
+        }
+        while best:
+            node: Combination = min(best, key=lambda c: (best[c][0], combos.index(c)))
+            children[best.pop(node)[1]].append(node)
+            for c, (cost, _) in best.items():
+                if deltas[node, c].cost < cost:
+                    best[c] = (deltas[node, c].cost, node)
+
+        path: list[Combination] = []
+        stack: list[Combination] = [start]
+        while stack:
+            node = stack.pop()
+            path.append(node)
+            stack.extend(
+                sorted(children[node], key=lambda c: deltas[node, c].cost, reverse=True)
+            )
+
+        # 2-opt on an open path: reverse path[i:j] when that shortens it
+        improved: bool = True
+        while improved:
+            improved = False
+            for i in range(1, len(path) - 1):
+                for j in range(i + 1, len(path)):
+                    before: int = deltas[path[i - 1], path[i]].cost
+                    after: int = deltas[path[i - 1], path[j]].cost
+                    if j + 1 < len(path):
+                        before += deltas[path[j], path[j + 1]].cost
+                        after += deltas[path[i], path[j + 1]].cost
+                    if after < before:
+                        path[i : j + 1] = reversed(path[i : j + 1])
+                        improved = True
+        return path
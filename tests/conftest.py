@@ -4,5 +4,5 @@ from pytest import MonkeyPatch
 
 @pytest.fixture(autouse=True)
 def clean_env(monkeypatch: MonkeyPatch):
-    for key in ("KSU", "SUSFS", "LXC", "LOCAL_RUN"):
+    for key in ("KSU", "SUSFS", "LXC", "LOCAL_RUN", "ARTIFACTS"):
         monkeypatch.delenv(key, raising=False)
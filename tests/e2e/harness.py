@@ -0,0 +1,599 @@
+"""
+Hermetic stand-ins for everything a build talks to, so the real pipeline
+(``cli.py build``) runs offline: bare git repositories for every SOURCES
+entry, a local HTTP server for the GitHub API, raw files, the clang
+tarball and the GKI zip, and fake make / clang / mkbootimg / avbtool that
+produce a plausible Image.gz and boot.img in no time.
+
+The builder is pointed at them only through configuration (GKI_* variables
+and git's url.<base>.insteadOf), nothing in kernel_builder is patched.
+
+Run from the repository root to measure the orchestration overhead::
+
+    python -m tests.e2e.harness --runs 3
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from dataclasses import dataclass, field
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+from kernel_builder.config import manifest
+from kernel_builder.config.config import DEFCONFIG
+from kernel_builder.config.manifest import SOURCES
+from kernel_builder.constants import GITHUB_API, ROOT
+from kernel_builder.post_build.export_env import KSU_RELEASES
+from kernel_builder.utils import clang
+
+KERNEL_VERSION: tuple[int, int, int] = (5, 10, 240)
+
+# Hosts of the git sources, redirected to file:// repositories
+GIT_HOSTS: tuple[str, ...] = ("github.com", "gitlab.com", "android.googlesource.com")
+
+FAKE_MAKE: str = '''\
+"""Just enough of Kbuild for Builder: defconfig, olddefconfig, Image*, vmlinux, modules."""
+import gzip
+import os
+import random
+import shlex
+import subprocess
+import sys
+from pathlib import Path
+
+args = [a for a in sys.argv[1:] if not a.startswith("-")]
+variables = dict(a.split("=", 1) for a in args if "=" in a)
+out = Path(variables.get("O", "."))
+out.mkdir(exist_ok=True)
+compile_seconds = float(os.getenv("GKI_FAKE_COMPILE_SECONDS", "0"))
+
+
+def image() -> bytes:
+    # arm64 Image header (magic "ARM\\x64" at 56), then compressible payload
+    makefile = dict(
+        line.split(" = ", 1) for line in Path("Makefile").read_text().splitlines() if " = " in line
+    )
+    version = tuple(int(makefile[k]) for k in ("VERSION", "PATCHLEVEL", "SUBLEVEL"))
+    rng = random.Random(0)
+    header = bytearray(64)
+    header[56:60] = b"ARM\\x64"
+    table = bytes(i % 32 * 7 for i in range(256))
+    body = rng.randbytes(2 << 20).translate(table)
+    banner = b"Linux version %d.%d.%d (fake@e2e)\\0" % version
+    return bytes(header) + banner + body
+
+
+for target in (a for a in args if "=" not in a):
+    if target.endswith("_defconfig"):
+        config = Path("arch/arm64/configs", target).read_text()
+        (out / ".config").write_text(config)
+        print("  HOSTCC  scripts/kconfig/conf.o", flush=True)
+    elif target == "olddefconfig":
+        print("  SYNC    include/config/auto.conf", flush=True)
+    elif target.startswith("Image"):
+        sources = sorted(p for d in ("init", "kernel", "drivers") for p in Path(d).rglob("*.c"))
+        cc = shlex.split(os.environ.get("CC", "clang"))
+        env = {**os.environ, "GKI_FAKE_SLEEP": str(compile_seconds / max(1, len(sources)))}
+        for src in sources:
+            obj = src.with_suffix(".o")
+            print(f"  CC      {obj}", flush=True)
+            (out / obj).parent.mkdir(parents=True, exist_ok=True)
+            subprocess.run([*cc, "-O2", "-c", "-o", str(obj), f"../{src}"], cwd=out, env=env, check=True)
+        print("  LD      vmlinux", flush=True)
+        (out / "vmlinux").write_bytes(b"\x7fELF" + image())
+        boot = out / "arch" / "arm64" / "boot"
+        boot.mkdir(parents=True, exist_ok=True)
+        (boot / "Image").write_bytes(image())
+        print("  OBJCOPY arch/arm64/boot/Image", flush=True)
+        if target == "Image.gz":
+            (boot / "Image.gz").write_bytes(gzip.compress((boot / "Image").read_bytes(), 6))
+            print("  GZIP    arch/arm64/boot/Image.gz", flush=True)
+        elif target == "Image.lz4":
+            import lz4.frame
+
+            (boot / "Image.lz4").write_bytes(lz4.frame.compress((boot / "Image").read_bytes()))
+            print("  LZ4     arch/arm64/boot/Image.lz4", flush=True)
+    elif target == "vmlinux":
+        print("  LD      vmlinux", flush=True)
+        (out / "vmlinux").write_bytes(b"\x7fELF" + image())
+    elif target == "modules":
+        print("  CC [M]  drivers/fake/fake.o", flush=True)
+        (out / "drivers" / "fake").mkdir(parents=True, exist_ok=True)
+        (out / "drivers" / "fake" / "fake.ko").write_bytes(b"\x7fELF fake module")
+        print("  MODPOST modules-only.symvers", flush=True)
+    elif target == "modules_install":
+        dest = Path(variables["INSTALL_MOD_PATH"], "lib", "modules", "fake", "kernel", "drivers")
+        dest.mkdir(parents=True, exist_ok=True)
+        (dest / "fake.ko").write_bytes((out / "drivers" / "fake" / "fake.ko").read_bytes())
+        print("  INSTALL /lib/modules/fake/kernel/drivers/fake.ko", flush=True)
+    else:
+        sys.exit(f"fake make: no rule to make target {target!r}")
+'''
+
+FAKE_CLANG: str = """\
+import os
+import sys
+import time
+from pathlib import Path
+
+args = sys.argv[1:]
+if "-v" in args or "--version" in args:
+    print(
+        "Android (42, based on r1) clang version 18.0.0 "
+        "(https://android.googlesource.com/toolchain/llvm-project e2e)",
+        file=sys.stderr,
+    )
+    sys.exit(0)
+time.sleep(float(os.getenv("GKI_FAKE_SLEEP", "0")))
+if "-o" in args:
+    Path(args[args.index("-o") + 1]).write_bytes(b"\\x7fELF fake object\\n")
+"""
+
+FAKE_UNPACK_BOOTIMG: str = """\
+import argparse
+from pathlib import Path
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--boot_img", required=True)
+parser.add_argument("--out", default="out")
+args = parser.parse_args()
+out = Path(args.out)
+out.mkdir(exist_ok=True)
+data = Path(args.boot_img).read_bytes()
+(out / "kernel").write_bytes(data[8:1032])
+(out / "ramdisk").write_bytes(data[1032:])
+"""
+
+FAKE_MKBOOTIMG: str = """\
+import argparse
+from pathlib import Path
+
+parser = argparse.ArgumentParser()
+for name in ("--header_version", "--kernel", "--ramdisk", "--output", "--os_version", "--os_patch_level"):
+    parser.add_argument(name)
+args = parser.parse_args()
+kernel = Path(args.kernel).read_bytes()
+ramdisk = Path(args.ramdisk).read_bytes()
+Path(args.output).write_bytes(b"ANDROID!" + len(kernel).to_bytes(4, "little") + kernel + ramdisk)
+"""
+
+FAKE_AVBTOOL: str = """\
+import sys
+from pathlib import Path
+
+args = sys.argv[1:]
+assert args[0] == "add_hash_footer", args
+image = Path(args[args.index("--image") + 1])
+with image.open("ab") as f:
+    f.write(b"AVBf" + args[args.index("--algorithm") + 1].encode())
+"""
+
+
+def _script(path: Path, body: str) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"#!{sys.executable}\n{body}")
+    path.chmod(0o755)
+    return path
+
+
+def _git(*args: str, cwd: Path | None = None) -> str:
+    return subprocess.run(
+        [
+            "git",
+            "-c",
+            "user.name=e2e",
+            "-c",
+            "user.email=e2e@localhost",
+            "-c",
+            "init.defaultBranch=main",
+            *args,
+        ],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+def _kernel_tree(tree: Path) -> None:
+    version, patchlevel, sublevel = KERNEL_VERSION
+    (tree / "Makefile").write_text(
+        f"VERSION = {version}\nPATCHLEVEL = {patchlevel}\nSUBLEVEL = {sublevel}\nEXTRAVERSION =\nNAME = Dare mighty things\n"
+    )
+    (tree / "Kconfig").write_text(
+        'mainmenu "Linux/$(ARCH) $(KERNELVERSION) Kernel Configuration"\n'
+    )
+    configs: Path = tree / "arch" / "arm64" / "configs"
+    configs.mkdir(parents=True)
+    (tree / "arch" / "arm64" / "Kconfig").write_text("config ARM64\n\tdef_bool y\n")
+    (configs / DEFCONFIG).write_text(
+        'CONFIG_LOCALVERSION="-e2e"\nCONFIG_MODULES=y\n# CONFIG_KSU is not set\nCONFIG_CC_OPTIMIZE_FOR_PERFORMANCE=y\n'
+    )
+    rng = random.Random(0)
+    for directory, count in (
+        ("init", 3),
+        ("kernel", 12),
+        ("drivers/gpu/mali", 10),
+        ("drivers/usb", 5),
+    ):
+        path: Path = tree / directory
+        path.mkdir(parents=True, exist_ok=True)
+        (path / "Kconfig").write_text(f"# {directory}\n")
+        for i in range(count):
+            (path / f"f{i}.c").write_text(
+                "".join(
+                    f"int f{i}_{n}(void) {{ return {rng.randrange(1 << 16)}; }}\n"
+                    for n in range(50)
+                )
+            )
+
+
+def _anykernel_tree(tree: Path) -> None:
+    (tree / "anykernel.sh").write_text("properties() { '\nkernel.string=e2e\n'; }\n")
+    (tree / "tools").mkdir()
+    (tree / "tools" / "ak3-core.sh").write_text("# AnyKernel3 core\n")
+    (tree / "META-INF" / "com" / "google" / "android").mkdir(parents=True)
+    (tree / "META-INF" / "com" / "google" / "android" / "update-binary").write_text(
+        "#!/sbin/sh\n"
+    )
+
+
+def _build_tools_tree(tree: Path) -> None:
+    _script(tree / "linux-x86" / "bin" / "avbtool", FAKE_AVBTOOL)
+    (tree / "linux-x86" / "bin" / "unused-prebuilt").write_bytes(bytes(4096))
+
+
+def _mkbootimg_tree(tree: Path) -> None:
+    _script(tree / "mkbootimg.py", FAKE_MKBOOTIMG)
+    _script(tree / "unpack_bootimg.py", FAKE_UNPACK_BOOTIMG)
+    (tree / "gki").mkdir()
+    (tree / "gki" / "__init__.py").write_text("")
+    (tree / "tests").mkdir()
+    (tree / "tests" / "unused.py").write_text("")
+
+
+def _susfs_tree(tree: Path) -> None:
+    patches: Path = tree / "kernel_patches"
+    (patches / "include" / "linux").mkdir(parents=True)
+    (patches / "fs").mkdir()
+    (patches / "include" / "linux" / "susfs.h").write_text(
+        '#define SUSFS_VERSION "v1.5.9"\n'
+    )
+    (patches / "fs" / "susfs.c").write_text("int susfs_init(void) { return 0; }\n")
+    (patches / "50_add_susfs_in_gki-android12-5.10.patch").write_text("")
+    (tree / "ksu_module_susfs").mkdir()
+    (tree / "ksu_module_susfs" / "README").write_text("not fetched (sparse)\n")
+
+
+def _clang_tarball(dest: Path) -> None:
+    with tarfile.open(dest, "w:gz") as tar:
+        for name in ("clang", "clang++", "ld.lld"):
+            data: bytes = f"#!{sys.executable}\n{FAKE_CLANG}".encode()
+            info = tarfile.TarInfo(f"bin/{name}")
+            info.size = len(data)
+            info.mode = 0o755
+            tar.addfile(info, io.BytesIO(data))
+        data = bytes(64 << 10)
+        info = tarfile.TarInfo("lib/libLLVM.so")
+        info.size = len(data)
+        info.mode = 0o644
+        tar.addfile(info, io.BytesIO(data))
+
+
+def _gki_zip(dest: Path) -> None:
+    boot: bytes = b"ANDROID!" + bytes(1024) + b"fake ramdisk" * 64
+    with zipfile.ZipFile(dest, "w") as z:
+        z.writestr("boot-5.10.img", boot)
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@dataclass(slots=True)
+class BuildRun:
+    returncode: int
+    seconds: float
+    log: Path
+    trace: dict[str, Any] = field(default_factory=dict)
+
+    def events(self, ph: str = "X") -> list[dict[str, Any]]:
+        return [e for e in self.trace.get("traceEvents", []) if e["ph"] == ph]
+
+    def stages(self) -> dict[str, float]:
+        """
+        Seconds spent in each direct child span of "run build".
+        """
+        spans: list[dict[str, Any]] = self.events()
+        root: dict[str, Any] | None = next(
+            (e for e in spans if e["name"] == "run build"), None
+        )
+        if root is None:
+            return {}
+        inside: list[dict[str, Any]] = sorted(
+            (
+                e
+                for e in spans
+                if e is not root
+                and e["pid"] == root["pid"]
+                and e["tid"] == root["tid"]
+                and root["ts"] <= e["ts"]
+                and e["ts"] + e["dur"] <= root["ts"] + root["dur"]
+            ),
+            key=lambda e: (e["ts"], -e["dur"]),
+        )
+        stages: dict[str, float] = {}
+        end: float = 0.0
+        for e in inside:
+            if e["ts"] >= end:
+                stages[e["name"]] = stages.get(e["name"], 0.0) + e["dur"] / 1e6
+                end = e["ts"] + e["dur"]
+        return stages
+
+    @property
+    def total(self) -> float:
+        return next(
+            (e["dur"] / 1e6 for e in self.events() if e["name"] == "run build"),
+            self.seconds,
+        )
+
+    @property
+    def compile(self) -> float:
+        # make runs that build the image, as opposed to the config passes
+        return sum(
+            e["dur"] / 1e6
+            for e in self.events()
+            if e.get("cat") == "subprocess" and e["name"].startswith("make Image")
+        )
+
+    @property
+    def overhead(self) -> float:
+        return self.total - self.compile
+
+
+class FakeUpstream:
+    """
+    Every remote a build uses, served from ``root``. Use as a context
+    manager; ``build`` then runs ``cli.py build`` against it.
+    """
+
+    def __init__(self, root: Path, *, compile_seconds: float = 0.0) -> None:
+        self.root: Path = root
+        self.compile_seconds: float = compile_seconds
+        self.git_root: Path = root / "upstream" / "git"
+        self.www: Path = root / "upstream" / "www"
+        self.bin: Path = root / "upstream" / "bin"
+        self._server: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        assert self._server is not None
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _repo(self, url: str, branch: str, populate) -> None:
+        host, path = url.split(":", 1)
+        bare: Path = self.git_root / host / path
+        if bare.exists():
+            return
+        with tempfile.TemporaryDirectory() as tmp:
+            work: Path = Path(tmp)
+            populate(work)
+            _git("init", "-q", str(work))
+            _git("add", "-A", cwd=work)
+            _git("commit", "-q", "-m", "Initial import", cwd=work)
+            bare.parent.mkdir(parents=True, exist_ok=True)
+            _git("init", "-q", "--bare", str(bare))
+            _git("push", "-q", str(bare), f"HEAD:refs/heads/{branch}", cwd=work)
+
+    def _publish(self, path: str, data: bytes | str | dict[str, Any]) -> None:
+        dest: Path = self.www / path.lstrip("/")
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(data, dict):
+            data = json.dumps(data)
+        dest.write_bytes(data.encode() if isinstance(data, str) else data)
+
+    def _setup(self) -> None:
+        trees = {
+            "KERNEL": _kernel_tree,
+            "ANYKERNEL": _anykernel_tree,
+            "BUILD_TOOL": _build_tools_tree,
+            "MKBOOTIMG": _mkbootimg_tree,
+            "SUSFS": _susfs_tree,
+        }
+        for name, populate in trees.items():
+            source = getattr(manifest, name)
+            self._repo(source["url"], source["branch"], populate)
+        for source in SOURCES:
+            self._repo(
+                source["url"],
+                source["branch"],
+                lambda tree: (tree / "README").write_text("e2e\n"),
+            )
+
+        _script(self.bin / "make", FAKE_MAKE)
+
+        files: Path = self.www / "files"
+        files.mkdir(parents=True, exist_ok=True)
+        _clang_tarball(files / "clang-r1.tar.gz")
+        _gki_zip(files / "gki.zip")
+
+    def _publish_api(self) -> None:
+        asset: dict[str, Any] = {
+            "browser_download_url": f"{self.base_url}/files/clang-r1.tar.gz"
+        }
+        for api in (
+            clang.AOSP_CLANG,
+            clang.RV_CLANG,
+            clang.YUKI_CLANG,
+            clang.LILIUM_CLANG,
+            clang.TNF_CLANG,
+        ):
+            self._publish(
+                f"api{api.removeprefix(GITHUB_API)}",
+                {"tag_name": "r1", "assets": [asset]},
+            )
+        for api in KSU_RELEASES.values():
+            self._publish(
+                f"api{api.removeprefix(GITHUB_API)}",
+                {"tag_name": "v1.0.0", "assets": []},
+            )
+
+    def __enter__(self) -> "FakeUpstream":
+        self._setup()
+        self._server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), partial(_QuietHandler, directory=str(self.www))
+        )
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-upstream", daemon=True
+        )
+        self._thread.start()
+        self._publish_api()
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def env(self) -> dict[str, str]:
+        """
+        Environment for a build against the stand-ins, in its own scratch tree.
+        """
+        git: dict[str, str] = {}
+        settings: list[tuple[str, str]] = [
+            *(
+                (f"url.file://{self.git_root / host}/.insteadOf", f"https://{host}/")
+                for host in GIT_HOSTS
+            ),
+            ("uploadpack.allowFilter", "true"),
+            ("uploadpack.allowAnySHA1InWant", "true"),
+            ("protocol.file.allow", "always"),
+        ]
+        for i, (key, value) in enumerate(settings):
+            git[f"GIT_CONFIG_KEY_{i}"] = key
+            git[f"GIT_CONFIG_VALUE_{i}"] = value
+        git["GIT_CONFIG_COUNT"] = str(len(settings))
+
+        env: dict[str, str] = {
+            k: v
+            for k, v in os.environ.items()
+            if not k.startswith(("GKI_", "GH_", "KSU"))
+        }
+        return {
+            **env,
+            **git,
+            "PATH": f"{self.bin}{os.pathsep}{env.get('PATH', '')}",
+            "GITHUB_ACTIONS": "true",
+            "GKI_WORKSPACE": str(self.root / "kernel"),
+            "GKI_OUTPUT": str(self.root / "dist"),
+            "GKI_TOOLCHAIN": str(self.root / "toolchain"),
+            "GKI_CACHE": str(self.root / "cache"),
+            "GKI_LOCKFILE": str(self.root / "sources.lock"),
+            "GKI_ENV_FILE": str(self.root / "github.env"),
+            "GKI_GITHUB_API": f"{self.base_url}/api",
+            "GKI_GITHUB_RAW": f"{self.base_url}/raw",
+            "GKI_URL": f"{self.base_url}/files/gki.zip",
+            "GKI_FAKE_COMPILE_SECONDS": str(self.compile_seconds),
+            "CCACHE_DIR": str(self.root / "ccache"),
+        }
+
+    def build(self, *args: str, name: str = "build") -> BuildRun:
+        """
+        Run ``cli.py build`` with extra arguments.
+
+        :param args: e.g. ``--incremental``.
+        :param name: Prefix of the log and trace files below ``root``.
+        :return: Exit status, wall time, log path and trace.
+        """
+        log: Path = self.root / f"{name}.log"
+        trace: Path = self.root / f"{name}.trace.json"
+        trace.unlink(missing_ok=True)
+        start: float = time.perf_counter()
+        with log.open("w") as f:
+            proc = subprocess.run(
+                [
+                    sys.executable,
+                    str(ROOT / "cli.py"),
+                    "build",
+                    "--trace",
+                    str(trace),
+                    *args,
+                ],
+                cwd=self.root,
+                env=self.env(),
+                stdout=f,
+                stderr=subprocess.STDOUT,
+            )
+        seconds: float = time.perf_counter() - start
+        data: dict[str, Any] = json.loads(trace.read_text()) if trace.exists() else {}
+        return BuildRun(proc.returncode, seconds, log, data)
+
+
+def main() -> int:
+    from rich import print
+    from rich.table import Table
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=3, help="Builds after the cold one")
+    parser.add_argument(
+        "--compile-seconds", type=float, default=0.0, help="Time the fake compile takes"
+    )
+    parser.add_argument(
+        "--incremental", action="store_true", help="Warm builds with --incremental"
+    )
+    parser.add_argument("--dir", type=Path, default=None, help="Scratch directory")
+    args = parser.parse_args()
+
+    with (
+        tempfile.TemporaryDirectory(dir=args.dir) as tmp,
+        FakeUpstream(Path(tmp), compile_seconds=args.compile_seconds) as upstream,
+    ):
+        runs: list[BuildRun] = []
+        for n in range(args.runs + 1):
+            extra: list[str] = ["--incremental"] if args.incremental and n else []
+            run: BuildRun = upstream.build(*extra, name=f"build{n}")
+            if run.returncode:
+                print(
+                    f"[red]Build {n} failed, log:[/red]\n{run.log.read_text()[-4000:]}"
+                )
+                return 1
+            runs.append(run)
+
+        names: list[str] = list(
+            dict.fromkeys(name for run in runs for name in run.stages())
+        )
+        table = Table(title="Pipeline stages (seconds)", title_justify="left")
+        table.add_column("Stage")
+        table.add_column("Cold", justify="right")
+        for n in range(1, len(runs)):
+            table.add_column(f"Warm {n}", justify="right")
+        for name in names:
+            table.add_row(name, *(f"{run.stages().get(name, 0.0):.2f}" for run in runs))
+        table.add_section()
+        table.add_row("compile (make Image)", *(f"{run.compile:.2f}" for run in runs))
+        table.add_row("overhead", *(f"{run.overhead:.2f}" for run in runs))
+        table.add_row(
+            "wall (incl. interpreter)", *(f"{run.seconds:.2f}" for run in runs)
+        )
+        print(table)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
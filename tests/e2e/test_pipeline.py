@@ -0,0 +1,97 @@
+import csv
+import tarfile
+import zipfile
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from tests.e2e.harness import BuildRun, FakeUpstream
+
+
+@pytest.fixture(scope="module")
+def upstream(tmp_path_factory: pytest.TempPathFactory) -> Iterator[FakeUpstream]:
+    with FakeUpstream(tmp_path_factory.mktemp("e2e")) as upstream:
+        yield upstream
+
+
+def _check(run: BuildRun) -> None:
+    assert run.returncode == 0, run.log.read_text()[-4000:]
+
+
+def _makes(run: BuildRun) -> list[str]:
+    return [e["name"] for e in run.events() if e.get("cat") == "subprocess"]
+
+
+@pytest.fixture(scope="module")
+def cold(upstream: FakeUpstream) -> BuildRun:
+    run: BuildRun = upstream.build(name="cold")
+    _check(run)
+    return run
+
+
+def test_build_runs_offline(upstream: FakeUpstream, cold: BuildRun) -> None:
+    run: BuildRun = cold
+
+    dist: Path = upstream.root / "dist"
+    (anykernel,) = dist.glob("*-5.10.240*-AnyKernel3.zip")
+    (boot,) = dist.glob("*-5.10.240*-boot.img")
+    with zipfile.ZipFile(anykernel) as z:
+        assert {"anykernel.sh", "Image.gz"} <= set(z.namelist())
+    assert boot.read_bytes().startswith(b"ANDROID!")
+    with (dist / "compile-times.csv").open() as f:
+        objects: list[str] = [row["object"] for row in csv.DictReader(f)]
+    assert len(objects) == 30
+    assert sum(o.startswith("drivers/gpu/mali/") for o in objects) == 10
+
+    env: str = (upstream.root / "github.env").read_text()
+    assert "version='5.10.240'" in env
+    assert "susfs_version='v1.5.9'" in env
+    assert "toolchain='Android (42, based on r1) clang 18.0.0'" in env
+
+    stages: dict[str, float] = run.stages()
+    for stage in ("clone sources", "link clang", "kernel build", "boot image"):
+        assert stage in stages
+    assert 0 < run.compile < run.total
+    # Only the flashables were requested: no module build
+    assert [name for name in _makes(run) if "Image" in name] == ["make Image.gz"]
+
+
+def test_rebuild_reuses_caches(upstream: FakeUpstream, cold: BuildRun) -> None:
+    run: BuildRun = upstream.build("--incremental", name="warm")
+    _check(run)
+
+    assert "Using cached toolchain" in run.log.read_text()
+    assert any(e["name"] == "config cache hit" for e in run.events("i"))
+
+
+def test_requested_artifacts_only(upstream: FakeUpstream, cold: BuildRun) -> None:
+    run: BuildRun = upstream.build(
+        "--incremental", "-a", "modules", "-a", "vmlinux", name="modules"
+    )
+    _check(run)
+
+    dist: Path = upstream.root / "dist"
+    (modules,) = dist.glob("*-5.10.240*-modules.tar.gz")
+    with tarfile.open(modules) as tar:
+        assert "./lib/modules/fake/kernel/drivers/fake.ko" in tar.getnames()
+    assert next(dist.glob("*-vmlinux")).read_bytes().startswith(b"\x7fELF")
+    assert not list(dist.glob("*AnyKernel3.zip")) and not list(dist.glob("*boot.img"))
+    makes: list[str] = _makes(run)
+    assert "make modules vmlinux" in makes
+    assert not any(name.startswith("make Image") for name in makes)
+
+
+def test_clean_rebuild_keeps_unchanged_tree(
+    upstream: FakeUpstream, cold: BuildRun
+) -> None:
+    run: BuildRun = upstream.build(name="clean")
+    _check(run)
+
+    text: str = run.log.read_text()
+    # Same pins and patches: the patched kernel tree is neither re-cloned nor
+    # patched again, only out/ starts empty
+    assert "Reusing github.com:ESK-Project/android_kernel_xiaomi_mt6895" in text
+    assert "Pre-build inputs unchanged, reusing the patched tree" in text
+    assert "pre-build" not in run.stages()
+    assert list((upstream.root / "dist").glob("*-5.10.240*-AnyKernel3.zip"))
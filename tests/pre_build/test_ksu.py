@@ -0,0 +1,66 @@
+import os
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from kernel_builder.pre_build import ksu
+from kernel_builder.pre_build.ksu import KSUInstaller
+from kernel_builder.utils.lockfile import SourceLock
+from kernel_builder.utils.source import SourceManager
+
+TAG_COMMIT: str = "1" * 40
+TIP_COMMIT: str = "2" * 40
+LOCKED_COMMIT: str = "3" * 40
+
+
+@pytest.fixture
+def installer(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, mocker: MockerFixture
+) -> KSUInstaller:
+    monkeypatch.setattr(ksu, "LOCKFILE", tmp_path / "sources.lock")
+    # Recorded by monkeypatch, so the value install() sets is undone
+    monkeypatch.setenv("KSU_VERSION", "")
+    mocker.patch.object(KSUInstaller, "_fetch_latest_tag", return_value="v1.0")
+    mocker.patch.object(KSUInstaller, "_patch_manual_hooks")
+    mocker.patch.object(KSUInstaller, "_run_setup")
+    # The branch moves after its first lookup
+    tips = iter([TIP_COMMIT])
+    mocker.patch.object(
+        SourceManager,
+        "resolve_ref",
+        side_effect=lambda repo, ref: (
+            {"v1.0": TAG_COMMIT}.get(ref) or next(tips, "9" * 40)
+        ),
+    )
+    return KSUInstaller("NEXT", True)
+
+
+def test_installs_the_commit_it_reported(installer: KSUInstaller) -> None:
+    assert installer.ref() == TIP_COMMIT
+    installer.install()
+
+    installer._run_setup.assert_called_once_with(  # pyright: ignore[reportFunctionMemberAccess]
+        "github.com:ESK-Project/KernelSU-Next", TIP_COMMIT
+    )
+    assert os.environ["KSU_VERSION"] == "v1.0"
+
+
+def test_locked_commit_names_its_version(
+    tmp_path: Path, installer: KSUInstaller
+) -> None:
+    lock: SourceLock = SourceLock()
+    lock.pin(
+        "github.com:ESK-Project/KernelSU-Next",
+        "next-susfs",
+        LOCKED_COMMIT,
+        kernelsu=True,
+    )
+    lock.save(tmp_path / "sources.lock")
+
+    installer.install()
+
+    installer._run_setup.assert_called_once_with(  # pyright: ignore[reportFunctionMemberAccess]
+        "github.com:ESK-Project/KernelSU-Next", LOCKED_COMMIT
+    )
+    assert os.environ["KSU_VERSION"] == LOCKED_COMMIT[:12]
@@ -0,0 +1,47 @@
+import json
+from pathlib import Path
+
+from benchmarks import suite
+
+
+def test_compare_flags_only_slower_cases() -> None:
+    baseline: dict[str, float] = {"a": 1.0, "b": 1.0, "c": 1.0}
+    results: dict[str, float] = {"a": 1.2, "b": 1.3, "c": 0.5, "new": 9.0}
+
+    assert suite.compare(results, baseline, threshold=0.25) == ["b"]
+
+
+def test_suite_stores_and_checks_baseline(tmp_path: Path) -> None:
+    baseline: Path = tmp_path / "baseline.json"
+    args: list[str] = [
+        "--rounds",
+        "1",
+        "--scale",
+        "0.05",
+        "--baseline",
+        str(baseline),
+        "--dir",
+        str(tmp_path),
+        *("--only", "apply_patch", "--only", "edit .config"),
+        *("--only", "KPM lz4 round trip", "--only", "SUSFSPatcher.copy"),
+    ]
+
+    assert suite.main([*args, "--update"]) == 0
+    stored = json.loads(baseline.read_text())
+    assert stored["scale"] == 0.05
+    assert set(stored["cases"]) == {
+        "apply_patch",
+        "edit .config",
+        "KPM lz4 round trip",
+        "SUSFSPatcher.copy",
+    }
+
+    # Every case is far slower than a baseline of (almost) nothing
+    stored["cases"] = dict.fromkeys(stored["cases"], 1e-9)
+    baseline.write_text(json.dumps(stored))
+    assert suite.main(args) == 1
+
+    # A baseline for another fixture size is not compared against
+    stored["scale"] = 1.0
+    baseline.write_text(json.dumps(stored))
+    assert suite.main(args) == 0
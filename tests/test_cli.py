@@ -1,3 +1,4 @@
+import json
 from pathlib import Path
 from click.testing import Result
 from pytest_mock import MockerFixture, MockType
@@ -16,7 +17,9 @@ def test_env_var(mocker: MockerFixture) -> None:
         app, ["build", "--ksu", "SUKI", "--no-susfs", "--lxc"]
     )
 
-    fake.assert_called_once_with("SUKI", False, True)
+    fake.assert_called_once_with(
+        "SUKI", False, True, incremental=False, artifacts=["anykernel3", "boot"]
+    )
 
     assert result.exit_code == 0
     assert os.environ["KSU"] == "SUKI"
@@ -45,10 +48,38 @@ def test_build_guard(
     if expect_exit:
         assert result.exit_code != 0
     else:
-        fake.assert_called_once_with(ksu, susfs, True)
+        fake.assert_called_once_with(
+            ksu, susfs, True, incremental=False, artifacts=["anykernel3", "boot"]
+        )
         assert result.exit_code == 0
 
 
+def test_build_incremental(mocker: MockerFixture) -> None:
+    fake: MockType = mocker.patch("cli.KernelBuilder", autospec=True)
+    result: Result = runner.invoke(app, ["build", "--ksu", "NEXT", "--incremental"])
+
+    assert result.exit_code == 0
+    fake.assert_called_once_with(
+        "NEXT", False, False, incremental=True, artifacts=["anykernel3", "boot"]
+    )
+
+
+def test_build_artifacts(mocker: MockerFixture) -> None:
+    fake: MockType = mocker.patch("cli.KernelBuilder", autospec=True)
+    result: Result = runner.invoke(
+        app, ["build", "--ksu", "NEXT", "-a", "modules", "--artifact", "vmlinux"]
+    )
+
+    assert result.exit_code == 0
+    fake.assert_called_once_with(
+        "NEXT", False, False, incremental=False, artifacts=["modules", "vmlinux"]
+    )
+
+    result = runner.invoke(app, ["build", "--artifact", "dtbo"])
+    assert result.exit_code == 1
+    assert "Unknown artifact 'dtbo'" in result.output
+
+
 @pytest.fixture()
 def clean_init(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
     fake: Path = tmp_path / "out_dir"
@@ -93,3 +124,30 @@ def test_clean_all(tmp_path: Path, clean_init):
     assert result.output.strip() == "Cleanup completed!"
     assert list(fake.iterdir()) == [fake / "fake_root"]
     assert list((fake / "fake_root").iterdir()) == []
+
+
+def test_toolchain_prune(mocker: MockerFixture) -> None:
+    fake: MockType = mocker.patch("cli.ToolchainStore", autospec=True)
+    fake.return_value.prune.return_value = []
+    result: Result = runner.invoke(
+        app, ["toolchain", "prune", "--keep", "2", "-o", "3"]
+    )
+
+    assert result.exit_code == 0
+    fake.return_value.prune.assert_called_once_with(keep=2, older_than=3 * 86400)
+
+
+def test_build_trace(mocker: MockerFixture, tmp_path: Path) -> None:
+    from kernel_builder.utils.trace import Tracer
+
+    tracer: Tracer = Tracer()
+    mocker.patch("cli.tracer", tracer)
+    fake: MockType = mocker.patch("cli.KernelBuilder", autospec=True)
+    fake.return_value.run_build.side_effect = lambda: tracer.instant("ran")
+    trace: Path = tmp_path / "trace.json"
+
+    result: Result = runner.invoke(app, ["build", "--trace", str(trace)])
+
+    assert result.exit_code == 0
+    events: list[dict] = json.loads(trace.read_text())["traceEvents"]
+    assert any(e["name"] == "ran" for e in events)
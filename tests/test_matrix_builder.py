@@ -0,0 +1,93 @@
+import json
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from kernel_builder import matrix_builder
+from kernel_builder.matrix_builder import MatrixBuilder, MatrixVariant
+
+
+def test_all_variants_match_release_matrix() -> None:
+    names: list[str] = [v.name for v in MatrixVariant.all()]
+
+    assert len(names) == 14
+    assert "Non-KSU-SUSFS" not in names
+    assert MatrixVariant.parse("ksun-susfs-lxc") == MatrixVariant("NEXT", True, True)
+    with pytest.raises(ValueError):
+        MatrixVariant.parse("KSU-FOO")
+
+
+@pytest.fixture
+def fake_cli(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, mocker: MockerFixture
+) -> Path:
+    # A stand-in cli.py that records its arguments and environment
+    (tmp_path / "cli.py").write_text(
+        "import json, os, sys\n"
+        "env = {k: v for k, v in os.environ.items() if k.startswith('GKI_')}\n"
+        "out = os.environ['GKI_OUTPUT']\n"
+        "os.makedirs(out, exist_ok=True)\n"
+        "open(os.path.join(out, 'args.json'), 'w').write(json.dumps([sys.argv[1:], env]))\n"
+        "name = os.path.basename(os.path.dirname(out))\n"
+        "open(os.path.join(out, f'ESK-5.10.236-{name}-boot.img'), 'w').write(name)\n"
+        # Has a variant name in it, but is no artifact of this variant
+        "open(os.path.join(out, f'ESK-5.10.236-{name}-LXC-boot.img'), 'w').write(name)\n"
+        "os.makedirs(os.path.join(out, 'patches'), exist_ok=True)\n"
+        "open(os.path.join(out, 'patches', 'lxc.json'), 'w').write(name)\n"
+        "sys.exit(1 if '--lxc' in sys.argv else 0)\n"
+    )
+    monkeypatch.setattr(matrix_builder, "ROOT", tmp_path)
+    monkeypatch.setattr(matrix_builder, "OUTPUT", tmp_path / "dist")
+    mocker.patch.object(MatrixBuilder, "setup")
+    return tmp_path
+
+
+def test_build_runs_isolated_child(fake_cli: Path) -> None:
+    tmp_path: Path = fake_cli
+    variants = [MatrixVariant("NEXT", True, False), MatrixVariant("NONE", False, True)]
+    for variant in variants:
+        (tmp_path / "matrix" / variant.name).mkdir(parents=True)
+    results = MatrixBuilder(variants, jobs=2, root=tmp_path / "matrix").run()
+
+    ok = {r.variant.name: r.ok for r in results}
+    assert ok == {"KSUN-SUSFS": True, "Non-KSU-LXC": False}
+
+    # Artifacts side by side, reports of each variant in its own directory
+    dist: Path = tmp_path / "dist"
+    assert (dist / "ESK-5.10.236-KSUN-SUSFS-boot.img").read_text() == "KSUN-SUSFS"
+    assert not (dist / "ESK-5.10.236-KSUN-SUSFS-LXC-boot.img").exists()
+    assert (dist / "KSUN-SUSFS" / "ESK-5.10.236-KSUN-SUSFS-LXC-boot.img").exists()
+    assert (dist / "KSUN-SUSFS" / "patches" / "lxc.json").read_text() == "KSUN-SUSFS"
+    assert not (dist / "Non-KSU-LXC").exists()
+    args, env = json.loads((dist / "KSUN-SUSFS" / "args.json").read_text())
+    assert args == ["build", "--ksu", "NEXT", "--susfs", "--no-lxc"]
+    assert env["GKI_WORKSPACE"] == str(tmp_path / "matrix" / "KSUN-SUSFS" / "kernel")
+    assert env["GKI_LOCKFILE"] == str(tmp_path / "matrix" / "sources.lock")
+    assert env["GKI_TOOLCHAIN_READONLY"] == "1"
+
+
+def test_sequential_builds_share_one_tree_in_delta_order(fake_cli: Path) -> None:
+    variants = [
+        MatrixVariant("NONE", False, False),
+        MatrixVariant("NEXT", True, False),
+        MatrixVariant("NONE", False, True),
+        MatrixVariant("NEXT", False, False),
+    ]
+    builder = MatrixBuilder(variants, jobs=1, root=fake_cli / "matrix")
+    results = builder.run()
+
+    for name in ("Non-KSU", "KSUN", "KSUN-SUSFS"):
+        assert (fake_cli / "dist" / name / "args.json").exists()
+
+    assert [r.variant.name for r in results] == [
+        "Non-KSU",
+        "KSUN",
+        "KSUN-SUSFS",
+        "Non-KSU-LXC",
+    ]
+    args, env = json.loads(
+        (fake_cli / "matrix" / "Non-KSU" / "dist" / "args.json").read_text()
+    )
+    assert "--incremental" in args
+    assert env["GKI_WORKSPACE"] == str(fake_cli / "matrix" / "kernel")
@@ -0,0 +1,95 @@
+import io
+import json
+import tarfile
+from pathlib import Path
+
+import pytest
+
+from kernel_builder.utils import ccache
+from kernel_builder.utils.ccache import Ccache
+
+STATS: str = (
+    "stats_updated_timestamp\t1700000000\n"
+    "direct_cache_hit\t{hits}\n"
+    "preprocessed_cache_hit\t0\n"
+    "cache_miss\t{misses}\n"
+    "called_for_link\t2\n"
+    "files_in_cache\t{files}\n"
+    "cache_size_kibibyte\t2048\n"
+)
+
+
+@pytest.fixture
+def fake_ccache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    bin_dir: Path = tmp_path / "bin"
+    bin_dir.mkdir()
+    script: Path = bin_dir / "ccache"
+    script.write_text(
+        '#!/bin/sh\n[ "$1" = --print-stats ] && cat "$CCACHE_DIR/fake-stats"\n'
+        'echo "$@" >> "$CCACHE_DIR/fake-calls"\n'
+    )
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:/usr/bin:/bin")
+    monkeypatch.setattr(ccache, "clang_hash", lambda binary=None: "ab" * 32)
+    return tmp_path / "ccache"
+
+
+def _stats(cache: Ccache, **counters: int) -> None:
+    assert cache.dir is not None
+    (cache.dir / "fake-stats").write_text(STATS.format(**counters))
+
+
+def test_namespace_profile_and_report(fake_ccache: Path, tmp_path: Path) -> None:
+    cache = Ccache(fake_ccache, seed=None, basedir=tmp_path / "matrix" / "kernel")
+    assert cache.compiler("clang") == "ccache clang"
+    assert cache.env() == {}
+
+    cache.dir = fake_ccache / ("ab" * 8)
+    cache.dir.mkdir(parents=True)
+    _stats(cache, hits=10, misses=100, files=50)
+    cache.prepare()
+    env: dict[str, str] = cache.env()
+    assert env["CCACHE_DIR"] == str(fake_ccache / "abababababababab")
+    assert env["CCACHE_COMPILERCHECK"] == "content"
+    assert env["CCACHE_BASEDIR"] == str(tmp_path / "matrix" / "kernel")
+
+    _stats(cache, hits=310, misses=200, files=150)
+    report = cache.report(jobs=4, dest=tmp_path / "dist" / "ccache.json")
+
+    assert report is not None
+    assert (report.hits, report.misses, report.uncacheable) == (300, 100, 0)
+    assert report.hit_rate == 0.75
+    assert report.size == 2 << 20
+    assert json.loads((tmp_path / "dist" / "ccache.json").read_text())["files"] == 150
+
+
+def test_prewarm_imports_entries_only(fake_ccache: Path, tmp_path: Path) -> None:
+    seed: Path = tmp_path / "seed.tar.gz"
+    with tarfile.open(seed, "w:gz") as tar:
+        for name, data in (
+            ("a/b/entry.result", b"obj"),
+            ("a/stats", b"1"),
+            ("ccache.conf", b"x"),
+        ):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    # An empty namespace is seeded on prepare
+    cache = Ccache(fake_ccache, seed=seed)
+    cache.prepare()
+    assert cache.dir is not None
+    assert (cache.dir / "a" / "b" / "entry.result").read_bytes() == b"obj"
+    assert not (cache.dir / "a" / "stats").exists()
+    assert not (cache.dir / "ccache.conf").exists()
+    assert "--cleanup" in (cache.dir / "fake-calls").read_text()
+
+
+def test_without_ccache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("PATH", str(tmp_path))
+    cache = Ccache(tmp_path / "ccache", seed=None)
+    cache.prepare()
+
+    assert cache.compiler("clang") == "clang"
+    assert cache.env() == {}
+    assert cache.report(jobs=4) is None
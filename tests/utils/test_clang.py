@@ -0,0 +1,53 @@
+from pathlib import Path
+
+import pytest
+
+from kernel_builder.utils import clang
+from kernel_builder.utils.clang import clang_hash, clang_version, parse_clang_version
+
+CLANG_V: str = (
+    "Android (12285214, based on r522817b) clang version 18.0.2 "
+    "(https://android.googlesource.com/toolchain/llvm-project d8003a456d14a3deb8054cdaa529ffbf02d9b262)\n"
+    "Target: x86_64-unknown-linux-gnu\n"
+)
+
+
+@pytest.fixture
+def fake_clang(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(clang, "CLANG_CACHE", tmp_path / "clang.json")
+    calls: Path = tmp_path / "calls"
+    binary: Path = tmp_path / "clang-18"
+    binary.write_text(f"#!/bin/sh\necho x >> {calls}\ncat >&2 <<'EOF'\n{CLANG_V}EOF\n")
+    binary.chmod(0o755)
+    return binary
+
+
+def test_parse_clang_version() -> None:
+    assert (
+        parse_clang_version(CLANG_V)
+        == "Android (12285214, based on r522817b) clang 18.0.2"
+    )
+
+
+def test_clang_version_cached_by_hash(fake_clang: Path, mocker) -> None:
+    assert (
+        clang_version(fake_clang)
+        == "Android (12285214, based on r522817b) clang 18.0.2"
+    )
+    digest = mocker.spy(clang.hashlib, "sha256")
+
+    assert (
+        clang_version(fake_clang)
+        == "Android (12285214, based on r522817b) clang 18.0.2"
+    )
+
+    # Neither re-run nor re-hashed while the binary is unchanged
+    assert (fake_clang.parent / "calls").read_text().count("x") == 1
+    digest.assert_not_called()
+
+
+def test_clang_hash_follows_content(fake_clang: Path) -> None:
+    before: str = clang_hash(fake_clang)
+    fake_clang.write_text(fake_clang.read_text() + "# rebuilt\n")
+
+    assert clang_hash(fake_clang) != before
@@ -0,0 +1,164 @@
+import csv
+import os
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from kernel_builder.constants import CC_TIME
+from kernel_builder.utils.compile_profile import (
+    CompileProfile,
+    CompileRecord,
+    CompileReport,
+    KbuildStep,
+)
+
+FAKE_CC: str = """\
+#!/bin/sh
+case "$*" in *slow*) sleep 0.3 ;; esac
+case "$*" in *broken*) exit 1 ;; esac
+exit 0
+"""
+
+
+@pytest.fixture()
+def profile(tmp_path: Path) -> CompileProfile:
+    (tmp_path / "out").mkdir()
+    cc: Path = tmp_path / "fakecc"
+    cc.write_text(FAKE_CC)
+    cc.chmod(0o755)
+    return CompileProfile(tmp_path / "out", enabled=True)
+
+
+def _compile(profile: CompileProfile, obj: str, src: str) -> int:
+    cc: Path = profile.out_dir.parent / "fakecc"
+    # The same command line Kbuild runs from out/
+    return subprocess.run(
+        [*profile.compiler(str(cc)).split(), "-O2", "-c", "-o", obj, src],
+        cwd=profile.out_dir,
+        env={"PATH": "/usr/bin:/bin", **profile.env()},
+    ).returncode
+
+
+def test_compiler_is_wrapped_only_when_enabled(tmp_path: Path) -> None:
+    assert (
+        CompileProfile(tmp_path).compiler("ccache clang") == f"{CC_TIME} ccache clang"
+    )
+    assert CompileProfile(tmp_path, enabled=False).compiler("clang") == "clang"
+    assert CompileProfile(tmp_path, enabled=False).env() == {}
+
+
+def test_wrapper_passes_through_without_log(profile: CompileProfile) -> None:
+    cc: Path = profile.out_dir.parent / "fakecc"
+    result = subprocess.run(
+        [CC_TIME, cc, "-c", "-o", "broken.o", "../broken.c"],
+        env={"PATH": "/usr/bin:/bin"},
+    )
+    assert result.returncode == 1
+    assert not profile.log.exists()
+
+
+def test_records_are_timed_and_sorted(profile: CompileProfile) -> None:
+    profile.begin()
+    assert _compile(profile, "init/main.o", "../init/main.c") == 0
+    assert (
+        _compile(profile, "drivers/gpu/mali/slow.o", "../drivers/gpu/mali/slow.c") == 0
+    )
+    assert _compile(profile, "drivers/broken.o", "../drivers/broken.c") == 1
+    # Kconfig style compiler probe
+    assert _compile(profile, ".tmp_123.o", "../probe.c") == 0
+    profile.finish()
+
+    records = profile.records()
+
+    assert [r.obj for r in records][0] == "drivers/gpu/mali/slow.o"
+    assert {r.obj for r in records} == {
+        "init/main.o",
+        "drivers/gpu/mali/slow.o",
+        "drivers/broken.o",
+    }
+    slow = records[0]
+    assert slow.seconds >= 0.3
+    assert slow.source == os.path.realpath(
+        profile.out_dir.parent / "drivers/gpu/mali/slow.c"
+    )
+    assert {r.obj: r.status for r in records}["drivers/broken.o"] == 1
+
+
+def test_ccache_results_are_joined(profile: CompileProfile) -> None:
+    profile.begin()
+    _compile(profile, "init/main.o", "../init/main.c")
+    _compile(profile, "kernel/fork.o", "../kernel/fork.c")
+    _compile(profile, "kernel/sys.o", "../kernel/sys.c")
+    profile.statslog.write_text(
+        "# ../init/main.c\ndirect_cache_hit\n"
+        "# ../kernel/fork.c\ncache_miss\n"
+        "# ../kernel/sys.c\nunsupported_compiler_option\n"
+    )
+    profile.finish()
+
+    cache = {r.obj: r.cache for r in profile.records()}
+
+    assert cache == {
+        "init/main.o": "hit",
+        "kernel/fork.o": "miss",
+        "kernel/sys.o": "unsupported_compiler_option",
+    }
+
+
+def test_kbuild_output_and_serial_tail(
+    profile: CompileProfile, capsys: pytest.CaptureFixture[str]
+) -> None:
+    profile.begin()
+    _compile(profile, "init/main.o", "../init/main.c")
+    for line in (
+        "  CC      init/main.o\n",
+        "  CC [M]  drivers/foo.ko\n",
+        "warning: something\n",
+    ):
+        profile.parse(line)
+    assert [(s.tag, s.target) for s in profile.steps] == [
+        ("CC", "init/main.o"),
+        ("CC", "drivers/foo.ko"),
+    ]
+    assert "warning: something" in capsys.readouterr().out
+
+    last: float = profile.records()[0].end
+    profile.steps = [
+        KbuildStep("CC", "init/main.o", last - 1),
+        KbuildStep("LTO", "vmlinux.o", last + 1),
+        KbuildStep("LD", "vmlinux", last + 4),
+    ]
+    profile.end = last + 5
+
+    report: CompileReport | None = profile.report(dest=profile.out_dir / "times.csv")
+
+    assert report is not None
+    assert report.tail == pytest.approx(5)
+    assert [(s.tag, round(t)) for s, t in report.tail_steps] == [("LTO", 3), ("LD", 1)]
+    with (profile.out_dir / "times.csv").open() as f:
+        rows = list(csv.DictReader(f))
+    assert [row["object"] for row in rows] == ["init/main.o"]
+
+
+def test_directories_sum_per_subsystem() -> None:
+    report: CompileReport = CompileReport(records=[], elapsed=0, tail=0)
+    report.records = [
+        CompileRecord("drivers/gpu/mali/a.o", "", 0, 4, 0),
+        CompileRecord("drivers/gpu/mali/b.o", "", 0, 3, 0),
+        CompileRecord("drivers/usb/c.o", "", 0, 2, 0),
+        CompileRecord("init/main.o", "", 0, 1, 0),
+    ]
+
+    assert report.directories() == [
+        ("drivers/gpu", 7, 2),
+        ("drivers/usb", 2, 1),
+        ("init", 1, 1),
+    ]
+
+
+def test_report_disabled_or_empty(profile: CompileProfile, tmp_path: Path) -> None:
+    assert CompileProfile(tmp_path, enabled=False).report() is None
+    profile.begin()
+    profile.finish()
+    assert profile.report() is None
@@ -0,0 +1,71 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from kernel_builder.utils.config_cache import ConfigCache
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    tree: Path = tmp_path / "kernel"
+    (tree / "arch" / "arm64" / "configs").mkdir(parents=True)
+    (tree / "arch" / "arm64" / "configs" / "gki_defconfig").write_text("CONFIG_KSU=y\n")
+    (tree / "Kconfig").write_text('source "drivers/Kconfig"\n')
+    (tree / "drivers").mkdir()
+    (tree / "drivers" / "Kconfig").write_text("config KSU\n\tbool\n")
+    (tree / "out").mkdir()
+    (tree / "out" / "Kconfig").write_text("ignored\n")
+    return tree
+
+
+def _key(cache: ConfigCache, tree: Path, **overrides: bool) -> str:
+    return cache.key(
+        tree,
+        tree / "arch" / "arm64" / "configs" / "gki_defconfig",
+        {"CONFIG_LTO_CLANG_THIN": True, **overrides},
+        fragments=[],
+        compiler="clang-18",
+        env={"ARCH": "arm64"},
+    )
+
+
+def test_key_follows_inputs(tree: Path, tmp_path: Path) -> None:
+    cache = ConfigCache(tmp_path / "cache")
+    key: str = _key(cache, tree)
+
+    assert _key(cache, tree) == key
+    assert _key(cache, tree, CONFIG_KSU=False) != key
+    (tree / "out" / "Kconfig").write_text("changed\n")
+    assert _key(cache, tree) == key
+    (tree / "drivers" / "Kconfig").write_text("config KSU\n\ttristate\n")
+    assert _key(cache, tree) != key
+
+
+def test_restore_keeps_identical_config(tree: Path, tmp_path: Path) -> None:
+    cache = ConfigCache(tmp_path / "cache")
+    dotconfig: Path = tree / "out" / ".config"
+    assert not cache.restore("k", dotconfig)
+
+    dotconfig.write_text("CONFIG_KSU=y\n")
+    cache.store("k", dotconfig)
+    mtime: int = dotconfig.stat().st_mtime_ns
+    assert cache.restore("k", dotconfig)
+    assert dotconfig.stat().st_mtime_ns == mtime
+
+    dotconfig.unlink()
+    assert cache.restore("k", dotconfig)
+    assert dotconfig.read_text() == "CONFIG_KSU=y\n"
+    assert not ConfigCache(None).restore("k", dotconfig)
+
+
+def test_prune_keeps_most_recent(tmp_path: Path) -> None:
+    cache = ConfigCache(tmp_path / "cache")
+    config: Path = tmp_path / ".config"
+    config.write_text("x\n")
+    for i, key in enumerate("abc"):
+        cache.store(key, config)
+        os.utime(tmp_path / "cache" / f"{key}.config", (i, i))
+
+    cache.prune(keep=2)
+    assert sorted(p.stem for p in (tmp_path / "cache").iterdir()) == ["b", "c"]
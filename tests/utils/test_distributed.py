@@ -0,0 +1,203 @@
+import json
+import subprocess
+import sys
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from kernel_builder.constants import REMOTE_CC
+from kernel_builder.utils import clang
+from kernel_builder.utils.distributed import CompileServer, Worker, WorkerPool
+
+# Preprocesses by copying the source (and writing the -MF dep file), compiles
+# by prefixing its input with the directory it was installed in
+FAKE_CLANG: str = f"""\
+#!{sys.executable}
+import os, sys
+args = sys.argv[1:]
+out = args[args.index("-o") + 1] if "-o" in args else None
+if "-E" in args:
+    src = next(a for a in args if a.endswith(".c"))
+    if "-MF" in args:
+        open(args[args.index("-MF") + 1], "w").write(f"obj: {{src}}\\n")
+    sys.stdout.write(open(src).read())
+    sys.exit(0)
+if "-" in args:
+    text = sys.stdin.read()
+else:
+    text = open(next(a for a in args if a.endswith(".c"))).read()
+if "#error" in text or ("remote-only-error" in text and "worker" in __file__):
+    sys.stderr.write("error: failed\\n")
+    sys.exit(1)
+open(out, "w").write(os.path.basename(os.path.dirname(__file__)) + ":" + text)
+"""
+
+
+def _clang(path: Path) -> Path:
+    path.parent.mkdir(parents=True)
+    path.write_text(FAKE_CLANG)
+    path.chmod(0o755)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def clang_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(clang, "CLANG_CACHE", tmp_path / "clang.json")
+
+
+@pytest.fixture
+def local_clang(tmp_path: Path) -> Path:
+    return _clang(tmp_path / "local" / "clang")
+
+
+@pytest.fixture
+def server(tmp_path: Path, local_clang: Path) -> Iterator[CompileServer]:
+    # Same bytes as the local clang, so the hashes match
+    worker_clang: Path = _clang(tmp_path / "worker" / "clang")
+    with CompileServer(("127.0.0.1", 0), clang=worker_clang, jobs=2) as srv:
+        thread = threading.Thread(target=srv.serve_forever, daemon=True)
+        thread.start()
+        yield srv
+        srv.shutdown()
+
+
+def _spec(server: CompileServer) -> str:
+    host, port = server.server_address[:2]
+    return f"{host}:{port}"
+
+
+def _compile(pool: WorkerPool, cc: Path, cwd: Path, src: str) -> int:
+    (cwd / src).write_text(f"int {Path(src).stem};\n")
+    return subprocess.run(
+        [REMOTE_CC, cc, "-O2", "-MD", "-MF", f".{src}.d", "-c", "-o", f"{src}.o", src],
+        cwd=cwd,
+        env={"PATH": "/usr/bin:/bin", **pool.env()},
+    ).returncode
+
+
+def test_parse_worker_specs() -> None:
+    assert Worker.parse("build1") == Worker("build1", 3632)
+    assert Worker.parse("10.0.0.2:4000").address == ("10.0.0.2", 4000)
+    ssh: Worker = Worker.parse("ssh://me@build2:4000")
+    assert (ssh.host, ssh.port, ssh.name) == ("me@build2", 4000, "ssh://me@build2:4000")
+    assert Worker.parse("[fd00::2]:4000").address == ("fd00::2", 4000)
+    assert Worker.parse("fd00::2").address == ("fd00::2", 3632)
+    assert Worker.parse("[::1]").name == "[::1]:3632"
+    assert Worker.parse("ssh://me@[fd00::2]").host == "me@fd00::2"
+
+
+def test_prepare_verifies_toolchain(
+    tmp_path: Path, local_clang: Path, server: CompileServer
+) -> None:
+    other: Path = _clang(tmp_path / "other" / "clang")
+    other.write_text(FAKE_CLANG + "# another build\n")
+    with CompileServer(("127.0.0.1", 0), clang=other) as mismatched:
+        threading.Thread(target=mismatched.serve_forever, daemon=True).start()
+        pool = WorkerPool(
+            tmp_path,
+            [_spec(server), _spec(mismatched), "127.0.0.1:1"],
+        ).prepare(local_clang)
+        mismatched.shutdown()
+
+    assert [w.address for w in pool.workers] == [server.server_address[:2]]
+    assert pool.slots == 2
+    assert pool.env()["GKI_WORKERS_ACTIVE"] == f"{_spec(server)}/2"
+
+
+def test_ipv6_worker(tmp_path: Path, local_clang: Path) -> None:
+    try:
+        server = CompileServer(("::1", 0), clang=_clang(tmp_path / "worker" / "clang"))
+    except OSError:
+        pytest.skip("no IPv6 loopback")
+    with server:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        pool = WorkerPool(tmp_path, [f"[::1]:{server.server_address[1]}"])
+        pool.prepare(local_clang)
+        server.shutdown()
+
+    assert [w.host for w in pool.workers] == ["::1"]
+
+
+def test_without_workers_nothing_changes(tmp_path: Path) -> None:
+    pool: WorkerPool = WorkerPool(tmp_path, []).prepare()
+
+    assert pool.compiler("clang") == "clang"
+    assert pool.env() == {}
+    assert pool.report() == []
+
+
+def test_compiler_prefix_depends_on_ccache(tmp_path: Path) -> None:
+    assert WorkerPool(tmp_path, ["h"]).compiler("clang") == f"{REMOTE_CC} clang"
+    cached: WorkerPool = WorkerPool(tmp_path, ["h"], cached=True)
+    assert cached.compiler("ccache clang") == "ccache clang"
+    cached.workers = [Worker("h", 1, jobs=1)]
+    assert cached.env()["CCACHE_PREFIX"] == str(REMOTE_CC)
+
+
+def test_remote_compile(
+    tmp_path: Path, local_clang: Path, server: CompileServer
+) -> None:
+    pool: WorkerPool = WorkerPool(tmp_path, [_spec(server)]).prepare(local_clang)
+
+    assert _compile(pool, local_clang, tmp_path, "main.c") == 0
+
+    assert (tmp_path / "main.c.o").read_text() == "worker:int main;\n"
+    # The dep file Kbuild reads is written by the local preprocessor
+    assert (tmp_path / ".main.c.d").read_text() == "obj: main.c\n"
+    assert server.compiled == 1
+
+
+def test_fallback_to_local(
+    tmp_path: Path, local_clang: Path, server: CompileServer
+) -> None:
+    pool: WorkerPool = WorkerPool(tmp_path, [_spec(server)]).prepare(local_clang)
+
+    # Fails on the worker only: compiled again locally
+    (tmp_path / "odd.c").write_text("remote-only-error\n")
+    result = subprocess.run(
+        [REMOTE_CC, local_clang, "-c", "-o", "odd.o", "odd.c"],
+        cwd=tmp_path,
+        env={"PATH": "/usr/bin:/bin", **pool.env()},
+    )
+    assert result.returncode == 0
+    assert (tmp_path / "odd.o").read_text() == "local:remote-only-error\n"
+
+    # Not a single C file: never sent
+    assert (
+        subprocess.run(
+            [REMOTE_CC, local_clang, "-E", "odd.c"],
+            cwd=tmp_path,
+            env=pool.env(),
+            capture_output=True,
+        ).returncode
+        == 0
+    )
+
+    # Worker gone after prepare
+    server.shutdown()
+    server.server_close()
+    assert _compile(pool, local_clang, tmp_path, "late.c") == 0
+    assert (tmp_path / "late.c.o").read_text() == "local:int late;\n"
+
+    stats = {s.name: s for s in pool.stats()}
+    assert stats[_spec(server)].fallbacks == 2
+    assert stats[_spec(server)].jobs == 0
+    assert stats["localhost"].jobs == 1
+
+
+def test_report_throughput(
+    tmp_path: Path, local_clang: Path, server: CompileServer
+) -> None:
+    pool: WorkerPool = WorkerPool(tmp_path, [_spec(server)]).prepare(local_clang)
+    for src in ("a.c", "b.c", "c.c"):
+        assert _compile(pool, local_clang, tmp_path, src) == 0
+
+    stats = pool.report(tmp_path / "workers.json")
+
+    assert [(s.name, s.jobs) for s in stats] == [(_spec(server), 3)]
+    assert stats[0].sent == len("int a;\n") * 3
+    report: dict = json.loads((tmp_path / "workers.json").read_text())
+    assert report["remote"] == 3
+    assert report["workers"][0]["received"] == len("worker:int a;\n") * 3
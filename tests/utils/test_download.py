@@ -0,0 +1,135 @@
+import hashlib
+import io
+import shutil
+import subprocess
+import tarfile
+import threading
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from kernel_builder.utils.download import ResumableStream, extract_zstd, stream_extract
+
+FILES: dict[str, bytes] = {
+    "clang/bin/clang": b"#!/bin/sh\necho clang\n",
+    "clang/lib/libLLVM.so": bytes(range(256)) * 4096,
+}
+
+
+def make_tar(compression: str = "") -> bytes:
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode=f"w:{compression}") as tar:
+        for name, data in FILES.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o755
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+class Archive(BaseHTTPRequestHandler):
+    # Class-level state set by the fixture
+    body: bytes = b""
+    drop_first: bool = False
+    requests: list[str | None] = []
+
+    def do_GET(self) -> None:
+        cls = type(self)
+        cls.requests.append(self.headers.get("Range"))
+        start: int = 0
+        if rng := self.headers.get("Range"):
+            start = int(rng.removeprefix("bytes=").split("-")[0])
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(cls.body) - 1}/{len(cls.body)}"
+            )
+        else:
+            self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(cls.body) - start))
+        self.end_headers()
+
+        data: bytes = cls.body[start:]
+        if cls.drop_first:
+            # Simulate a dropped connection halfway through the first response
+            cls.drop_first = False
+            self.wfile.write(data[: len(data) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def server() -> Iterator[tuple[str, type[Archive]]]:
+    Archive.requests = []
+    Archive.drop_first = False
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Archive)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", Archive
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def assert_extracted(dest: Path) -> None:
+    for name, data in FILES.items():
+        assert (dest / name).read_bytes() == data
+
+
+def test_resumes_after_dropped_connection(server) -> None:
+    url, handler = server
+    handler.body = make_tar("gz")
+    handler.drop_first = True
+
+    with ResumableStream(f"{url}/clang.tar.gz") as body:
+        data: bytes = body.read()
+
+    assert data == handler.body
+    assert handler.requests[0] is None
+    assert handler.requests[1] == f"bytes={len(handler.body) // 2}-"
+    assert body.digest.hexdigest() == hashlib.sha256(handler.body).hexdigest()
+
+
+def test_stream_extract_gz(server, tmp_path: Path) -> None:
+    url, handler = server
+    handler.body = make_tar("gz")
+    handler.drop_first = True
+
+    digest: str = stream_extract(f"{url}/clang.tar.gz", tmp_path)
+
+    assert_extracted(tmp_path)
+    assert digest == hashlib.sha256(handler.body).hexdigest()
+
+
+@pytest.mark.skipif(shutil.which("zstd") is None, reason="zstd not installed")
+def test_stream_extract_zst(server, tmp_path: Path) -> None:
+    url, handler = server
+    handler.body = subprocess.run(
+        ["zstd", "-c"], input=make_tar(), capture_output=True, check=True
+    ).stdout
+
+    digest: str = stream_extract(f"{url}/clang.tar.zst", tmp_path)
+
+    assert_extracted(tmp_path)
+    assert digest == hashlib.sha256(handler.body).hexdigest()
+
+
+class _FailingReader(io.RawIOBase):
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        raise ConnectionResetError("connection lost")
+
+
+@pytest.mark.skipif(shutil.which("zstd") is None, reason="zstd not installed")
+def test_extract_zst_reports_download_error(tmp_path: Path) -> None:
+    # The truncated archive is not what fails the extraction, the download is
+    with pytest.raises(ConnectionResetError):
+        extract_zstd(_FailingReader(), tmp_path)
@@ -0,0 +1,103 @@
+import io
+import os
+import tarfile
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from kernel_builder.utils import extract
+from kernel_builder.utils.extract import ParallelExtractor
+
+
+def add(tar: tarfile.TarFile, name: str, data: bytes = b"", **attrs) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = 0o644
+    info.mtime = 1_700_000_000
+    for key, value in attrs.items():
+        setattr(info, key, value)
+    tar.addfile(info, io.BytesIO(data) if data else None)
+
+
+def archive(build) -> io.BytesIO:
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        build(tar)
+    buf.seek(0)
+    return buf
+
+
+def test_extracts_tree(tmp_path: Path) -> None:
+    def build(tar: tarfile.TarFile) -> None:
+        add(tar, "clang", type=tarfile.DIRTYPE, mode=0o755)
+        add(tar, "clang/bin/clang", b"#!/bin/sh\n", mode=0o755)
+        add(tar, "clang/lib/a.so", b"same")
+        add(tar, "clang/lib/b.so", b"same")
+        add(tar, "clang/lib/c.so", b"other")
+        add(tar, "clang/bin/clang++", type=tarfile.SYMTYPE, linkname="clang")
+        add(tar, "clang/bin/cc", type=tarfile.LNKTYPE, linkname="clang/bin/clang")
+
+    stats = ParallelExtractor(tmp_path, workers=4).extract(archive(build), "r|gz")
+
+    root = tmp_path / "clang"
+    assert (root / "bin/clang").read_bytes() == b"#!/bin/sh\n"
+    assert os.access(root / "bin/clang", os.X_OK)
+    assert os.readlink(root / "bin/clang++") == "clang"
+    assert (root / "bin/cc").stat().st_ino == (root / "bin/clang").stat().st_ino
+    assert (root / "lib/a.so").stat().st_ino == (root / "lib/b.so").stat().st_ino
+    assert (root / "lib/c.so").read_bytes() == b"other"
+    assert int((root / "lib/c.so").stat().st_mtime) == 1_700_000_000
+    assert (stats.files, stats.links, stats.deduped) == (4, 2, 1)
+
+
+def test_later_entry_wins_without_touching_dedupe_copies(tmp_path: Path) -> None:
+    def build(tar: tarfile.TarFile) -> None:
+        add(tar, "a", b"v1")
+        add(tar, "b", b"v1")
+        add(tar, "a", b"v2")
+        add(tar, "c", b"v1")
+
+    ParallelExtractor(tmp_path, workers=2).extract(archive(build))
+
+    assert (tmp_path / "a").read_bytes() == b"v2"
+    assert (tmp_path / "b").read_bytes() == b"v1"
+    assert (tmp_path / "c").read_bytes() == b"v1"
+
+
+def test_symlink_replaces_directory(tmp_path: Path) -> None:
+    (tmp_path / "lib64" / "old").mkdir(parents=True)
+    (tmp_path / "lib64" / "old" / "stale.so").write_bytes(b"stale")
+
+    def build(tar: tarfile.TarFile) -> None:
+        add(tar, "lib", type=tarfile.DIRTYPE, mode=0o755)
+        add(tar, "lib/a.so", b"a")
+        add(tar, "lib64", type=tarfile.DIRTYPE, mode=0o700)
+        add(tar, "lib64", type=tarfile.SYMTYPE, linkname="lib")
+
+    ParallelExtractor(tmp_path).extract(archive(build), "r|gz")
+
+    assert os.readlink(tmp_path / "lib64") == "lib"
+    assert (tmp_path / "lib64" / "a.so").read_bytes() == b"a"
+    # The directory entry's mode is not applied through the link
+    assert (tmp_path / "lib").stat().st_mode & 0o777 == 0o755
+
+
+def test_large_files_are_streamed(tmp_path: Path, mocker: MockerFixture) -> None:
+    mocker.patch.object(extract, "LARGE_FILE", 16)
+    data = os.urandom(1024)
+
+    ParallelExtractor(tmp_path).extract(
+        archive(lambda tar: add(tar, "lib/libLLVM.so", data))
+    )
+
+    assert (tmp_path / "lib/libLLVM.so").read_bytes() == data
+
+
+def test_rejects_unsafe_members(tmp_path: Path) -> None:
+    dest = tmp_path / "dest"
+
+    with pytest.raises(tarfile.FilterError):
+        ParallelExtractor(dest).extract(archive(lambda tar: add(tar, "../evil", b"x")))
+
+    assert not (tmp_path / "evil").exists()
@@ -35,3 +35,24 @@ class TestChangeDir:
         target.write_text("hello world")
         with pytest.raises(NotADirectoryError):
             FileSystem.cd(target)
+
+
+def test_lock_serializes(tmp_path: Path) -> None:
+    import threading
+
+    lock_file: Path = tmp_path / "locks" / "x.lock"
+    order: list[str] = []
+
+    def worker() -> None:
+        with FileSystem.lock(lock_file):
+            order.append("worker")
+
+    with FileSystem.lock(lock_file):
+        t = threading.Thread(target=worker)
+        t.start()
+        t.join(timeout=0.2)
+        order.append("main")
+    t.join()
+
+    assert lock_file.exists()
+    assert order == ["main", "worker"]
@@ -0,0 +1,98 @@
+import json
+import threading
+import time
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from kernel_builder.utils.github import GithubAPI
+
+RELEASE: dict = {
+    "tag_name": "v1.2.3",
+    "assets": [{"browser_download_url": "https://example.com/clang.tar.gz"}],
+}
+
+
+class Releases(BaseHTTPRequestHandler):
+    # Class-level state set by the fixture
+    requests: list[str | None] = []
+    remaining: int = 5000
+
+    def do_GET(self) -> None:
+        cls = type(self)
+        cls.requests.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+        else:
+            cls.remaining -= 1
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+        self.send_header("X-RateLimit-Remaining", str(cls.remaining))
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 30))
+        body: bytes = (
+            b"" if self.headers.get("If-None-Match") else json.dumps(RELEASE).encode()
+        )
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def api(monkeypatch: pytest.MonkeyPatch) -> Iterator[str]:
+    monkeypatch.setattr(GithubAPI, "_session", None)
+    monkeypatch.setattr(GithubAPI, "_memo", {})
+    monkeypatch.setattr(GithubAPI, "remaining", None)
+    Releases.requests = []
+    Releases.remaining = 5000
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Releases)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/repos/foo/bar/releases/latest"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_memoized_per_process(api: str, tmp_path: Path) -> None:
+    gh = GithubAPI(tmp_path)
+
+    assert gh.fetch_latest_tag(api) == "v1.2.3"
+    assert (
+        GithubAPI(tmp_path)
+        .fetch_latest_download_url(api, ".tar.gz")
+        .endswith("clang.tar.gz")
+    )
+
+    assert Releases.requests == [None]
+    assert GithubAPI.remaining == 4999
+
+
+def test_conditional_request_uses_disk_cache(
+    api: str, tmp_path: Path, monkeypatch
+) -> None:
+    GithubAPI(tmp_path).fetch_latest_tag(api)
+    # A new process: memo is gone, the disk cache is not
+    monkeypatch.setattr(GithubAPI, "_memo", {})
+
+    assert GithubAPI(tmp_path).fetch_latest_tag(api) == "v1.2.3"
+    assert Releases.requests == [None, '"v1"']
+    assert Releases.remaining == 4999
+
+
+def test_backs_off_when_rate_limit_is_low(
+    api: str, tmp_path: Path, mocker: MockerFixture
+) -> None:
+    sleep = mocker.patch("kernel_builder.utils.github.time.sleep")
+    Releases.remaining = 3
+
+    GithubAPI(None).fetch_latest_tag(api)
+    sleep.assert_not_called()
+    GithubAPI(None).fetch_latest_tag(api + "?page=2")
+
+    sleep.assert_called_once()
+    assert 0 < sleep.call_args[0][0] <= 30
@@ -0,0 +1,171 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from kernel_builder.constants import WORKSPACE
+from kernel_builder.utils.kconfig import KconfigFile
+
+DOTCONFIG: str = """\
+#
+# Automatically generated file; DO NOT EDIT.
+#
+CONFIG_KSU=y
+# CONFIG_LTO_CLANG_THIN is not set
+CONFIG_LTO_CLANG_FULL=y
+CONFIG_LOCALVERSION="-gki"
+CONFIG_NR_CPUS=8
+"""
+
+
+@pytest.fixture
+def dotconfig(tmp_path: Path) -> Path:
+    path: Path = tmp_path / ".config"
+    path.write_text(DOTCONFIG)
+    return path
+
+
+def test_edits_match_scripts_config(dotconfig: Path, tmp_path: Path) -> None:
+    fragment: Path = tmp_path / "lxc.config"
+    fragment.write_text("# LXC\nCONFIG_USER_NS=y\n# CONFIG_KSU is not set\n")
+
+    config = KconfigFile(dotconfig)
+    # Same as: scripts/config --enable LTO_CLANG_THIN --disable lto_clang_full
+    #   --set-str LOCALVERSION '-esk "x"' --set-val NR_CPUS 12 --enable KPM
+    #   --undefine CONFIG_KSU
+    config.update({"LTO_CLANG_THIN": True, "lto_clang_full": False})
+    config.set("LOCALVERSION", '-esk "x"')
+    config.set("NR_CPUS", 12)
+    config.enable("KPM")
+    config.undefine("CONFIG_KSU")
+    config.merge(fragment)
+    changes = config.save()
+
+    assert dotconfig.read_text() == (
+        "#\n"
+        "# Automatically generated file; DO NOT EDIT.\n"
+        "#\n"
+        "CONFIG_LTO_CLANG_THIN=y\n"
+        "# CONFIG_LTO_CLANG_FULL is not set\n"
+        'CONFIG_LOCALVERSION="-esk \\"x\\""\n'
+        "CONFIG_NR_CPUS=12\n"
+        "CONFIG_KPM=y\n"
+        "CONFIG_USER_NS=y\n"
+        "# CONFIG_KSU is not set\n"
+    )
+    assert changes == [
+        ("CONFIG_KSU", "y", "n"),
+        ("CONFIG_LTO_CLANG_THIN", "n", "y"),
+        ("CONFIG_LTO_CLANG_FULL", "y", "n"),
+        ("CONFIG_LOCALVERSION", "-gki", '-esk "x"'),
+        ("CONFIG_NR_CPUS", "8", "12"),
+        ("CONFIG_KPM", None, "y"),
+        ("CONFIG_USER_NS", None, "y"),
+    ]
+    assert KconfigFile(dotconfig).state("localversion") == '-esk "x"'
+
+
+def test_unchanged_file_is_not_rewritten(dotconfig: Path) -> None:
+    mtime: int = dotconfig.stat().st_mtime_ns
+    config = KconfigFile(dotconfig)
+    config.update({"CONFIG_KSU": True, "CONFIG_LTO_CLANG_THIN": False})
+
+    assert config.save() == []
+    assert dotconfig.stat().st_mtime_ns == mtime
+
+
+# The same edits as scripts/config arguments, and the file scripts/config
+# leaves behind for them. Existing lines are edited in place (every line of
+# a symbol), new symbols are appended in order and --undefine drops lines.
+SCRIPTS_CONFIG_INPUT: str = """\
+#
+# Automatically generated file; DO NOT EDIT.
+#
+CONFIG_KSU=y
+# CONFIG_LTO_CLANG_THIN is not set
+CONFIG_LTO_CLANG_FULL=y
+CONFIG_DEBUG_INFO=y
+CONFIG_LOCALVERSION="-gki"
+CONFIG_NR_CPUS=8
+# CONFIG_DEBUG_INFO is not set
+"""
+SCRIPTS_CONFIG_ARGS: list[str] = [
+    *("--disable", "LTO_CLANG_FULL"),
+    *("--enable", "lto_clang_thin"),
+    *("--module", "ZRAM"),
+    *("--set-val", "NR_CPUS", "12"),
+    *("--set-str", "LOCALVERSION", '-esk "x"'),
+    *("--set-str", "CMDLINE", "console=ttyS0"),
+    *("--undefine", "KSU"),
+    *("--enable", "CONFIG_KPM"),
+    *("--disable", "DEBUG_INFO"),
+]
+SCRIPTS_CONFIG_OUTPUT: str = """\
+#
+# Automatically generated file; DO NOT EDIT.
+#
+CONFIG_LTO_CLANG_THIN=y
+# CONFIG_LTO_CLANG_FULL is not set
+# CONFIG_DEBUG_INFO is not set
+CONFIG_LOCALVERSION="-esk \\"x\\""
+CONFIG_NR_CPUS=12
+# CONFIG_DEBUG_INFO is not set
+CONFIG_ZRAM=m
+CONFIG_CMDLINE="console=ttyS0"
+CONFIG_KPM=y
+"""
+
+
+def _run_scripts_config(config: KconfigFile, argv: list[str]) -> None:
+    # scripts/config's command line, mapped to KconfigFile calls
+    args = iter(argv)
+    for option in args:
+        name: str = next(args)
+        match option:
+            case "--enable":
+                config.enable(name)
+            case "--disable":
+                config.disable(name)
+            case "--module":
+                config.module(name)
+            case "--set-val":
+                config.set_val(name, next(args))
+            case "--set-str":
+                config.set_str(name, next(args))
+            case "--undefine":
+                config.undefine(name)
+            case _:
+                raise ValueError(option)
+
+
+def test_matches_scripts_config_output(tmp_path: Path) -> None:
+    path: Path = tmp_path / ".config"
+    path.write_text(SCRIPTS_CONFIG_INPUT)
+
+    config = KconfigFile(path)
+    _run_scripts_config(config, SCRIPTS_CONFIG_ARGS)
+    config.save()
+
+    assert path.read_text() == SCRIPTS_CONFIG_OUTPUT
+
+
+@pytest.mark.skipif(
+    not (WORKSPACE / "scripts" / "config").exists(),
+    reason="needs a kernel tree with scripts/config",
+)
+def test_matches_kernel_scripts_config(tmp_path: Path) -> None:
+    ours: Path = tmp_path / "ours.config"
+    theirs: Path = tmp_path / "theirs.config"
+    ours.write_text(SCRIPTS_CONFIG_INPUT)
+    theirs.write_text(SCRIPTS_CONFIG_INPUT)
+
+    config = KconfigFile(ours)
+    _run_scripts_config(config, SCRIPTS_CONFIG_ARGS)
+    config.save()
+    subprocess.run(
+        ["bash", WORKSPACE / "scripts" / "config", "--file", theirs]
+        + SCRIPTS_CONFIG_ARGS,
+        check=True,
+    )
+
+    assert ours.read_text() == theirs.read_text() == SCRIPTS_CONFIG_OUTPUT
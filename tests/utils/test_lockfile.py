@@ -0,0 +1,27 @@
+from pathlib import Path
+import json
+import pytest
+from kernel_builder.utils.lockfile import SourceLock
+
+
+def test_lock_roundtrip(tmp_path: Path) -> None:
+    path: Path = tmp_path / "sources.lock"
+    lock: SourceLock = SourceLock()
+    lock.pin("github.com:foo/bar", "main", "a" * 40)
+    lock.pin("github.com:foo/ksu", "next", "b" * 40, kernelsu=True)
+    lock.save(path)
+
+    loaded = SourceLock.load(path)
+    assert loaded is not None
+    assert loaded.commit("github.com:foo/bar", "main") == "a" * 40
+    assert loaded.commit("github.com:foo/ksu", "next", kernelsu=True) == "b" * 40
+    assert loaded.commit("github.com:foo/ksu", "next") is None
+
+
+def test_lock_missing_and_version(tmp_path: Path) -> None:
+    path: Path = tmp_path / "sources.lock"
+    assert SourceLock.load(path) is None
+
+    path.write_text(json.dumps({"version": 99}))
+    with pytest.raises(ValueError):
+        SourceLock.load(path)
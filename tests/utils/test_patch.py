@@ -1,42 +1,193 @@
-from sh import RunningCommand
+import json
 from pathlib import Path
-import subprocess
-from types import SimpleNamespace
+
 import pytest
-from pytest_mock import MockerFixture
-from kernel_builder.utils.command import apply_patch
+
+from kernel_builder.utils.command import apply_patch, is_patch_applied
+from kernel_builder.utils.patch import PatchError, PatchResult, apply, parse
+
+ORIGINAL: str = "".join(f"line {n}\n" for n in range(1, 21))
+
+PATCH: str = """\
+From 0000000000000000000000000000000000000000 Mon Sep 17 00:00:00 2001
+From: Someone <someone@example.com>
+Subject: [PATCH] Change two places
+
+---
+ src/main.c | 4 +++-
+ 1 file changed, 3 insertions(+), 1 deletion(-)
+
+diff --git a/src/main.c b/src/main.c
+index 1111111..2222222 100644
+--- a/src/main.c
++++ b/src/main.c
+@@ -2,7 +2,8 @@ header
+ line 2
+ line 3
+ line 4
+-line 5
++line five
++line 5.5
+ line 6
+ line 7
+ line 8
+@@ -15,3 +16,4 @@
+ line 15
+ line 16
+ line 17
++line 17.5
+--
+2.43.0
+"""
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.c").write_text(ORIGINAL)
+    return tmp_path
 
 
 @pytest.fixture
 def dummy_patch(tmp_path: Path) -> Path:
     p: Path = tmp_path / "fix.patch"
-    p.write_text("--- a/README.md\n+++ b/README.md\n@@\n-old line\n+new line\n")
+    p.write_text(PATCH)
     return p
 
 
-def test_patch_success(mocker: MockerFixture, dummy_patch: Path):
-    fake_proc: SimpleNamespace = SimpleNamespace(returncode=0, stdout=b"", stderr=b"")
-    spy_run = mocker.patch(
-        "kernel_builder.utils.command.patch",
-        return_value=fake_proc,
-    )
-    result: RunningCommand = apply_patch(dummy_patch)
-    spy_run.assert_called_once_with(
-        _in=dummy_patch.read_bytes(),
-        _cwd=str(Path.cwd()),
-        _ok_code=[0],
+def _patched() -> str:
+    lines: list[str] = ORIGINAL.splitlines(keepends=True)
+    lines[4:5] = ["line five\n", "line 5.5\n"]
+    lines.insert(18, "line 17.5\n")
+    return "".join(lines)
+
+
+def test_parse_git_format_patch() -> None:
+    (fp,) = parse(PATCH)
+
+    assert (fp.old_path, fp.new_path) == ("src/main.c", "src/main.c")
+    assert [(h.old_start, h.old_len, h.new_len) for h in fp.hunks] == [
+        (2, 7, 8),
+        (15, 3, 4),
+    ]
+    assert fp.hunks[0].section == "header"
+    assert fp.hunks[0].context() == (3, 3)
+
+
+def test_patch_success(tree: Path, dummy_patch: Path) -> None:
+    result: PatchResult = apply_patch(
+        dummy_patch, cwd=tree, report=tree / "report.json"
     )
-    assert result is fake_proc
 
+    assert (tree / "src" / "main.c").read_text() == _patched()
+    assert result.summary() == {"applied": 2, "already applied": 0, "failed": 0}
+    report: dict = json.loads((tree / "report.json").read_text())
+    assert [h["status"] for h in report["files"][0]["hunks"]] == ["applied"] * 2
+
+
+def test_patch_is_idempotent(tree: Path, dummy_patch: Path) -> None:
+    assert not is_patch_applied(dummy_patch, cwd=tree)
+    apply_patch(dummy_patch, cwd=tree)
+    mtime: int = (tree / "src" / "main.c").stat().st_mtime_ns
+
+    assert is_patch_applied(dummy_patch, cwd=tree)
+    result: PatchResult = apply_patch(dummy_patch, cwd=tree)
+
+    assert result.already_applied
+    # Nothing is rewritten, so Kbuild has nothing to rebuild
+    assert (tree / "src" / "main.c").stat().st_mtime_ns == mtime
 
-def test_patch_failure(mocker: MockerFixture, dummy_patch: Path):
-    err = subprocess.CalledProcessError(1, ["patch"])
-    mocker.patch(
-        "kernel_builder.utils.command.patch",
-        side_effect=err,
+
+def test_offset_and_fuzz(tree: Path, dummy_patch: Path) -> None:
+    lines: list[str] = ORIGINAL.splitlines(keepends=True)
+    # Moved down by three lines, and the first hunk's outer context edited
+    lines[1] = "line 2 (edited)\n"
+    (tree / "src" / "main.c").write_text("new\n" * 3 + "".join(lines))
+
+    result: PatchResult = apply(dummy_patch, tree)
+
+    first, second = result.files[0].hunks
+    assert (first.status, first.offset, first.fuzz) == ("applied", 3, 1)
+    assert (second.status, second.line, second.fuzz) == ("applied", 19, 0)
+    assert "line five\nline 5.5\n" in (tree / "src" / "main.c").read_text()
+
+
+def test_partially_applied(tree: Path, dummy_patch: Path) -> None:
+    text: str = ORIGINAL.replace("line 5\n", "line five\nline 5.5\n")
+    (tree / "src" / "main.c").write_text(text)
+
+    result: PatchResult = apply_patch(dummy_patch, cwd=tree)
+
+    assert [h.status for _, h in result.hunks()] == ["already applied", "applied"]
+    assert (tree / "src" / "main.c").read_text() == _patched()
+
+
+def test_patch_failure(tree: Path, dummy_patch: Path) -> None:
+    conflicting: str = ORIGINAL.replace("line 5\n", "line 5 (theirs)\n")
+    (tree / "src" / "main.c").write_text(conflicting)
+
+    with pytest.raises(PatchError) as exc:
+        apply_patch(dummy_patch, cwd=tree, report=tree / "report.json")
+
+    assert exc.value.result is not None
+    assert [h.status for _, h in exc.value.result.hunks()] == ["failed", "applied"]
+    # Checked patches leave the tree alone when a hunk fails
+    assert (tree / "src" / "main.c").read_text() == conflicting
+    assert json.loads((tree / "report.json").read_text())["summary"]["failed"] == 1
+
+    # Without check the hunks that apply are written, like patch does
+    result: PatchResult = apply_patch(dummy_patch, cwd=tree, check=False)
+    assert [h.status for _, h in result.hunks()] == ["failed", "applied"]
+    assert "line 17.5\n" in (tree / "src" / "main.c").read_text()
+
+
+def test_dry_run_writes_nothing(tree: Path, dummy_patch: Path) -> None:
+    result: PatchResult = apply_patch(dummy_patch, cwd=tree, dry_run=True)
+
+    assert result.dry_run and not result.failed
+    assert (tree / "src" / "main.c").read_text() == ORIGINAL
+
+
+def test_git_file_operations(tree: Path, tmp_path: Path) -> None:
+    (tree / "old.txt").write_text("a\nb\n")
+    (tree / "gone.txt").write_text("x\n")
+    (tree / "run.sh").write_text("echo\n")
+    patch: Path = tmp_path / "files.patch"
+    patch.write_text(
+        "diff --git a/new.txt b/new.txt\n"
+        "new file mode 100644\n"
+        "index 0000000..1111111\n"
+        "--- /dev/null\n"
+        "+++ b/new.txt\n"
+        "@@ -0,0 +1,2 @@\n"
+        "+hello\n"
+        "+world\n"
+        "\\ No newline at end of file\n"
+        "diff --git a/gone.txt b/gone.txt\n"
+        "deleted file mode 100644\n"
+        "--- a/gone.txt\n"
+        "+++ /dev/null\n"
+        "@@ -1 +0,0 @@\n"
+        "-x\n"
+        "diff --git a/old.txt b/renamed.txt\n"
+        "similarity index 100%\n"
+        "rename from old.txt\n"
+        "rename to renamed.txt\n"
+        "diff --git a/run.sh b/run.sh\n"
+        "old mode 100644\n"
+        "new mode 100755\n"
     )
 
-    with pytest.raises(subprocess.CalledProcessError) as exc:
-        apply_patch(dummy_patch)
+    apply_patch(patch, cwd=tree)
+
+    assert (tree / "new.txt").read_text() == "hello\nworld"
+    assert not (tree / "gone.txt").exists()
+    assert not (tree / "old.txt").exists()
+    assert (tree / "renamed.txt").read_text() == "a\nb\n"
+    assert (tree / "run.sh").stat().st_mode & 0o777 == 0o755
+    assert is_patch_applied(patch, cwd=tree)
+
 
-    assert exc.value is err
+def test_missing_patch(tmp_path: Path) -> None:
+    with pytest.raises(FileNotFoundError):
+        apply_patch(tmp_path / "missing.patch")
@@ -0,0 +1,88 @@
+import os
+import shutil
+import subprocess
+import sys
+import sh
+from pathlib import Path
+
+import pytest
+
+from kernel_builder.utils import resources
+from kernel_builder.utils.resources import (
+    Jobserver,
+    MemoryStatus,
+    ResourceMonitor,
+    job_budget,
+    tree_rss,
+)
+
+GiB: int = 1 << 30
+
+MAKEFILE: str = """\
+all: a b c d e f
+a b c d e f:
+\t@mkdir -p running && touch running/$@ && ls running | wc -l >> concurrency
+\t@sleep 0.3; rm running/$@
+"""
+
+
+def test_job_budget_follows_memory_and_lto() -> None:
+    assert job_budget("thin", 16, MemoryStatus(6 * GiB, 16 * GiB, 0.0)) == 6
+    assert job_budget("full", 16, MemoryStatus(6 * GiB, 16 * GiB, 0.0)) == 3
+    assert job_budget("thin", 4, MemoryStatus(64 * GiB, 64 * GiB, None)) == 4
+    assert job_budget("full", 16, MemoryStatus(GiB // 2, 16 * GiB, 0.0)) == 1
+
+
+def _run_make(tmp_path: Path, js: Jobserver) -> int:
+    (tmp_path / "Makefile").write_text(MAKEFILE)
+    (tmp_path / "concurrency").unlink(missing_ok=True)
+    # Same invocation as Builder._make
+    sh.make(
+        "-s",
+        _cwd=tmp_path,
+        _env={"PATH": "/usr/bin:/bin", "MAKEFLAGS": js.makeflags},
+        _pass_fds=js.fds,
+    )
+    return max(int(n) for n in (tmp_path / "concurrency").read_text().split())
+
+
+@pytest.mark.skipif(shutil.which("make") is None, reason="make not installed")
+def test_make_draws_jobs_from_jobserver(tmp_path: Path) -> None:
+    with Jobserver(3) as js:
+        assert _run_make(tmp_path, js) <= 3
+        assert js.shrink() and js.shrink()
+        assert not js.shrink()
+        assert js.jobs == 1
+        assert _run_make(tmp_path, js) == 1
+        assert js.grow()
+        assert js.jobs == 2
+
+
+def test_monitor_throttles_on_pressure(monkeypatch: pytest.MonkeyPatch) -> None:
+    status = MemoryStatus(32 * GiB, 64 * GiB, 40.0)
+    monkeypatch.setattr(resources, "memory_status", lambda: status)
+
+    with Jobserver(4) as js:
+        monitor = ResourceMonitor(js, lto="thin", interval=60)
+        with monitor.phase("build") as phase:
+            monitor.sample()
+            monitor.sample()
+            assert js.jobs == 2
+            status.pressure = 0.0
+            monitor.sample()
+            assert js.jobs == 3
+
+    # Leaving the phase takes a last sample
+    assert js.jobs == 4
+    assert phase.peak_pressure == 40.0
+    assert (phase.min_jobs, phase.max_jobs) == (2, 4)
+
+
+def test_tree_rss_counts_children() -> None:
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(5)"])
+    try:
+        total, largest = tree_rss(os.getpid())
+        assert total >= largest > 0
+    finally:
+        child.kill()
+        child.wait()
@@ -1,24 +1,17 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import sh
 import pytest
 from pytest_mock import MockerFixture
-from kernel_builder.utils.source import SourceManager
+from kernel_builder.utils.lockfile import SourceLock
+from kernel_builder.utils.source import FetchStats, SourceManager
 from pytest_mock.plugin import MockType
 import importlib
 
 
-class FakeResp:
-    url = "https://github.com/torvalds/linux"
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc, tb):
-        pass
-
-
 def test_clone_sources_logs_and_calls(mocker: MockerFixture):
-    mocker.patch.object(SourceManager, "clone_repo", return_value=None)
+    mocker.patch.object(SourceManager, "clone_repo", return_value=FetchStats())
     spy_clone = mocker.spy(SourceManager, "clone_repo")
     spy_log: MockType = mocker.spy(
         importlib.import_module("kernel_builder.utils.source"), "log"
@@ -41,17 +34,377 @@ def test_clone_sources_logs_and_calls(mocker: MockerFixture):
     )
 
 
-def test_git_simplifier(mocker: MockerFixture):
-    mocker.patch("kernel_builder.utils.source.requests.get", return_value=FakeResp())
-
-    sm: SourceManager = SourceManager()
-    simplified: str = sm.git_simplifier("https://github.com/torvalds/linux")
-    assert simplified == "github.com:torvalds/linux"
-
-
 def test_restore_simplified():
     original = "github.com:foo/bar"
     full = SourceManager.restore_simplified(original)
     assert full == "https://github.com/foo/bar"
 
     assert SourceManager.restore_simplified(full) == full
+
+
+@pytest.fixture
+def bare_repos(tmp_path: Path) -> dict[str, str]:
+    """Create local bare repositories reachable through file:// URLs."""
+    repos: dict[str, str] = {}
+    for name in ("kernel", "anykernel", "tools"):
+        work: Path = tmp_path / "work" / name
+        (work / "keep" / "nested").mkdir(parents=True)
+        (work / "keep" / "nested" / "a.txt").write_text("a")
+        (work / "drop.bin").write_bytes(b"\0" * 4096)
+        (work / f"{name}.txt").write_text(name)
+        sh.git.init("-q", "-b", "main", str(work))
+        sh.git("-C", str(work), "add", ".")
+        sh.git(
+            "-C",
+            str(work),
+            "-c",
+            "user.name=test",
+            "-c",
+            "user.email=test@example.com",
+            "commit",
+            "-qm",
+            "init",
+        )
+        bare: Path = tmp_path / "remote" / f"{name}.git"
+        sh.git.clone("-q", "--bare", str(work), str(bare))
+        sh.git("-C", str(bare), "config", "uploadpack.allowFilter", "true")
+        sh.git("-C", str(bare), "config", "uploadpack.allowAnySHA1InWant", "true")
+        repos[name] = f"file://{bare}"
+    return repos
+
+
+def test_clone_sources_concurrent(tmp_path: Path, bare_repos: dict[str, str]):
+    ws: Path = tmp_path / "ws"
+    ws.mkdir()
+    sm: SourceManager = SourceManager(
+        sources=[
+            {"url": bare_repos["kernel"], "branch": "main", "to": str(ws)},
+            {"url": bare_repos["anykernel"], "branch": "main", "to": str(ws / "ak3")},
+            {"url": bare_repos["tools"], "branch": "main", "to": str(tmp_path / "tc")},
+        ],
+        jobs=3,
+        mirrors=None,
+    )
+    sm.clone_sources()
+
+    assert (ws / "kernel.txt").read_text() == "kernel"
+    assert (ws / "ak3" / "anykernel.txt").read_text() == "anykernel"
+    assert (tmp_path / "tc" / "tools.txt").read_text() == "tools"
+    assert not (ws / ".git").exists()
+
+
+def test_clone_sources_failure_cancels(tmp_path: Path, bare_repos: dict[str, str]):
+    sm: SourceManager = SourceManager(
+        sources=[
+            {
+                "url": bare_repos["kernel"],
+                "branch": "missing",
+                "to": str(tmp_path / "a"),
+            },
+            {
+                "url": bare_repos["tools"],
+                "branch": "main",
+                "to": str(tmp_path / "a" / "b"),
+            },
+        ],
+        jobs=2,
+        mirrors=None,
+    )
+    with pytest.raises(sh.ErrorReturnCode):
+        sm.clone_sources()
+
+    # The nested source never started because its parent failed
+    assert not (tmp_path / "a" / "b").exists()
+
+
+def test_clone_sources_unexpected_error(tmp_path: Path, mocker: MockerFixture):
+    sm: SourceManager = SourceManager(
+        sources=[
+            {"url": "https://example.com/a", "branch": "main", "to": str(tmp_path)}
+        ],
+        jobs=1,
+        mirrors=None,
+    )
+    mocker.patch.object(SourceManager, "clone_repo", side_effect=KeyError("bug"))
+    cancel: MockType = mocker.patch.object(SourceManager, "_cancel")
+
+    # Not a fetch failure: propagated as is, not reported as one
+    with pytest.raises(KeyError):
+        sm.clone_sources()
+    cancel.assert_called_once()
+
+
+def test_clone_from_mirror_cache(tmp_path: Path, bare_repos: dict[str, str]):
+    url: str = bare_repos["kernel"]
+    sm: SourceManager = SourceManager(
+        mirrors=tmp_path / "mirrors", state=tmp_path / "state.json"
+    )
+    source: dict[str, str] = {"url": url, "branch": "main", "to": str(tmp_path / "ws1")}
+    sm.clone_repo(source)
+
+    mirror: Path = sm.mirror_path(url)
+    assert (mirror / "HEAD").exists()
+    assert (tmp_path / "ws1" / "kernel.txt").read_text() == "kernel"
+
+    # Move upstream forward by one commit; the next checkout picks it up
+    work: Path = tmp_path / "work" / "kernel"
+    (work / "kernel.txt").write_text("updated")
+    sh.git(
+        "-C",
+        str(work),
+        "-c",
+        "user.name=test",
+        "-c",
+        "user.email=test@example.com",
+        "commit",
+        "-qam",
+        "update",
+    )
+    sh.git("-C", str(work), "push", "-q", url.removeprefix("file://"), "main")
+
+    sm.clone_repo({**source, "to": str(tmp_path / "ws2")})
+    assert (tmp_path / "ws2" / "kernel.txt").read_text() == "updated"
+    assert not (tmp_path / "ws2" / ".git").exists()
+
+
+@pytest.mark.parametrize("use_mirror", [True, False])
+def test_clone_fetch_profile(tmp_path: Path, bare_repos: dict[str, str], use_mirror):
+    sm: SourceManager = SourceManager(
+        mirrors=tmp_path / "mirrors" if use_mirror else None,
+        state=tmp_path / "state.json",
+    )
+    dest: Path = tmp_path / "tools"
+    stats: FetchStats = sm.clone_repo(
+        {
+            "url": bare_repos["tools"],
+            "branch": "main",
+            "to": str(dest),
+            "filter": "blob:none",
+            "sparse": ["keep"],
+            "files": ["*.txt"],
+        }
+    )
+
+    files = sorted(
+        p.relative_to(dest).as_posix() for p in dest.rglob("*") if p.is_file()
+    )
+    assert files == ["keep/nested/a.txt", "tools.txt"]
+    assert stats.materialized == len("a") + len("tools")
+    assert stats.transferred > 0
+
+
+def test_clone_sources_skips_unchanged_pins(tmp_path: Path, bare_repos: dict[str, str]):
+    ws: Path = tmp_path / "ws"
+    sm: SourceManager = SourceManager(
+        sources=[
+            {"url": bare_repos["kernel"], "branch": "main", "to": str(ws)},
+            {"url": bare_repos["anykernel"], "branch": "main", "to": str(ws / "ak3")},
+        ],
+        mirrors=tmp_path / "mirrors",
+        state=tmp_path / "state.json",
+    )
+    head: str = SourceManager.resolve_ref(bare_repos["kernel"], "main")
+    assert len(head) == 40
+
+    pins: dict[str, str] = sm.resolve_pins()
+    sm.clone_sources(pins)
+    marker: Path = ws / "ak3" / "marker"
+    marker.write_text("kept")
+
+    # Nothing moved: both checkouts are reused untouched
+    sm.clone_sources(sm.resolve_pins())
+    assert marker.exists()
+
+    # A tainted parent is re-created together with its nested source
+    sm.taint(ws)
+    sm.clone_sources(pins)
+    assert not marker.exists()
+    assert (ws / "ak3" / "anykernel.txt").exists()
+
+
+def test_taint_drops_indexes(tmp_path: Path, bare_repos: dict[str, str]):
+    ws: Path = tmp_path / "ws"
+    sm: SourceManager = SourceManager(
+        sources=[
+            {"url": bare_repos["kernel"], "branch": "main", "to": str(ws)},
+            {"url": bare_repos["anykernel"], "branch": "main", "to": str(ws / "ak3")},
+        ],
+        mirrors=tmp_path / "mirrors",
+        state=tmp_path / "state.json",
+    )
+    index: Path = tmp_path / "index"
+    sm.clone_sources(sm.resolve_pins())
+    assert len(list(index.iterdir())) == 2
+
+    # Re-creating the tree replaces its indexes instead of adding to them
+    sm.clone_sources(sm.resolve_pins())
+    assert len(list(index.iterdir())) == 2
+
+    sm.taint(ws)
+    assert list(index.iterdir()) == []
+
+
+def test_clone_sources_in_place(tmp_path: Path, bare_repos: dict[str, str]):
+    ws: Path = tmp_path / "ws"
+    sm: SourceManager = SourceManager(
+        sources=[
+            {"url": bare_repos["kernel"], "branch": "main", "to": str(ws)},
+            {"url": bare_repos["anykernel"], "branch": "main", "to": str(ws / "ak3")},
+        ],
+        mirrors=tmp_path / "mirrors",
+        state=tmp_path / "state.json",
+    )
+    sm.clone_sources(sm.resolve_pins())
+    (ws / "out").mkdir()
+    (ws / "out" / "vmlinux").write_text("built")
+    (ws / "keep" / "nested" / "a.txt").write_text("patched")
+    (ws / "untracked.c").write_text("added by a pre-build step")
+    sm.mark_applied(ws, "fingerprint")
+    unchanged_mtime: int = (ws / "drop.bin").stat().st_mtime_ns
+
+    # Move upstream forward; the tree is updated instead of re-created
+    work: Path = tmp_path / "work" / "kernel"
+    (work / "kernel.txt").write_text("updated")
+    sh.git(
+        "-C",
+        str(work),
+        "-c",
+        "user.name=test",
+        "-c",
+        "user.email=test@example.com",
+        "commit",
+        "-qam",
+        "update",
+    )
+    sh.git(
+        "-C",
+        str(work),
+        "push",
+        "-q",
+        bare_repos["kernel"].removeprefix("file://"),
+        "main",
+    )
+    sm.clone_sources(sm.resolve_pins(), in_place=True)
+
+    assert (ws / "kernel.txt").read_text() == "updated"
+    assert (ws / "keep" / "nested" / "a.txt").read_text() == "a"
+    assert not (ws / "untracked.c").exists()
+    assert (ws / "out" / "vmlinux").read_text() == "built"
+    assert (ws / "ak3" / "anykernel.txt").exists()
+    assert (ws / "drop.bin").stat().st_mtime_ns == unchanged_mtime
+    assert sm.applied(ws) is None
+
+    # Restoring returns the tree to its commit without touching out/
+    (ws / "kernel.txt").write_text("patched")
+    sm.restore(ws)
+    assert (ws / "kernel.txt").read_text() == "updated"
+    assert (ws / "out" / "vmlinux").exists()
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("https://github.com/tiann/KernelSU.git", "github.com:tiann/KernelSU"),
+        (
+            "https://github.com/tiann/KernelSU/tree/main/kernel",
+            "github.com:tiann/KernelSU",
+        ),
+        (
+            "https://gitlab.com/simonpunk/susfs4ksu/-/tree/gki",
+            "gitlab.com:simonpunk/susfs4ksu",
+        ),
+        (
+            "https://gitlab.com/group/subgroup/repo.git",
+            "gitlab.com:group/subgroup/repo",
+        ),
+        (
+            "https://android.googlesource.com/platform/system/tools/mkbootimg/+/refs/heads/main",
+            "android.googlesource.com:platform/system/tools/mkbootimg",
+        ),
+    ],
+)
+def test_git_simplifier_known_forges(mocker: MockerFixture, url: str, expected: str):
+    head = mocker.patch("kernel_builder.utils.source.requests.head")
+    assert SourceManager.git_simplifier(url) == expected
+    assert SourceManager.is_simplified(expected)
+    head.assert_not_called()
+
+
+def test_git_simplifier_cached_head(
+    mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    monkeypatch.setattr("kernel_builder.utils.source.URL_CACHE", tmp_path / "urls.json")
+    resp = mocker.Mock(url="https://git.example.org/foo/bar.git")
+    head = mocker.patch("kernel_builder.utils.source.requests.head", return_value=resp)
+
+    url: str = "https://short.example/bar"
+    assert SourceManager.git_simplifier(url) == "git.example.org:foo/bar"
+    assert SourceManager.git_simplifier(url) == "git.example.org:foo/bar"
+    head.assert_called_once_with(url, allow_redirects=True, timeout=10)
+
+
+def test_git_simplifier_falls_back_to_get(
+    mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    monkeypatch.setattr("kernel_builder.utils.source.URL_CACHE", tmp_path / "urls.json")
+    refused = mocker.Mock(url="https://short.example/bar", status_code=405)
+    mocker.patch("kernel_builder.utils.source.requests.head", return_value=refused)
+    resp = mocker.Mock(url="https://git.example.org/foo/bar.git", status_code=200)
+    get = mocker.patch("kernel_builder.utils.source.requests.get", return_value=resp)
+
+    url: str = "https://short.example/bar"
+    assert SourceManager.git_simplifier(url) == "git.example.org:foo/bar"
+    get.assert_called_once_with(url, allow_redirects=True, stream=True, timeout=10)
+    resp.close.assert_called_once()
+
+
+def test_is_simplified():
+    assert SourceManager.is_simplified("github.com:foo/bar")
+    assert SourceManager.is_simplified("android.googlesource.com:kernel/common")
+    assert not SourceManager.is_simplified("github.com:foo")
+    assert not SourceManager.is_simplified("https://github.com/foo/bar")
+    assert not SourceManager.is_simplified("github.com:foo//bar")
+
+
+def test_resolve_pins_trusts_lockfile(mocker: MockerFixture):
+    sm: SourceManager = SourceManager(
+        sources=[
+            {"url": "github.com:a/kernel", "branch": "main", "to": "k"},
+            {"url": "github.com:a/tools", "branch": "main", "to": "t"},
+        ]
+    )
+    resolve: MockType = mocker.patch.object(
+        SourceManager, "resolve_ref", return_value="b" * 40
+    )
+    lock: SourceLock = SourceLock()
+    lock.pin("github.com:a/kernel", "main", "a" * 40)
+    lock.pin("github.com:a/tools", "main", "c" * 40)
+
+    assert sm.resolve_pins(lock) == {
+        "github.com:a/kernel@main": "a" * 40,
+        "github.com:a/tools@main": "c" * 40,
+    }
+    resolve.assert_not_called()
+
+    # Only the source missing from the lockfile asks its remote
+    del lock.sources["github.com:a/tools@main"]
+    assert sm.resolve_pins(lock)["github.com:a/tools@main"] == "b" * 40
+    resolve.assert_called_once_with("github.com:a/tools", "main")
+
+
+def test_git_simplifier_concurrent_cache(
+    mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    cache: Path = tmp_path / "urls.json"
+    monkeypatch.setattr("kernel_builder.utils.source.URL_CACHE", cache)
+    mocker.patch(
+        "kernel_builder.utils.source.requests.head",
+        side_effect=lambda url, **_: mocker.Mock(url=url.replace("short", "git")),
+    )
+    urls: list[str] = [f"https://short.example/repo{n}" for n in range(16)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(SourceManager.git_simplifier, urls))
+
+    # Every thread's entry survives the concurrent read-modify-writes
+    assert sorted(json.loads(cache.read_text())) == sorted(urls)
@@ -0,0 +1,57 @@
+import pytest
+
+from kernel_builder.utils.targets import (
+    TargetPlan,
+    artifact_name,
+    image_target,
+    is_artifact,
+    plan,
+)
+
+
+def test_flashables_skip_modules() -> None:
+    result: TargetPlan = plan(["anykernel3", "boot"], "gz")
+
+    assert result.targets == ("Image.gz",)
+    assert result.builds_image
+    assert result.wants("boot") and not result.wants("modules")
+
+
+@pytest.mark.parametrize(
+    "artifacts, comp, targets",
+    [
+        (["modules"], "gz", ("modules",)),
+        (["vmlinux"], "lz4", ("vmlinux",)),
+        # The image is linked from vmlinux, so vmlinux needs no target of its own
+        (["vmlinux", "anykernel3"], "raw", ("Image",)),
+        (["modules", "boot", "MODULES"], "lz4", ("Image.lz4", "modules")),
+    ],
+)
+def test_minimal_targets(
+    artifacts: list[str], comp: str, targets: tuple[str, ...]
+) -> None:
+    assert plan(artifacts, comp).targets == targets
+
+
+def test_image_only_when_needed() -> None:
+    result: TargetPlan = plan(["modules"], "gz")
+
+    assert result.image == image_target("gz") == "Image.gz"
+    assert not result.builds_image
+    assert result.artifacts == ("modules",)
+
+
+@pytest.mark.parametrize("artifacts", [["dtbo"], []])
+def test_invalid_requests(artifacts: list[str]) -> None:
+    with pytest.raises(ValueError):
+        plan(artifacts)
+
+
+def test_artifact_names() -> None:
+    name: str = artifact_name("boot", "5.10.236", "-KSUN-SUSFS")
+
+    assert name == "ESK-5.10.236-KSUN-SUSFS-boot.img"
+    assert is_artifact(name, "-KSUN-SUSFS")
+    assert not is_artifact(name, "-SUSFS")
+    assert not is_artifact(name, "-KSUN")
+    assert not is_artifact(f"{name}.json", "-KSUN-SUSFS")
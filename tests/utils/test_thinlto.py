@@ -0,0 +1,102 @@
+import json
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from kernel_builder.utils import thinlto
+from kernel_builder.utils.thinlto import ThinLtoCache, ThinLtoReport
+
+MAKEFILE: str = (
+    "ifdef CONFIG_LTO_CLANG_THIN\n"
+    "KBUILD_LDFLAGS\t+= --thinlto-cache-dir=$(extmod-prefix).thinlto-cache\n"
+    "endif\n"
+)
+DAY: int = 86400
+
+
+@pytest.fixture
+def tree(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(thinlto, "clang_hash", lambda binary=None: "cd" * 32)
+    monkeypatch.setattr(thinlto, "LTO", "thin")
+    (tmp_path / "kernel").mkdir()
+    (tmp_path / "kernel" / "Makefile").write_text(MAKEFILE)
+    return tmp_path / "kernel"
+
+
+def _entry(path: Path, size: int = 10, age: float = 0) -> Path:
+    path.write_bytes(bytes(size))
+    used: float = time.time() - age
+    os.utime(path, (used, used))
+    return path
+
+
+def test_links_namespace_and_keeps_entries(tree: Path, tmp_path: Path) -> None:
+    out: Path = tree / "out"
+    # Left by an earlier build without the managed cache
+    (out / ".thinlto-cache").mkdir(parents=True)
+    _entry(out / ".thinlto-cache" / "llvmcache-old")
+    cache = ThinLtoCache(out, root=tmp_path / "thinlto")
+
+    cache.prepare(tree)
+    cache.prepare(tree)
+
+    namespace: Path = tmp_path / "thinlto" / ("cd" * 8)
+    assert (out / ".thinlto-cache").resolve() == namespace
+    assert [p.name for p in namespace.iterdir()] == ["llvmcache-old"]
+
+
+def test_report_counts_hits_and_misses(tree: Path, tmp_path: Path) -> None:
+    cache = ThinLtoCache(tree / "out", root=tmp_path / "thinlto")
+    namespace: Path = tmp_path / "thinlto" / ("cd" * 8)
+    namespace.mkdir(parents=True)
+    reused: Path = _entry(namespace / "llvmcache-reused", age=DAY)
+    _entry(namespace / "llvmcache-unused", age=DAY)
+    _entry(namespace / "llvmcache.timestamp")
+
+    cache.prepare(tree)
+    # What lld does during the link: read one entry, add another
+    os.utime(reused, (time.time(), reused.stat().st_mtime))
+    _entry(namespace / "llvmcache-new", size=30)
+    report: ThinLtoReport | None = cache.report(tmp_path / "thinlto.json")
+
+    assert report is not None
+    assert (report.hits, report.misses, report.files) == (1, 1, 3)
+    assert report.size == 50
+    assert json.loads((tmp_path / "thinlto.json").read_text())["hit_rate"] == 0.5
+
+
+def test_prune_by_age_and_size(tree: Path, tmp_path: Path) -> None:
+    cache = ThinLtoCache(
+        tree / "out", root=tmp_path / "thinlto", max_size=25, max_age=7 * DAY
+    )
+    stale: Path = tmp_path / "thinlto" / "0123456789abcdef"
+    stale.mkdir(parents=True)
+    _entry(stale / "llvmcache-x", age=30 * DAY)
+    cache.prepare(tree)
+    assert cache.dir is not None
+    _entry(cache.dir / "llvmcache-expired", age=8 * DAY)
+    _entry(cache.dir / "llvmcache-lru", age=2 * DAY)
+    _entry(cache.dir / "llvmcache-recent", age=DAY)
+    _entry(cache.dir / "llvmcache-newest")
+
+    assert cache.prune() == 2
+
+    assert sorted(p.name for p in cache.dir.iterdir()) == [
+        "llvmcache-newest",
+        "llvmcache-recent",
+    ]
+    assert not stale.exists()
+
+
+def test_disabled_or_unsupported(tree: Path, tmp_path: Path) -> None:
+    off = ThinLtoCache(tree / "out", root=None)
+    off.prepare(tree)
+    assert off.report() is None
+
+    (tree / "Makefile").write_text("KBUILD_LDFLAGS += -O2\n")
+    unsupported = ThinLtoCache(tree / "out", root=tmp_path / "thinlto")
+    unsupported.prepare(tree)
+    assert unsupported.report() is None
+    assert not (tree / "out" / ".thinlto-cache").exists()
@@ -0,0 +1,87 @@
+import io
+import tarfile
+from pathlib import Path
+import pytest
+from pytest_mock import MockerFixture
+from kernel_builder.utils.toolchain import ToolchainStore
+
+URL: str = "https://example.com/clang.tar.gz"
+
+
+def make_archive(path: Path) -> None:
+    with tarfile.open(path, "w:gz") as tar:
+        for name, data in (
+            ("bin/clang", b"#!/bin/sh\n"),
+            ("lib/libLLVM.so", b"\0" * 64),
+        ):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o755
+            tar.addfile(info, io.BytesIO(data))
+
+
+@pytest.fixture
+def store(tmp_path: Path, mocker: MockerFixture) -> ToolchainStore:
+    store = ToolchainStore(tmp_path / "store", stream=False)
+    mocker.patch.object(store, "identity", return_value="etag-1")
+
+    def download(url: str, archive: Path) -> str:
+        make_archive(archive)
+        return "digest"
+
+    mocker.patch.object(store, "_download", side_effect=download)
+    return store
+
+
+def test_store_hit_skips_download(store: ToolchainStore, tmp_path: Path) -> None:
+    dest: Path = tmp_path / "toolchain" / "clang"
+    store.link(URL, dest)
+    store.link(URL, dest)
+
+    assert dest.is_symlink()
+    assert (dest / "bin" / "clang").read_bytes() == b"#!/bin/sh\n"
+    assert store._download.call_count == 1  # pyright: ignore[reportFunctionMemberAccess]
+    assert len(store.entries()) == 1
+
+
+def test_store_reextracts_corrupted_entry(store: ToolchainStore) -> None:
+    tree: Path = store.get(URL)
+    (tree / "lib" / "libLLVM.so").write_bytes(b"truncated")
+
+    assert not store.verify(store.entries()[0])
+    store.get(URL)
+    assert store._download.call_count == 2  # pyright: ignore[reportFunctionMemberAccess]
+    assert store.verify(store.entries()[0])
+
+
+def test_store_prune_keeps_latest(store: ToolchainStore, mocker: MockerFixture) -> None:
+    store.get(URL)
+    mocker.patch.object(store, "identity", return_value="etag-2")
+    store.get(URL)
+    assert len(store.entries()) == 2
+    store.release()
+
+    removed = store.prune(keep=1)
+    assert [e.etag for e in removed] == ["etag-1"]
+    assert [e.etag for e in store.entries()] == ["etag-2"]
+
+
+def test_store_prune_skips_entry_in_use(
+    store: ToolchainStore, mocker: MockerFixture
+) -> None:
+    store.get(URL)
+    mocker.patch.object(store, "identity", return_value="etag-2")
+    store.get(URL)
+    store.release()
+
+    # Another build is compiling with etag-1
+    builder: ToolchainStore = ToolchainStore(store.root, stream=False)
+    mocker.patch.object(builder, "identity", return_value="etag-1")
+    with builder:
+        tree: Path = builder.get(URL)
+        assert [e.etag for e in store.prune(keep=0)] == ["etag-2"]
+        assert (tree / "bin" / "clang").exists()
+
+    assert [e.etag for e in store.prune(keep=0)] == ["etag-1"]
+    # Lock files outlive their entries
+    assert len(list(store.root.glob("*.lock"))) == 2
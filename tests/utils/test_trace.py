@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from kernel_builder.utils.trace import Tracer
+
+
+@pytest.fixture()
+def tracer(tmp_path: Path) -> Tracer:
+    tracer: Tracer = Tracer()
+    tracer.start(tmp_path / "trace.json")
+    return tracer
+
+
+def _events(tracer: Tracer, ph: str) -> list[dict[str, Any]]:
+    return [e for e in tracer.events if e["ph"] == ph]
+
+
+def test_disabled_tracer_records_nothing(tmp_path: Path) -> None:
+    tracer: Tracer = Tracer()
+    with tracer.span("noop") as s:
+        s.args["x"] = 1
+    tracer.instant("noop")
+    tracer.counter("noop", value=1)
+
+    assert tracer.events == []
+    assert tracer.save() is None
+
+
+def test_nested_spans(tracer: Tracer) -> None:
+    with tracer.span("outer", "build", step=1):
+        with tracer.span("inner", "git") as inner:
+            inner.args["commit"] = "abc"
+
+    inner_event, outer_event = _events(tracer, "X")
+    assert (inner_event["name"], outer_event["name"]) == ("inner", "outer")
+    assert inner_event["args"] == {"commit": "abc"}
+    assert outer_event["args"] == {"step": 1}
+    assert inner_event["cat"] == "git"
+    assert inner_event["tid"] == outer_event["tid"]
+    assert outer_event["ts"] <= inner_event["ts"]
+    assert (
+        inner_event["ts"] + inner_event["dur"] <= outer_event["ts"] + outer_event["dur"]
+    )
+
+
+def test_span_records_error(tracer: Tracer) -> None:
+    with pytest.raises(ValueError), tracer.span("fails"):
+        raise ValueError("boom")
+
+    (event,) = _events(tracer, "X")
+    assert event["args"]["error"] == "ValueError: boom"
+
+
+def test_subprocess_span_moves_to_child_track(tracer: Tracer) -> None:
+    with tracer.span("make", "subprocess") as s:
+        proc = subprocess.Popen(["true"])
+        s.pid = proc.pid
+        proc.wait()
+
+    (event,) = _events(tracer, "X")
+    assert event["pid"] == event["tid"] == proc.pid
+    names: list[dict[str, Any]] = [
+        e for e in _events(tracer, "M") if e["name"] == "process_name"
+    ]
+    assert {"pid": proc.pid, "name": "make"} in [
+        {"pid": e["pid"], "name": e["args"]["name"]} for e in names
+    ]
+
+
+def test_save_writes_chrome_trace(tracer: Tracer) -> None:
+    tracer.annotate(variant="-KSUN")
+    with tracer.span("build"):
+        tracer.counter("memory (MiB)", available=1024, build_rss=512)
+        tracer.instant("config cache hit", key="k")
+
+    path: Path | None = tracer.save()
+
+    assert path is not None
+    trace: dict[str, Any] = json.loads(path.read_text())
+    assert trace["displayTimeUnit"] == "ms"
+    assert trace["otherData"]["variant"] == "-KSUN"
+    phases: set[str] = {e["ph"] for e in trace["traceEvents"]}
+    assert phases == {"M", "X", "C", "i"}
+    (counter,) = (e for e in trace["traceEvents"] if e["ph"] == "C")
+    assert counter["args"] == {"available": 1024, "build_rss": 512}
+    assert all(e["pid"] for e in trace["traceEvents"])
+    assert os.getpid() in {e["pid"] for e in trace["traceEvents"]}
@@ -1,7 +1,11 @@
 import json
 from collections.abc import Generator
 from typing import Any
-from kernel_builder.utils.variants_parser import VariantsParser
+from kernel_builder.utils.variants_parser import (
+    Combination,
+    VariantMatrix,
+    VariantsParser,
+)
 import pytest
 from pathlib import Path
 
@@ -52,3 +56,61 @@ def test_no_matching_variant(variants_file, monkeypatch: pytest.MonkeyPatch) ->
         parser.name()
     with pytest.raises(RuntimeError):
         parser.config()
+
+
+def test_entry_lookup_without_env(variants_file) -> None:
+    parser = VariantsParser(variants_file)
+    assert parser.entry("dummy-2", True) == dummy_data[1]
+    assert parser.entry("DUMMY", True) is None
+
+
+LXC_PATCH: str = """\
+--- a/arch/arm64/configs/gki_defconfig
++++ b/arch/arm64/configs/gki_defconfig
+@@ -1,1 +1,3 @@
++CONFIG_USER_NS=y
++# CONFIG_NULL_TTY is not set
+--- a/kernel/cgroup/cgroup.c
++++ b/kernel/cgroup/cgroup.c
+"""
+
+
+def test_matrix_deltas_and_order(variants_file, tmp_path: Path) -> None:
+    patch: Path = tmp_path / "lxc.patch"
+    patch.write_text(LXC_PATCH)
+    matrix = VariantMatrix(
+        VariantsParser(variants_file),
+        lambda combo: [
+            *(["kernelsu"] if combo[1] else []),
+            *([patch] if combo[2] else []),
+        ],
+    )
+    combos: list[Combination] = matrix.combinations()
+    assert combos == [
+        ("DUMMY", False, False),
+        ("DUMMY", False, True),
+        ("DUMMY-2", True, False),
+        ("DUMMY-2", True, True),
+    ]
+
+    delta = matrix.delta(("DUMMY", False, False), ("DUMMY-2", True, True))
+    assert delta.kconfig == {"CONFIG_DUMMY", "CONFIG_USER_NS", "CONFIG_NULL_TTY"}
+    assert delta.files == {
+        "kernelsu",
+        "arch/arm64/configs/gki_defconfig",
+        "kernel/cgroup/cgroup.c",
+    }
+
+    # LXC on/off is the expensive toggle, so it flips only once
+    shuffled: list[Combination] = [combos[0], combos[3], combos[1], combos[2]]
+    order: list[Combination] = matrix.order(shuffled)
+    deltas = matrix.deltas(combos)
+    assert sorted(order) == sorted(combos)
+    assert [c[2] for c in order] in (
+        [False, False, True, True],
+        [True, True, False, False],
+    )
+    assert matrix.path_cost(order, deltas) < matrix.path_cost(shuffled, deltas)
+
+    with pytest.raises(RuntimeError):
+        matrix.check([("NONE", True, False)])